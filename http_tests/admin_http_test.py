@@ -211,3 +211,35 @@ def test_http_userpermissions_change(user1, user2, user3):
 
     assert response4.status_code == 403
 
+
+def test_http_users_import(user1, user2):
+    csv_file = "email,password,name_first,name_last\n"
+    csv_file += "".join(f"student{i}@gmail.com,password,Student,{i}\n" for i in range(100))
+    csv_file += "first@gmail.com,password,User,1\n"
+
+    response = requests.post(f"{url}admin/users/import/v1", params={
+        "token": user1[token],
+        "format": "csv",
+    }, data=csv_file.encode())
+    assert response.status_code == 200
+    result = response.json()
+    assert result['num_imported'] == 100
+    assert result['results'][0] == {'line': 2, 'is_success': True, AuID: 2}
+    assert result['results'][-1] == {'line': 102, 'is_success': False}
+
+    login = requests.post(f"{url}auth/login/v2", json={
+        "email": "student99@gmail.com",
+        "password": "password",
+    })
+    assert login.status_code == 200
+
+    jsonl_file = json.dumps({"email": "late@gmail.com", "password": "password", "name_first": "Late", "name_last": "Student"})
+    response = requests.post(f"{url}admin/users/import/v1", params={
+        "token": user2[token],
+    }, data=jsonl_file.encode())
+    assert response.status_code == 403
+
+    response = requests.post(f"{url}admin/users/import/v1", params={
+        "token": user1[token],
+    }, data=jsonl_file.encode())
+    assert response.json() == {'results': [{'line': 1, 'is_success': True, AuID: 102}], 'num_imported': 1}
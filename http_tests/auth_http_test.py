@@ -127,15 +127,16 @@ def test_http_auth_logout_valid():
     payload_3 = response_3.json()
     assert payload_3['is_success'] == True
 
-    with pytest.raises(AccessError):
-        check_session(0, 0)
+    #* The server keeps its sessions in memory, so check them through the server
+    response = requests.post(f"{url}auth/logout/v1", json={'token': payload_1['token']})
+    assert response.status_code == 403
 
     response_4 = requests.post(f"{url}auth/logout/v1", json={'token': payload_2['token']})
     payload_4 = response_4.json()
     assert payload_4['is_success'] == True
 
-    with pytest.raises(AccessError):
-        check_session(0, 1)
+    response = requests.post(f"{url}auth/logout/v1", json={'token': payload_2['token']})
+    assert response.status_code == 403
 
 # tests for the case when a token with an invalid session_id is inputted
 def test_http_auth_logout_v1_invalid():   
@@ -549,6 +549,48 @@ def test_http_channel_messages(user1, user2):
     })
     assert access_error.status_code == 403 
     
+def test_http_channel_messages_cursor(user1, user2):
+    channel1 = requests.post(f"{url}channels/create/v2", json={
+        "token": user1[token],
+        "name": "channel1",
+        "is_public": False,
+    }).json()
+    for message_counter in range(55):
+        requests.post(f"{url}message/send/v2", json = {
+            "token": user1[token],
+            cID: channel1[cID],
+            "message" : f"{message_counter}",
+        })
+
+    result1 = requests.get(f"{url}channel/messages/v3", params = {
+        "token": user1[token],
+        cID: channel1[cID],
+    }).json()
+    assert len(result1['messages']) == 50
+    assert result1['messages'][0]['message'] == "54"
+    assert result1['prev_cursor'] == ''
+
+    result2 = requests.get(f"{url}channel/messages/v3", params = {
+        "token": user1[token],
+        cID: channel1[cID],
+        "cursor": result1['next_cursor'],
+    }).json()
+    assert [msg['message'] for msg in result2['messages']] == ["4", "3", "2", "1", "0"]
+    assert result2['next_cursor'] == ''
+
+    invalid_cursor = requests.get(f"{url}channel/messages/v3", params = {
+        "token": user1[token],
+        cID: channel1[cID],
+        "cursor": "notacursor",
+    })
+    assert invalid_cursor.status_code == 400
+
+    access_error = requests.get(f"{url}channel/messages/v3", params = {
+        "token": user2[token],
+        cID: channel1[cID],
+    })
+    assert access_error.status_code == 403
+
 def test_http_channel_messages_valid(user1, user2):
     # Create first channel for first test case
     # Success case 1: Less than 50 messages returns end as -1 
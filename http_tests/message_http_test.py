@@ -1554,3 +1554,34 @@ def test_http_message_sendlaterdm(user1, user2):
             messageFound = True
     assert messageFound
     assert mTime == sendTime
+
+#* Test that scheduled messages are listed until they are cancelled, and cancelled ones are never sent
+def test_http_message_sendlater_list_cancel(user1, user2):
+    c1 = requests.post(f"{url}channels/create/v2", json={
+        "token": user1[token],
+        "name": "TrumpPence",
+        "is_public": True
+    })
+    sendTime = datetime.now().replace(tzinfo=timezone.utc).timestamp() + 1
+    m1 = requests.post(f"{url}message/sendlater/v1", json={
+        "token": user1[token],
+        "channel_id": c1.json()[cID],
+        "message": "Family",
+        "time_sent": sendTime
+    })
+
+    scheduled = requests.get(f"{url}message/sendlater/list/v1", params={"token": user1[token]}).json()['messages']
+    assert [message['message_id'] for message in scheduled] == [m1.json()['message_id']]
+
+    response = requests.delete(f"{url}message/sendlater/cancel/v1", json={"token": user2[token], "message_id": m1.json()['message_id']})
+    assert response.status_code == 400
+    response = requests.delete(f"{url}message/sendlater/cancel/v1", json={"token": user1[token], "message_id": m1.json()['message_id']})
+    assert response.status_code == 200
+
+    time.sleep(1.5)
+    assert requests.get(f"{url}message/sendlater/list/v1", params={"token": user1[token]}).json()['messages'] == []
+    assert requests.get(f"{url}channel/messages/v2", params={
+        "token": user1[token],
+        "channel_id": c1.json()[cID],
+        "start": 0
+    }).json()['messages'] == []
@@ -1,6 +1,7 @@
 import pytest
 import requests
 import json
+import itertools
 from src.config import url
 from src.other import SECRET
 import jwt
@@ -409,3 +410,30 @@ def test_http_dm_react_notif(user1,user2):
         nMess: "user2 reacted to your message in user1, user2"
     } in notifs['notifications']
     assert len(notifs['notifications']) == 1
+
+#* Test that long-polls and the event stream both deliver notifications as they are pushed
+def test_http_notifications_wait_and_stream(user1, user2):
+    c1 = requests.post(f"{url}channels/create/v2", json={
+        "token": user1[token],
+        "name": "TrumpPence",
+        "is_public": True
+    }).json()
+
+    wait = requests.get(f"{url}notifications/wait/v1", params={token: user2[token], 'timeout': 0}).json()
+    assert wait[notifs] == []
+    requests.post(f"{url}channel/invite/v2", json={token: user1[token], cID: c1[cID], uID: user2[AuID]})
+    wait = requests.get(f"{url}notifications/wait/v1", params={token: user2[token], 'cursor': wait['cursor'], 'timeout': 5}).json()
+    assert [notif[nMess] for notif in wait[notifs]] == ["user1 added you to TrumpPence"]
+
+    response = requests.get(f"{url}notifications/stream/v1", params={token: user2[token], 'cursor': wait['cursor']}, stream=True, timeout=10)
+    assert response.headers['Content-Type'].startswith('text/event-stream')
+    lines = response.iter_lines(chunk_size=1, decode_unicode=True)
+    assert next(lines) == ': keep-alive'
+    requests.post(f"{url}message/send/v2", json={token: user1[token], cID: c1[cID], 'message': "Hi @user2"})
+    event = list(itertools.takewhile(lambda line: line != '', itertools.dropwhile(lambda line: line == '', lines)))
+    response.close()
+    assert event[0].startswith('id: ')
+    assert [notif[nMess] for notif in json.loads(event[1][len('data: '):])] == ["user1 tagged you in TrumpPence: Hi @user2"]
+
+    response = requests.get(f"{url}notifications/stream/v1", params={token: user2[token], 'cursor': 'garbage'})
+    assert response.status_code == 400
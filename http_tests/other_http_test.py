@@ -256,4 +256,33 @@ def test_http_search_dms(user1, user2, user3, dm1):
     }).json()['messages']:
         if messages['message'] == "Biden Harris 2020":
             messageFound = True
-    assert not messageFound
\ No newline at end of file
+    assert not messageFound
+def test_http_search_pages(user1, channel1):
+    for i in range(5):
+        requests.post(f"{url}message/send/v2", json={
+            "token": user1[token],
+            cID: channel1[cID],
+            "message": f"Keep America Great {i}",
+        })
+
+    page1 = requests.get(f"{url}search/v3", params={
+        "token": user1[token],
+        "query_str": "america",
+        "limit": 3,
+    }).json()
+    assert [msg['message'] for msg in page1['messages']] == [f"Keep America Great {i}" for i in (4, 3, 2)]
+
+    page2 = requests.get(f"{url}search/v3", params={
+        "token": user1[token],
+        "query_str": "america",
+        "limit": 3,
+        "cursor": page1['next_cursor'],
+    }).json()
+    assert [msg['message'] for msg in page2['messages']] == [f"Keep America Great {i}" for i in (1, 0)]
+    assert page2['next_cursor'] == ''
+
+    assert requests.get(f"{url}search/v3", params={
+        "token": user1[token],
+        "query_str": "america",
+        "limit": 0,
+    }).status_code == 400
@@ -4,7 +4,7 @@ import pytest
 from src.config import url
 from src.standup import standup_start_v1, standup_active_v1, standup_send_v1
 from src.error import InputError, AccessError
-from src.other import SECRET, clear_v1
+from src.other import SECRET
 import src.channel
 from src.channel import channel_messages_v1
 import jwt
@@ -26,16 +26,34 @@ def invalid_token():
 
 @pytest.fixture
 def user1():
-    clear_v1()    
-    return src.auth.auth_register_v2("first@gmail.com", "password", "User", "1")
+    requests.delete(f"{url}clear/v1")    
+    response = requests.post(f"{url}auth/register/v2", json={
+        "email": "first@gmail.com",
+        "password": "password",
+        "name_first": "User",
+        "name_last": "1"
+    })
+    return response.json()
 
 @pytest.fixture
 def user2():
-    return src.auth.auth_register_v2("second@gmail.com", "password", "User", "2")
+    response = requests.post(f"{url}auth/register/v2", json={
+        "email": "second@gmail.com",
+        "password": "password",
+        "name_first": "User",
+        "name_last": "2"
+    })
+    return response.json()
 
 @pytest.fixture
 def user3():
-    return src.auth.auth_register_v2("third@gmail.com", "password", "User", "3")
+    response = requests.post(f"{url}auth/register/v2", json={
+        "email": "third@gmail.com",
+        "password": "password",
+        "name_first": "User",
+        "name_last": "3"
+    })
+    return response.json()
 
 #HTTP test that when channel ID is invalid standup_start_v1 returns an InputError
 def test_http_standup_start_v1_invalid_cID(user1):
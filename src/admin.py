@@ -1,7 +1,12 @@
 from src.error import AccessError, InputError
 import jwt
+import csv
 import json
-from src.other import decode, get_channel, get_user, get_user_permissions, check_removed, data_load
+from itertools import islice
+from src import config
+from src.auth import add_user
+from src.other import decode, get_channel, get_user, get_user_permissions, check_removed, data_load, forget_tokens
+from src.data import store, write_locked
 
 
 AuID      = 'auth_user_id'
@@ -18,6 +23,7 @@ dmID      = 'dm_id'
 seshID    = 'session_id'
 
 
+@write_locked
 def user_remove_v1(token, u_id):
 
     get_user(u_id)
@@ -37,34 +43,30 @@ def user_remove_v1(token, u_id):
     if dream_owner == 1 and get_user_permissions(u_id) == 1:   
         raise InputError
     
-    for users in data['users']:
-        if users['u_id'] == u_id:
-            users['name_first'] = 'Removed '
-            users['name_last'] = 'user'
-            users['permission_id'] = 0
+    store.set(('users', u_id, 'name_first'), 'Removed ')
+    store.set(('users', u_id, 'name_last'), 'user')
+    store.set(('users', u_id, 'permission_id'), 0)
+    forget_tokens(u_id)
 
     for messages in data['messages_log']:
         if messages['u_id'] == u_id:
-            messages['message'] = 'Removed user'
-
-    for channel in data['channels']:
-        if u_id in channel['all_members']:       
-            channel['all_members'].remove(u_id)
-        if u_id in channel['owner_members']:
-            channel['owner_members'].remove(u_id)
-
-    for dm in data['dms']:
-        if u_id in dm['all_members']:       
-            dm['all_members'].remove(u_id)
-        if u_id == dm['creator_id']:
-            dm['creator_id'] == []
-
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+            store.set(('messages_log', messages['message_id'], 'message'), 'Removed user')
+
+    #* Copied, as removing the user from a channel or DM changes their memberships
+    for channel_id in list(store.memberships('channels', u_id)):
+        store.remove(('channels', channel_id, 'all_members'), u_id)
+        if u_id in get_channel(channel_id)['owner_members']:
+            store.remove(('channels', channel_id, 'owner_members'), u_id)
+
+    for dm_id in list(store.memberships('dms', u_id)):
+        store.remove(('dms', dm_id, 'all_members'), u_id)
+
+    store.commit()
     
     return {
     }
 
+@write_locked
 def userpermission_change_v1(token, u_id, permission_id):
     '''
     userpermission_change_v1 works when an authorised user (Dreams Owner) has the ability to change a user with u_id to grant or revoke
@@ -83,41 +85,108 @@ def userpermission_change_v1(token, u_id, permission_id):
         Empty dictionary
     '''
 
-    data = data_load()
     auth_user_id, _ = decode(token)
 
-    validUser = False
-    validOwner = False
-    for user in data['users']:
-        if user[uID] == u_id:
-            validUser = True
-        if user[uID] == auth_user_id:
-            if user['permission_id'] == 1:
-                validOwner = True
-    if not validOwner:
+    if get_user_permissions(auth_user_id) != 1:
         raise AccessError
-    if not validUser:
-        raise InputError
+    get_user(u_id)
     check_removed(u_id)
 
     if permission_id != 1 and permission_id != 2:
         raise InputError
 
-    for user in data['users']:
-        if user[uID] == u_id:
-            user['permission_id'] = permission_id
-    
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.set(('users', u_id, 'permission_id'), permission_id)
+
+    store.commit()
 
     return {
     }
 
+#* Fields every imported user must have
+IMPORT_FIELDS = ('email', 'password', 'name_first', 'name_last')
 
+def admin_users_import_v1(token, rows):
+    '''
+    admin_users_import_v1 lets a Dreams owner register many users at once. Each row is validated and
+    registered exactly as auth/register would. Rows are read config.import_batch_size at a time, and each
+    batch is registered and committed under the write lock, which is let go between batches so other
+    requests are not held up by a long import. rows may be a generator reading straight off the request.
+
+    Arguments:
+        token (str) - JWT containing { u_id, session_id }
+        rows (iterable) - (line, row) pairs: the line of the input a row was read from and a dictionary with
+                          keys email, password, name_first and name_last (see import_rows)
 
+    Exceptions:
+        AccessError - Raised when the token does not belong to a Dreams owner with permission_id 1.
 
+    Return Value:
+        Dictionary with 'results', a list with one entry per row:
+            { line, is_success: True, auth_user_id } for each user that was registered
+            { line, is_success: False } for each row that was not valid (nothing is registered for it)
+        and 'num_imported', the number of users registered
+    '''
+    with store.lock.read():
+        auth_user_id, _ = decode(token)
+        if get_user_permissions(auth_user_id) != 1:
+            raise AccessError
+
+    results = []
+    imported = 0
+    rows = iter(rows)
+    while True:
+        #* The batch is read before taking the lock, so a slow upload never holds it
+        batch = list(islice(rows, config.import_batch_size))
+        if not batch:
+            break
+        with store.lock.write():
+            for line, row in batch:
+                try:
+                    if not all(isinstance(row.get(field), str) for field in IMPORT_FIELDS):
+                        raise InputError
+                    u_id = add_user(*(row[field] for field in IMPORT_FIELDS))
+                except InputError:
+                    results.append({'line': line, 'is_success': False})
+                    continue
+                results.append({'line': line, 'is_success': True, AuID: u_id})
+                imported += 1
+            store.commit()
 
+    return {
+        'results': results,
+        'num_imported': imported,
+    }
 
+def import_rows(lines, file_format):
+    '''
+    Turns the lines of an import file into the (line, row) pairs taken by admin_users_import_v1, one line
+    at a time. Lines are numbered as they are in the file, counting blank lines and the CSV header.
 
+    Arguments:
+        lines (iterable) - The lines of the file, as strings
+        file_format (str) - 'jsonl' for one JSON object per line, or 'csv' for CSV with a header row naming the fields
 
+    Exceptions:
+        InputError - Raised when the file_format is not 'jsonl' or 'csv'
 
+    Return Value:
+        A generator of (line, row) pairs, a line that can't be read gives an empty dictionary (an invalid row)
+    '''
+    if file_format == 'csv':
+        return csv_rows(lines)
+    if file_format == 'jsonl':
+        return ((line, json_row(text)) for line, text in enumerate(lines, start=1) if text.strip())
+    raise InputError
+
+def csv_rows(lines):
+    reader = csv.DictReader(lines)
+    for row in reader:
+        #* line_num counts every line read so far, so a row quoted over several lines gets the last of them
+        yield reader.line_num, dict(row)
+
+def json_row(line):
+    try:
+        row = json.loads(line)
+    except ValueError:
+        return {}
+    return row if isinstance(row, dict) else {}
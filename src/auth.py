@@ -2,14 +2,18 @@ from datetime import datetime
 from src.error import AccessError, InputError
 import re
 from jwt import encode
-import json
-from src.other import SECRET, generate_reset_code, get_user, decode, data_load
+from src.other import SECRET, generate_reset_code, get_user, decode, data_load, forget_tokens, new_notifications, new_series
+from src.data import store, write_locked
 import hashlib
 from datetime import datetime
 import urllib.request
 from src.config import url
+from src import config
+import threading
+import time
 from flask_mail import Message
 
+@write_locked
 def auth_register_v1(email, password, name_first, name_last):
     """ With the inputted data (email, password, name_first, name_last), checks whether the format of the data are valid. 
         If the data is valid, inserts (registers) the inputted information into a dictionary containing all users information
@@ -33,6 +37,32 @@ def auth_register_v1(email, password, name_first, name_last):
             Returns (dict) containing user_id corresponding to the inputted email, password, name_first and name_last
 
     """
+    user_id = add_user(email, password, name_first, name_last)
+
+    store.commit()
+
+    return {
+        'auth_user_id': user_id
+    }
+
+@write_locked
+def add_user(email, password, name_first, name_last):
+    """ Validates and adds a new user exactly as auth_register_v1 does, without committing the change,
+        so that many users can be added and then persisted in one commit (see admin_users_import_v1).
+        Nothing is changed when the user is invalid.
+
+        Arguments:
+            email (str): The email of the user
+            password (str): The password of the user
+            name_first (str): The first name of the user
+            name_last (str): The last name of the user 
+
+        Exceptions:
+            InputError : occurs in the same cases as auth_register_v1
+
+        Return Value:
+            Returns (int) the u_id of the new user
+    """
     data = data_load()
 
     #** Storing name_first & name_list so original names 
@@ -60,10 +90,9 @@ def auth_register_v1(email, password, name_first, name_last):
     else: 
         raise InputError
 
-    #* checking if inputted email is already being used by another user
-    for user in data['users']:
-        if email == user['email']:
-            raise InputError
+    #* checking if inputted email is already being used by another user, in any case
+    if store.find('users', 'email', email) is not None:
+        raise InputError
 
     #* checking if password is valid 
     if len(password) < 6:
@@ -89,14 +118,15 @@ def auth_register_v1(email, password, name_first, name_last):
         handle_string = name_first + name_last
     
     if check_handle(handle_string):
-    
-        trailing_int = 0 
         
-        #* checking for duplicated names and appends the handle_string
-        #* with the smallest number
-        for user in data['users']:
-            if check_handle(handle_string + str(trailing_int)):
-                trailing_int += 1
+        #* checking for duplicated names and appends the handle_string with the next
+        #* unused number, which is remembered per handle so later duplicates start from it
+        if 'handle_suffixes' not in data:
+            store.set(('handle_suffixes',), {})
+        trailing_int = data['handle_suffixes'].get(handle_string, 0)
+        while check_handle(handle_string + str(trailing_int)):
+            trailing_int += 1
+        store.set(('handle_suffixes', handle_string), trailing_int + 1)
         
         handle_string = handle_string + str(trailing_int)
 
@@ -109,29 +139,15 @@ def auth_register_v1(email, password, name_first, name_last):
     permissionID = 2
     if len(data['users']) == 0:
         permissionID = 1
-        data['dreams_analytics'] = {
-            'channels_exist': [
-                {
-                    'num_channels_exist': 0,
-                    'time_stamp': int(datetime.now().strftime("%s"))
-                },
-            ],
-            'dms_exist': [
-                {
-                    'num_dms_exist': 0,
-                    'time_stamp': int(datetime.now().strftime("%s"))
-                },
-            ],
-            'messages_exist': [
-                {
-                    'num_messages_exist': 0,
-                    'time_stamp': int(datetime.now().strftime("%s"))
-                },
-            ],
-        }
+        time_created = int(datetime.now().strftime("%s"))
+        store.set(('dreams_analytics',), {
+            'channels_exist': new_series('num_channels_exist', time_created),
+            'dms_exist': new_series('num_dms_exist', time_created),
+            'messages_exist': new_series('num_messages_exist', time_created),
+        })
 
     #* appending the user dictionary into the users list
-    data['users'].append({
+    store.append(('users',), {
         'email' : email,
         'password' : hashlib.sha256(password.encode()).hexdigest(),
         'name_first' : nameF,
@@ -139,44 +155,25 @@ def auth_register_v1(email, password, name_first, name_last):
         'u_id' : user_id,
         'handle_str' : handle_string,
         'permission_id': permissionID,
-        'session_id': [0],
+        'sessions': {'0': int(time.time()) + config.session_ttl},
+        'next_session_id': 1,
         'profile_img_url': f"{url}static/default.jpg",
     })
 
     
-    #* create an empty notification list
-    data['notifs'][f"{user_id}"] = [] 
+    #* create an empty ring of notifications
+    store.set(('notifs', f"{user_id}"), new_notifications())
 
     now = datetime.now()
     time_created = int(now.strftime("%s"))
     #* create an empty user_analytics
-    data['user_analytics'][f"{user_id}"] = {
-        "channels_joined" : [
-            {
-                "num_channels_joined" : 0,
-                "time_stamp" : time_created
-            }
-        ],
-        "dms_joined" : [
-            {
-                "num_dms_joined" : 0,
-                "time_stamp" : time_created
-            }
-        ],
-        "messages_sent" : [
-            {
-                "num_messages_sent" : 0,
-                "time_stamp" : time_created
-            }
-        ]
-    }
+    store.set(('user_analytics', f"{user_id}"), {
+        "channels_joined" : new_series("num_channels_joined", time_created),
+        "dms_joined" : new_series("num_dms_joined", time_created),
+        "messages_sent" : new_series("num_messages_sent", time_created),
+    })
 
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
-
-    return {
-        'auth_user_id': user_id
-    }
+    return user_id
 
 def check_handle(handle_string):
     """ Checks if inputted handle string is already being used by another registered user 
@@ -193,12 +190,9 @@ def check_handle(handle_string):
                 - false if not in use
 
     """ 
-    data = data_load()
-    for user in data['users']:
-        if handle_string == user['handle_str']:
-            return True
-    return False
+    return store.find('users', 'handle_str', handle_string) is not None
 
+@write_locked
 def auth_login_v2(email, password): 
     """ Checks if inputted email is present within the registered users
         If email is present, checks that the inputted password matches the password stored for 
@@ -216,29 +210,30 @@ def auth_login_v2(email, password):
             Returns (dict) containing user_id corresponding to the inputted email and password 
 
     """ 
-    data = data_load()
-    for user in data['users']:
-        if email == user.get('email') and hashlib.sha256(password.encode()).hexdigest() == user.get('password'):
-            if len(user['session_id']) != 0: 
-                new_session_id = user['session_id'][-1] + 1
-            else:
-                new_session_id = 0
-                
-            user['session_id'].append(new_session_id)
-            token = encode({'session_id': new_session_id, 'user_id': user['u_id']}, SECRET, algorithm='HS256')
+    #* One lookup and one hash, and a failed login leaves the workspace untouched
+    user = store.find('users', 'email', email)
+    if user is None or hashlib.sha256(password.encode()).hexdigest() != user['password']:
+        raise InputError
 
-            with open('data.json', 'w') as FILE:
-                json.dump(data, FILE)
+    #* Session ids are never reused, so a token that was logged out can never come back
+    new_session_id = user['next_session_id']
+    store.set(('users', user['u_id'], 'next_session_id'), new_session_id + 1)
+    store.set(('users', user['u_id'], 'sessions', f"{new_session_id}"), int(time.time()) + config.session_ttl)
 
-            return {
-                'token': token,
-                'auth_user_id': user['u_id'],
-            }
+    #* Sessions are kept in the order they were made, so the first is the oldest
+    if len(user['sessions']) > config.session_limit:
+        oldest = next(iter(user['sessions']))
+        store.delete(('users', user['u_id'], 'sessions', oldest))
+        forget_tokens(user['u_id'], int(oldest))
 
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    token = encode({'session_id': new_session_id, 'user_id': user['u_id']}, SECRET, algorithm='HS256')
 
-    raise InputError    
+    store.commit()
+
+    return {
+        'token': token,
+        'auth_user_id': user['u_id'],
+    }
 
 def auth_register_v2(email, password, name_first, name_last):
     """ This function is a wrapper for auth_register_v1. With the return value of auth_register_v1, a token containing
@@ -271,6 +266,7 @@ def auth_register_v2(email, password, name_first, name_last):
         'auth_user_id': auth_user_id
     }
 
+@write_locked
 def auth_logout_v1(token):
     """ 
         Provided a valid token, logs out the corresponding user session (invalidates session id and token) 
@@ -287,15 +283,13 @@ def auth_logout_v1(token):
     """
     auth_user_id, session_id = decode(token)
 
-    data = data_load()
-    for user in data['users']:
-        if user['u_id'] == auth_user_id:
-            if session_id in user['session_id']:
-                user['session_id'].remove(session_id)
-                with open('data.json', 'w') as FILE:
-                    json.dump(data, FILE)
-                return {'is_success': True}
+    #* decode has already found the session in the user's record, so it can be ended straight away
+    store.delete(('users', auth_user_id, 'sessions', f"{session_id}"))
+    store.commit()
+    forget_tokens(auth_user_id, session_id)
+    return {'is_success': True}
 
+@write_locked
 def auth_passwordreset_request_v1(email):
     '''
     Provided an email that matches a registered user's email, sends and email containing a password reset code
@@ -309,24 +303,36 @@ def auth_passwordreset_request_v1(email):
     Return Value:
         Upon sucess, returns the message to be sent in the email
     '''
+    user = store.find('users', 'email', email)
+    if user is None:
+        raise InputError
+
+    #* Workspaces saved before reset codes expired kept them in a list, which is dropped
     data = data_load()
-    for user in data['users']:
-        if user['email'] == email:
-            reset_code = generate_reset_code()
-            msg = Message('UNSW Dreams Password Reset', sender = 'W13BCactus@gmail.com', recipients = [f"{email}"])
-            msg.body = f"We've received your request for a password reset. Please use the following code to reset your password: \n {reset_code}"
-            for index, code in enumerate(data['reset_codes']):
-                if user['email'] == code['email']:
-                    data['reset_codes'].pop(index)
-            data['reset_codes'].append({
-                'email': user['email'],
-                'reset_code': reset_code
-            })
-            with open('data.json', 'w') as FILE:
-                json.dump(data, FILE)
-            return msg
-    raise InputError
+    if not isinstance(data['reset_codes'], dict):
+        store.set(('reset_codes',), {})
+        store.set(('reset_emails',), {})
+
+    reset_code = generate_reset_code()
+    while str(reset_code) in data['reset_codes']:
+        reset_code = generate_reset_code()
+    msg = Message('UNSW Dreams Password Reset', sender = 'W13BCactus@gmail.com', recipients = [f"{email}"])
+    msg.body = f"We've received your request for a password reset. Please use the following code to reset your password: \n {reset_code}"
+
+    #* Codes are keyed by the code itself, and each email points at its latest code
+    #* so that a new request invalidates the old one
+    old_code = data['reset_emails'].get(user['email'])
+    if old_code is not None:
+        store.delete(('reset_codes', old_code))
+    store.set(('reset_codes', str(reset_code)), {
+        'email': user['email'],
+        'expiry': int(time.time()) + config.reset_code_ttl,
+    })
+    store.set(('reset_emails', user['email']), str(reset_code))
+    store.commit()
+    return msg
 
+@write_locked
 def auth_passwordreset_reset_v1(reset_code, new_password):
     '''
     Provided a valid reset code, changes the corresponding user's password to new_password
@@ -346,14 +352,95 @@ def auth_passwordreset_reset_v1(reset_code, new_password):
         raise InputError
     
     data = data_load()
-    for index, code in enumerate(data['reset_codes']):
-        if reset_code == code['reset_code']:
-            data['reset_codes'].pop(index)
-            for user in data['users']:
-                if user['email'] == code['email']:
-                    user['password'] = hashlib.sha256(new_password.encode()).hexdigest()
-                    user['session_id'] = []
-                    with open('data.json', 'w') as FILE:
-                        json.dump(data, FILE)
-                    return {}
-    raise InputError
+    codes = data['reset_codes']
+    code = codes.get(str(reset_code)) if isinstance(codes, dict) else None
+    if code is None or code['expiry'] <= time.time():
+        raise InputError
+    user = store.find('users', 'email', code['email'])
+    if user is None:
+        raise InputError
+
+    forget_reset_code(str(reset_code))
+    store.set(('users', user['u_id'], 'password'), hashlib.sha256(new_password.encode()).hexdigest())
+    store.set(('users', user['u_id'], 'sessions'), {})
+    store.commit()
+    forget_tokens(user['u_id'])
+    return {}
+
+@write_locked
+def forget_reset_code(reset_code):
+    '''
+    Removes reset_code (a key of reset_codes) along with its email's pointer to it, without committing
+    '''
+    data = data_load()
+    email = data['reset_codes'][reset_code]['email']
+    store.delete(('reset_codes', reset_code))
+    if data['reset_emails'].get(email) == reset_code:
+        store.delete(('reset_emails', email))
+
+@write_locked
+def auth_reap_sessions():
+    '''
+    Ends every session that has expired, so that they no longer take up room in the user records
+
+    Arguments:
+        None
+
+    Exceptions:
+        None
+
+    Return Value:
+        Returns the number of sessions that were ended
+    '''
+    now = time.time()
+    reaped = 0
+    data = data_load()
+    for user in data['users']:
+        for session_id, expiry in list(user['sessions'].items()):
+            if expiry <= now:
+                store.delete(('users', user['u_id'], 'sessions', session_id))
+                forget_tokens(user['u_id'], int(session_id))
+                reaped += 1
+    if reaped:
+        store.commit()
+    return reaped
+
+@write_locked
+def auth_reap_reset_codes():
+    '''
+    Removes every password reset code that has expired, so they stop taking up room in the workspace
+
+    Arguments:
+        None
+
+    Exceptions:
+        None
+
+    Return Value:
+        Returns the number of reset codes that were removed
+    '''
+    now = time.time()
+    data = data_load()
+    if not isinstance(data['reset_codes'], dict):
+        return 0
+    expired = [code for code, entry in data['reset_codes'].items() if entry['expiry'] <= now]
+    for code in expired:
+        forget_reset_code(code)
+    if expired:
+        store.commit()
+    return len(expired)
+
+def start_session_reaper(interval=None):
+    '''
+    Starts a background thread which reaps expired sessions and reset codes every interval seconds
+    (config.session_reap_interval by default)
+    '''
+    interval = interval or config.session_reap_interval
+
+    def reap_forever():
+        while True:
+            time.sleep(interval)
+            auth_reap_sessions()
+            auth_reap_reset_codes()
+
+    threading.Thread(target=reap_forever, daemon=True).start()
@@ -1,10 +1,9 @@
 from src.error import AccessError, InputError 
 from src.channels import channels_listall_v2, channels_list_v2
-from src.other import decode, get_channel, get_user, message_count, push_added_notifications, check_removed, SECRET, get_user_permissions, data_load
+from src.other import decode, get_channel, get_user, message_count, get_conversation_messages, message_details, messages_page, push_added_notifications, check_removed, SECRET, get_user_permissions, data_load, record_stat
+from src.data import store, read_locked, write_locked
 import jwt
-import json
 import time
-from datetime import datetime
 
 AuID      = 'auth_user_id'
 uID       = 'u_id'
@@ -19,6 +18,7 @@ handle    = 'handle_string'
 dmID      = 'dm_id'
 seshID    = 'session_id'
 
+@write_locked
 def channel_invite_v1(token, channel_id, u_id):
     '''
     channel_invite_v1 checks if a user is authorised to invite another user to a channel and then automatically adds the
@@ -39,61 +39,34 @@ def channel_invite_v1(token, channel_id, u_id):
     '''
     auth_user_id, _ = decode(token)
 
-    data = data_load()
     #check if channel_id is valid
-    passed = False
-    for check in data['channels']:
-        if check['channel_id'] == channel_id:
-            passed = True
-            break
-    if passed == False:
-        raise InputError
-    
+    chan = get_channel(channel_id)
 
     # check if user is authorised to invite
-    for chans in data['channels']:
-        if chans["channel_id"] == channel_id:
-            userAuth = False
-            for users in chans["all_members"]:
-                if users == auth_user_id:
-                    userAuth = True
-                    break
-            if userAuth == False:
-                raise AccessError
-                    
+    if auth_user_id not in chan["all_members"]:
+        raise AccessError
+
     # should check for auth_user_id in channel info first for owners
 
     get_user(u_id)
     check_removed(u_id)
 
-    # now searches for channel_id
-    now = datetime.now()
-    time_created = int(now.strftime("%s"))
-    channelsJoinedPrev = data["user_analytics"][f"{u_id}"]['channels_joined'][-1]["num_channels_joined"]
-
-    for chan in data['channels']:
-        if chan["channel_id"] == channel_id:
-            # ensure no duplicates
-            if get_user_permissions(u_id) == 1 :
-                chan["owner_members"].append(u_id) if u_id not in chan["owner_members"] else None
-            chan["all_members"].append(u_id) if u_id not in chan["all_members"] else None
-            
-            #* update analytics
-            data["user_analytics"][f"{u_id}"]['channels_joined'].append(
-                {
-                    "num_channels_joined": channelsJoinedPrev + 1,
-                    "time_stamp": time_created
-                }
-            )   
-
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    # ensure no duplicates
+    if get_user_permissions(u_id) == 1 :
+        store.append(('channels', channel_id, "owner_members"), u_id) if u_id not in chan["owner_members"] else None
+    store.append(('channels', channel_id, "all_members"), u_id) if u_id not in chan["all_members"] else None
+
+    #* update analytics
+    record_stat(('user_analytics', f"{u_id}", 'channels_joined'), 1)
+
+    store.commit()
 
     push_added_notifications(auth_user_id, u_id, channel_id, -1)    
 
     return {   
     }
 
+@read_locked
 def channel_details_v1(token, channel_id):
     '''
     channel_details_v1 calls upon a new copy of the desired channel dictionary that only contains filtered keys and values that is public.
@@ -150,9 +123,6 @@ def channel_details_v1(token, channel_id):
                 allmem.append(get_user(user))
             dictAllMem = {"all_members" : allmem}
             filteredDetails.update(dictAllMem)
-
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
         
     return filteredDetails
 
@@ -160,6 +130,7 @@ def channel_details_v1(token, channel_id):
 
 
 
+@read_locked
 def channel_messages_v1(token, channel_id, start):
     '''
     channel_messages_v1 returns up to 50 messages within a specified channel.
@@ -191,31 +162,12 @@ def channel_messages_v1(token, channel_id, start):
     if num_of_messages <= desired_end:
         desired_end = -1
 
-    data = data_load()
-
-    messages = []
-    for objects in data['messages_log']:
-        if channel_id == objects[cID]:
-            current_message = objects.copy()
-            del current_message['channel_id']
-            del current_message['dm_id']
-            for current_react in current_message['reacts']: 
-                if auth_user_id in current_react['u_ids']:
-                    current_react['is_this_user_reacted'] = True 
-                else:
-                    current_react['is_this_user_reacted'] = False
-            messages.insert(0,current_message)
-
-    #Reverse list such that the we have the newest messages at the start and oldest at the end 
-    reversed(messages)
-
-    #Take 50 messages from our start value
-    #Chop off all the messages before our start value 
-    for _ in range(start):
-        messages.pop(0)
-    
-    while len(messages) > 50:
-        messages.pop(-1)
+    #Take 50 messages from our start value, walking back from the newest message
+    conversation = get_conversation_messages(channel_id, -1)
+    messages = [
+        message_details(objects, auth_user_id)
+        for objects in conversation.newest(start, start + 50)
+    ]
 
     return {
         'messages': messages,
@@ -223,6 +175,34 @@ def channel_messages_v1(token, channel_id, start):
         'end': desired_end,
     }
 
+@read_locked
+def channel_messages_v3(token, channel_id, cursor):
+    '''
+    channel_messages_v3 returns up to 50 messages within a specified channel, newest first.
+    Unlike channel_messages_v1 the page is picked with a cursor rather than an offset, so
+    pages do not shift while new messages arrive.
+    
+    Arguments:
+        token - The token of the user that is calling the channel messages. Must be present within that channel's "all_members".
+        channel_id (int) - The id of the desired channel which we want the messages of.
+        cursor (str) - A cursor from a previous call, or '' to start from the newest message.
+    
+    Exceptions:
+        InputError - Occurs when channel_id is not valid or the cursor is not valid.
+        AccessError - Occurs when authorised user is not a member of channel with channel_id.
+    
+    Return Value:
+        Returns up to 50 messages alongside next_cursor (older messages) and prev_cursor
+        (newer messages), each of which is '' when there are no more messages that way.
+    '''
+    auth_user_id, _ = decode(token)
+
+    if auth_user_id not in get_channel(channel_id)[allMems]:
+        raise AccessError
+
+    return messages_page(get_conversation_messages(channel_id, -1), cursor, auth_user_id)
+
+@write_locked
 def channel_leave_v1(token, channel_id):
     '''
     Takes in a user's id and a channel's id and removes that user from that given channel.
@@ -242,47 +222,30 @@ def channel_leave_v1(token, channel_id):
     '''
     auth_user_id, _ = decode(token)
 
-    data = data_load()
     # Get the channel directory from data.py
-    channelData = {}
-    channelFound = False
-    for aChannel in data['channels']:
-        if aChannel['channel_id'] == channel_id:
-            channelData = aChannel
-            channelFound = True
-    if not channelFound:
-        raise InputError
+    channelData = get_channel(channel_id)
 
+    # Check if user is in the channel
+    if auth_user_id not in channelData['all_members']:
+        raise AccessError
 
     # If the user is an owner
     if auth_user_id in channelData['owner_members']:
-        channelData['owner_members'].remove(auth_user_id) 
+        store.remove(('channels', channel_id, 'owner_members'), auth_user_id)
 
-    # Check if user is in the channel
-    if auth_user_id not in channelData['all_members']:
-        raise AccessError
-    
     # Time to remove from all_members list
-    channelData['all_members'].remove(auth_user_id)
+    store.remove(('channels', channel_id, 'all_members'), auth_user_id)
 
     #* update analytics
-    now = datetime.now()
-    time_created = int(now.strftime("%s"))
-    channelsJoinedPrev = data["user_analytics"][f"{auth_user_id}"]['channels_joined'][-1]["num_channels_joined"]
-    data["user_analytics"][f"{auth_user_id}"]['channels_joined'].append(
-        {
-            "num_channels_joined": channelsJoinedPrev - 1,
-            "time_stamp": time_created
-        }
-    )   
+    record_stat(('user_analytics', f"{auth_user_id}", 'channels_joined'), -1)
     
 
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.commit()
 
     return {
     }
 
+@write_locked
 def channel_join_v1(token, channel_id):
     '''
     Takes in a user's id and a channel's id and adds that user to that given channel.
@@ -304,61 +267,34 @@ def channel_join_v1(token, channel_id):
     '''
 
     # Find the channel in the database
-    channelFound = False
-    i = 0
-
-    data = data_load()
-    # Loop throug channel data base until channel is found
-    while not channelFound:
-        if i >= len(data['channels']):
-            # If channel doesn't exist in database, inputError
-            raise InputError
-        elif data['channels'][i]['channel_id'] == channel_id:
-            # If channel is found
-            channelFound = True
-        i += 1
+    # If channel doesn't exist in database, inputError
+    channel = get_channel(channel_id)
 
     auth_user_id, _ = decode(token)
-    i -= 1      # Undo extra increment
 
     # Time to find the user details
-    userFound = False
-    j = 0
-    while not userFound:
-        if data['users'][j]['u_id'] == auth_user_id:
-            userFound = True
-        j += 1
-
-    j -= 1      # Undo extra increment
+    user = store.row('users', auth_user_id)
     
-    if data['channels'][i]['is_public'] == False and data['users'][j]['permission_id'] != 1:
+    if channel['is_public'] == False and user['permission_id'] != 1:
         # If channel is private, AccessError
         raise AccessError
 
     # Time to add the user into the channel
-    data['channels'][i]['all_members'].append(data['users'][j]['u_id'])
+    store.append(('channels', channel_id, 'all_members'), user['u_id'])
 
     if get_user_permissions(auth_user_id) == 1:
-        data['channels'][i]['owner_members'].append(data['users'][j]['u_id'])
+        store.append(('channels', channel_id, 'owner_members'), user['u_id'])
 
     #* update analytics
-    now = datetime.now()
-    time_created = int(now.strftime("%s"))
-    channelsJoinedPrev = data["user_analytics"][f"{auth_user_id}"]['channels_joined'][-1]["num_channels_joined"]
-    data["user_analytics"][f"{auth_user_id}"]['channels_joined'].append(
-        {
-            "num_channels_joined": channelsJoinedPrev + 1,
-            "time_stamp": time_created
-        }
-    )   
-
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    record_stat(('user_analytics', f"{auth_user_id}", 'channels_joined'), 1)
+
+    store.commit()
         
     # Done, return empty list 
     return {
     }
 
+@write_locked
 def channel_addowner_v1(token, channel_id, u_id):
     '''
     channel_addowner_v1 adds user with the u_id parameter to the associated channel's owner members, granting them
@@ -377,70 +313,35 @@ def channel_addowner_v1(token, channel_id, u_id):
         Empty Dictionary
     '''
     auth_user_id, _ = decode(token)
-    data = data_load()
-    
-    passed = False
-    for check in data['channels']:
-        if check['channel_id'] == channel_id:
-            passed = True
-    if not passed:
+
+    chan = get_channel(channel_id)
+    if u_id in chan["owner_members"]:
         raise InputError
-        
-    for chans in data['channels']:
-        if chans["channel_id"] == channel_id:
-            alreadyOwner = False
-            for users in chans["owner_members"]:
-                if users == u_id:
-                    alreadyOwner = True
-            if alreadyOwner == True:
-                raise InputError
 
     # Access error
-    dreamsOwner = False
-    userAuth = False
-    for users in data['users']:
-        if users['u_id'] == auth_user_id:
-            if users['permission_id'] == 1:
-                dreamsOwner = True
-    for chans in data['channels']:
-        if chans["channel_id"] == channel_id:
-            for users in chans["owner_members"]:
-                if users == auth_user_id:
-                    userAuth = True
-                    break
-    
+    dreamsOwner = get_user_permissions(auth_user_id) == 1
+    userAuth = auth_user_id in chan["owner_members"]
+
     if dreamsOwner == False and userAuth == False:
         raise AccessError
-    
-    # now searches for channel_id
-    now = datetime.now()
-    time_created = int(now.strftime("%s"))
-    channelsJoinedPrev = data["user_analytics"][f"{auth_user_id}"]['channels_joined'][-1]["num_channels_joined"]  
-    for chan in data['channels']:
-        if chan["channel_id"] == channel_id:
-            # ensure no duplicates
-            if u_id not in chan["all_members"]:
-                chan["all_members"].append(u_id)
-                
-                #* update analytics
-
-                data["user_analytics"][f"{u_id}"]['channels_joined'].append(
-                    {
-                        "num_channels_joined": channelsJoinedPrev + 1,
-                        "time_stamp": time_created
-                    }
-                ) 
-                
-            chan["owner_members"].append(u_id) if u_id not in chan["owner_members"] else None
- 
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+
+    # ensure no duplicates
+    if u_id not in chan["all_members"]:
+        store.append(('channels', channel_id, "all_members"), u_id)
+
+        #* update analytics
+        record_stat(('user_analytics', f"{u_id}", 'channels_joined'), 1)
+
+    store.append(('channels', channel_id, "owner_members"), u_id)
+
+    store.commit()
 
     push_added_notifications(auth_user_id, u_id, channel_id,-1)
     
     return {
     }
 
+@write_locked
 def channel_removeowner_v1(token, channel_id, u_id):
     '''
     channel_removeowner_v1 removes user with the u_id parameter to the associated channel's owner members, revoking their
@@ -462,20 +363,14 @@ def channel_removeowner_v1(token, channel_id, u_id):
     auth_user_id, _ = decode(token)
     channel_deets = get_channel(channel_id)
 
-    data = data_load()
     if auth_user_id not in channel_deets['all_members'] and get_user_permissions(u_id) != 1:
         raise AccessError
     elif auth_user_id not in channel_deets['owner_members'] or len(channel_deets['owner_members']) == 1 or u_id not in channel_deets['owner_members']:
         raise InputError
 
-    for chan in data['channels']:
-        if chan["channel_id"] == channel_id:
-            for users in chan["owner_members"]:
-                if users == u_id:
-                    chan["owner_members"].remove(users)
+    store.remove(('channels', channel_id, "owner_members"), u_id)
 
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.commit()
 
     return {
     }
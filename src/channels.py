@@ -1,8 +1,7 @@
 from src.error import AccessError, InputError
-from src.other import decode, get_channel, get_user, data_load
-import json
+from src.other import decode, get_channel, get_user, data_load, record_stat
+from src.data import store, read_locked, write_locked
 import jwt
-from datetime import datetime
 
 AuID    = 'auth_user_id'
 uID     = 'u_id'
@@ -14,6 +13,7 @@ lName   = 'name_last'
 chans   = 'channels'
 token   = 'token'
 
+@read_locked
 def channels_list_v2(token):
     '''
     Provides a list of all channels (and their associated details) that the authorised user is part of
@@ -43,6 +43,7 @@ def channels_list_v2(token):
         'channels': output
     }
 
+@read_locked
 def channels_listall_v2(token):
     '''
     Provides a list of all channels (and their associated details)
@@ -72,6 +73,7 @@ def channels_listall_v2(token):
         'channels': output
     }
 
+@write_locked
 def channels_create_v1(token, name, is_public):
     '''
     Creates a channel and adds the user into that channel as both an owner and member
@@ -99,14 +101,7 @@ def channels_create_v1(token, name, is_public):
 
     data = data_load()
     # Time to find the user details
-    userFound = False
-    j = 0
-    while not userFound:
-        if data['users'][j][uID] == auth_user_id:
-            userFound = True
-        j += 1
-
-    j -= 1      # Undo extra increment
+    user = get_user(auth_user_id)
 
     # Identify the new channel ID
     # Which is an increment of the most recent channel id
@@ -118,34 +113,23 @@ def channels_create_v1(token, name, is_public):
 
     # Add this new channel into the channels data list
     # The only member is the auth user that created this channel
-    data['channels'].append(
+    store.append(('channels',),
         {
             'channel_id': newID,
             'is_public': is_public,
             'name': name,
-            'owner_members': [data['users'][j][uID]],
-            'all_members': [data['users'][j][uID]],
+            'owner_members': [user[uID]],
+            'all_members': [user[uID]],
         }
     )
 
-    updated_num_channels = data['dreams_analytics']['channels_exist'][-1]['num_channels_exist'] + 1
-    data['dreams_analytics']['channels_exist'].append({
-        'num_channels_exist': updated_num_channels,
-        'time_stamp': int(datetime.now().strftime("%s"))
-    })
+    record_stat(('dreams_analytics', 'channels_exist'), 1)
     
     #* update analytics
 
-    channelsJoinedPrev = data["user_analytics"][f"{auth_user_id}"]['channels_joined'][-1]["num_channels_joined"]
-    data["user_analytics"][f"{auth_user_id}"]['channels_joined'].append(
-        {
-            "num_channels_joined": channelsJoinedPrev + 1,
-            "time_stamp": int(datetime.now().strftime("%s"))
-        }
-    )   
+    record_stat(('user_analytics', f"{auth_user_id}", 'channels_joined'), 1)
 
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.commit()
 
     # Return a dictionary containing the new channel ID 
     return {
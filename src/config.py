@@ -1,3 +1,42 @@
 port = 8000
 
 url = f"http://localhost:{port}/"
+
+#* How often (in seconds) the data store snapshots data.json and compacts its log,
+#* and how many logged changes trigger a snapshot early
+snapshot_interval = 60
+snapshot_records = 10000
+
+#* How many verified tokens decode() remembers, so they skip the signature check and session lookup
+token_cache_size = 10000
+
+#* How long (in seconds) a login session lasts, how many sessions a user may hold at once
+#* (logging in again ends their oldest session) and how often expired sessions are reaped
+session_ttl = 7 * 24 * 60 * 60
+session_limit = 100
+session_reap_interval = 60 * 60
+
+#* How long (in seconds) a password reset code can be used for; expired codes are swept
+#* away by the session reaper
+reset_code_ttl = 60 * 60
+
+#* Outgoing email is sent in the background by mail_workers threads, up to mail_batch_size
+#* messages at a time. A batch that fails is retried mail_retries times, waiting mail_retry_delay
+#* seconds and twice as long after each failure. Setting mail_spool to a directory writes the
+#* messages there instead of sending them
+mail_workers = 2
+mail_batch_size = 20
+mail_retries = 5
+mail_retry_delay = 1
+mail_spool = None
+
+#* How many of their most recent notifications are kept for each user
+#* (notifications/get returns the 20 newest of them)
+notification_depth = 50
+
+#* The longest (in seconds) a long-poll for notifications waits, which is also how often
+#* the notification stream sends a keep-alive
+notification_wait = 30
+
+#* How many users a bulk import registers and commits at a time, holding the write lock
+import_batch_size = 100
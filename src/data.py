@@ -0,0 +1,812 @@
+'''
+In-process data store for UNSW Dreams
+
+The whole workspace is loaded once and then shared by every module in src.
+Modules read the workspace through data_load() and mutate it through the store's
+set/append/insert/remove/delete operations, then call commit() to persist the change.
+Read-only code never calls commit(), so serving a read performs no disk writes at all.
+
+Persistence is split in two:
+    - data.log  : an append-only log with one compact JSON record per operation.
+                  commit() only appends the records made since the last commit.
+    - data.json : a snapshot of the whole workspace. A background thread takes a new
+                  snapshot every so often and truncates the log (compaction).
+On startup the snapshot is loaded and the log is replayed over it. Rows saved by older
+versions of Dreams are then brought up to date (see upgrade_records), and the upgrade is
+logged like any other change.
+The store tracks whether anything changed since the last snapshot (dirty) so that an
+idle or read-only workload is never flushed.
+
+Both files are crash-safe: log records are fsynced on commit (unless commit(sync=False) is
+asked for, for frequent changes that may be lost to a power cut), and snapshots are written
+to a temporary file, fsynced and renamed over data.json so a reader never sees half a
+snapshot. Each snapshot and log carries a generation number, so a log which was already
+folded into a newer snapshot is never replayed twice.
+
+Rows are indexed by their id (see ROW_KEYS), by the unique fields in UNIQUE_FIELDS (lower-cased
+for the fields in CASELESS_FIELDS, so emails match whatever their case) and grouped by the
+fields in GROUP_FIELDS, each group keeping its rows in the order they were added at stable
+positions (so the messages of a channel or DM can be paged from any point).
+Rows are also indexed by the members listed in MEMBER_FIELDS (the channels and DMs a user
+is in, and how many users are in any at all), and the text fields in TEXT_FIELDS have
+trigram postings so a substring search only looks at rows that share every trigram of the query.
+The indexes are maintained by the same code that applies every operation, so they stay in
+sync with live changes and with replay alike, and row lookups are O(1).
+Each row's position in its collection is indexed too. A row of a collection in UNORDERED is
+deleted in O(1) by moving the collection's last row into its place. Every other collection
+keeps its rows in the order they were added (groups are rebuilt in that order on load, and
+lists such as the DMs are shown in it), so a delete there only shifts the rows after the
+deleted one, which is cheap for the recent rows that are usually deleted.
+
+Concurrency is handled by a reader/writer lock: every function that makes up the Dreams
+API is wrapped in read_locked or write_locked, so Flask's request threads, the sendlater
+timers and stand_up_push never interleave their changes.
+'''
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from src import config
+
+DATA_FILE = 'data.json'
+
+#* Collections which are lists of rows, mapped to the field that each row is keyed by
+ROW_KEYS = {
+    'users': 'u_id',
+    'channels': 'channel_id',
+    'dms': 'dm_id',
+    'messages_log': 'message_id',
+    'stand_ups': 'channel_id',
+}
+
+#* Other fields whose values are unique within a collection, so rows can be found by them
+UNIQUE_FIELDS = {
+    'users': ('email', 'handle_str'),
+}
+
+#* Unique fields which are compared without regard to case, so they are indexed lower-cased
+CASELESS_FIELDS = {
+    'users': ('email',),
+}
+
+#* Fields that rows are grouped by, each group holding its rows in the order they were added
+GROUP_FIELDS = {
+    'messages_log': ('channel_id', 'dm_id'),
+}
+
+#* Collections whose order is never relied on, so a deleted row can be replaced by the last row
+UNORDERED = {'stand_ups'}
+
+#* List fields holding the ids of a row's members, so rows can be found by member
+MEMBER_FIELDS = {
+    'channels': ('all_members',),
+    'dms': ('all_members',),
+}
+
+#* Text fields that rows can be searched by, mapped to the fields whose values split the
+#* search index into separate partitions (one per channel or DM for messages)
+TEXT_FIELDS = {
+    'messages_log': {'message': ('channel_id', 'dm_id')},
+}
+
+#* Log record operation codes
+SET    = 's'
+APPEND = 'a'
+INSERT = 'i'
+REMOVE = 'r'
+DELETE = 'd'
+#* Header record at the top of each log, naming the snapshot generation it follows
+GENERATION = 'g'
+
+#* Key that the generation is stored under inside a snapshot
+GENERATION_KEY = 'log_generation'
+
+def empty_data():
+    '''
+    Returns the contents of a freshly cleared workspace
+    '''
+    return {
+        'users': [],
+        'channels': [],
+        'dms': [],
+        'messages_log': [],
+        'notifs': {},
+        'user_analytics': {},
+        'stand_ups': [],
+        'reset_codes': {},
+        'reset_emails': {},
+        'next_message_id': 0,
+        'next_dm_id': 0,
+        'scheduled': {},
+        'next_job_id': 0,
+        'handle_suffixes': {}
+    }
+
+def upgrade_records(data):
+    '''
+    Returns the operations that bring rows saved by older versions of Dreams up to date,
+    which the store applies and logs whenever it loads a workspace
+    '''
+    records = []
+    #* Users used to keep a list of session ids that never expired
+    expiry = int(time.time()) + config.session_ttl
+    for user in data['users']:
+        if 'session_id' in user:
+            session_ids = user['session_id']
+            records.append([SET, ('users', user['u_id'], 'sessions'), {f"{session_id}": expiry for session_id in session_ids}])
+            records.append([SET, ('users', user['u_id'], 'next_session_id'), max(session_ids, default=-1) + 1])
+            records.append([DELETE, ('users', user['u_id'], 'session_id')])
+    return records
+
+class RWLock:
+    '''
+    A reader/writer lock: any number of readers or a single writer at a time
+
+    Both sides are re-entrant and the writer may also take the read side, so locked
+    functions can freely call each other. A reader can never upgrade to a writer.
+    Waiting writers hold back new readers so that writes are not starved.
+    '''
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = {}
+        self._writer = None
+        self._writes = 0
+        self._waiting = 0
+
+    @contextmanager
+    def read(self):
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self):
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+    def acquire_read(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me and me not in self._readers:
+                while self._writer is not None or self._waiting:
+                    self._cond.wait()
+            self._readers[me] = self._readers.get(me, 0) + 1
+
+    def release_read(self):
+        me = threading.get_ident()
+        with self._cond:
+            self._readers[me] -= 1
+            if not self._readers[me]:
+                del self._readers[me]
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writes += 1
+                return
+            if me in self._readers:
+                raise RuntimeError('cannot upgrade a read lock to a write lock')
+            self._waiting += 1
+            while self._writer is not None or self._readers:
+                self._cond.wait()
+            self._waiting -= 1
+            self._writer = me
+            self._writes = 1
+
+    def release_write(self):
+        with self._cond:
+            self._writes -= 1
+            if not self._writes:
+                self._writer = None
+                self._cond.notify_all()
+
+class Group:
+    '''
+    The rows that share one value of a grouped field, in the order they were added
+
+    Each row sits at a fixed position in a list, so any point of the group is reached in
+    O(1). Removing a row leaves a hole rather than shifting the rows after it, so positions
+    stay valid while a client pages through the group. Holes are dropped on the next load.
+    The positions of the rows still in the group are also kept in a list of their own, so
+    the n-th newest row is found in O(1) too.
+    '''
+    def __init__(self):
+        self._slots = []
+        self._positions = {}
+        self._live = []
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __iter__(self):
+        return (row for row in self._slots if row is not None)
+
+    def __reversed__(self):
+        return (row for row in reversed(self._slots) if row is not None)
+
+    @property
+    def end(self):
+        '''
+        The position just after the newest row
+        '''
+        return len(self._slots)
+
+    def add(self, key, row):
+        self._positions[key] = len(self._slots)
+        self._live.append(len(self._slots))
+        self._slots.append(row)
+
+    def discard(self, key):
+        position = self._positions.pop(key)
+        self._slots[position] = None
+        del self._live[bisect.bisect_left(self._live, position)]
+
+    def newest(self, start, stop):
+        '''
+        Returns the rows from the start-th newest up to (but excluding) the stop-th newest, newest first
+        '''
+        count = len(self._live)
+        positions = self._live[max(count - stop, 0):max(count - start, 0)]
+        return [self._slots[position] for position in reversed(positions)]
+
+    def position(self, key):
+        '''
+        Returns the position of the row keyed by key, or None if it is not in the group
+        '''
+        return self._positions.get(key)
+
+    def page(self, position, limit, older=True):
+        '''
+        Returns up to limit (position, row) pairs on one side of position, nearest first
+
+        Arguments:
+            position (int)  - Where to start from, the row at position itself is excluded
+            limit    (int)  - The most rows to return
+            older    (bool) - Walk towards the oldest row if True, otherwise the newest
+
+        Return Value:
+            A list of (position, row) tuples
+        '''
+        step = -1 if older else 1
+        position = min(max(position, -1), len(self._slots))
+        found = []
+        position += step
+        while 0 <= position < len(self._slots) and len(found) < limit:
+            if self._slots[position] is not None:
+                found.append((position, self._slots[position]))
+            position += step
+        return found
+
+class DataStore:
+    '''
+    Owns the workspace state for the whole process
+
+    Paths passed to the mutation operations are tuples of keys walked from the top of the
+    workspace. When the first key names a collection in ROW_KEYS, the second key is the id
+    of a row in that collection rather than a list index, e.g.
+        ('channels', channel_id, 'all_members')
+        ('messages_log', message_id, 'reacts', 0, 'u_ids')
+    Every operation is recorded as [op, path, *args] so that it can be replayed from the log.
+    '''
+    def __init__(self, path=DATA_FILE, log_path=None):
+        self.path = path
+        self.log_path = log_path or f"{os.path.splitext(path)[0]}.log"
+        self.lock = RWLock()
+        self._load_lock = threading.Lock()
+        self._data = None
+        self._rows = {}
+        self._positions = {}
+        self._unique = {}
+        self._groups = {}
+        self._members = {}
+        self._participants = {}
+        self._text = {}
+        self._generation = 0
+        self._pending = []
+        self._log = None
+        self._logged = 0
+        self._unsynced = False
+        self._dirty = False
+        self._snapshot_due = threading.Event()
+        self._snapshotter = None
+
+    @property
+    def data(self):
+        '''
+        The live workspace dictionary, loaded from disk on first use
+        '''
+        self._ensure_loaded()
+        return self._data
+
+    @property
+    def dirty(self):
+        '''
+        Whether the workspace has changed since the last snapshot was written
+        '''
+        return self._dirty
+
+    def load(self):
+        '''
+        (Re)loads the workspace from the last snapshot and replays the log over it,
+        starting empty if nothing has been saved yet
+        '''
+        with self.lock.write():
+            self._load()
+
+    def commit(self, sync=True):
+        '''
+        Appends every operation made since the last commit to the log and syncs it to disk
+
+        Arguments:
+            sync (bool) - If False the log is only written, not synced: the operations outlive the
+                          process (even a crash) but not the machine losing power, until a later commit
+        '''
+        with self.lock.write():
+            self._flush(sync)
+
+    def snapshot(self):
+        '''
+        Atomically replaces the snapshot file with the whole workspace and truncates the log
+        '''
+        with self.lock.write():
+            self.commit()
+            generation = self._generation + 1
+            snapshot = dict(self.data)
+            snapshot[GENERATION_KEY] = generation
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as FILE:
+                json.dump(snapshot, FILE)
+                FILE.flush()
+                os.fsync(FILE.fileno())
+            os.replace(temp_path, self.path)
+            self._generation = generation
+            self._start_log()
+            self._logged = 0
+            self._dirty = False
+
+    def clear(self):
+        '''
+        Resets the workspace to an empty state and persists it
+        '''
+        with self.lock.write():
+            self._data = empty_data()
+            self._reindex()
+            self._pending = []
+            self.snapshot()
+
+    def start_snapshots(self, interval=None):
+        '''
+        Starts the background thread which periodically snapshots and compacts the log
+        '''
+        if self._snapshotter is not None:
+            return
+        interval = interval or config.snapshot_interval
+        self._snapshotter = threading.Thread(target=self._snapshot_loop, args=(interval,), daemon=True)
+        self._snapshotter.start()
+
+    def get(self, path):
+        '''
+        Returns the value found at path
+
+        Exceptions:
+            KeyError - Raised when a row id in the path does not exist
+        '''
+        with self.lock.read():
+            return self._resolve(path)
+
+    def row(self, collection, key):
+        '''
+        Returns the row of collection whose id is key
+
+        Exceptions:
+            KeyError - Raised when there is no such row
+        '''
+        with self.lock.read():
+            return self._row(collection, key)
+
+    def find(self, collection, field, value):
+        '''
+        Returns the row of collection whose unique field equals value, or None
+        '''
+        with self.lock.read():
+            self._ensure_loaded()
+            return self._unique[(collection, field)].get(self._unique_key(collection, field, value))
+
+    def group(self, collection, field, value):
+        '''
+        Returns the Group of rows of collection whose field equals value
+        '''
+        with self.lock.read():
+            self._ensure_loaded()
+            return self._groups[(collection, field)].get(value) or Group()
+
+    def memberships(self, collection, member):
+        '''
+        Returns the set of ids of the rows of collection that list member as a member
+        '''
+        with self.lock.read():
+            self._ensure_loaded()
+            field, = MEMBER_FIELDS[collection]
+            return self._members[(collection, field)].get(member, set())
+
+    def participants(self):
+        '''
+        Returns how many distinct members are listed by at least one row of any collection in MEMBER_FIELDS
+        '''
+        with self.lock.read():
+            self._ensure_loaded()
+            return len(self._participants)
+
+    def search(self, collection, field, partition, text):
+        '''
+        Returns the rows of collection whose field contains text, ignoring case
+
+        The rows are produced lazily, so callers should consume them while they hold
+        the store's read lock (as every locked API function does).
+
+        Arguments:
+            collection (str)   - A collection listed in TEXT_FIELDS
+            field      (str)   - The text field to search
+            partition  (tuple) - The values of the partition fields to search within
+            text       (str)   - The text to look for
+
+        Return Value:
+            An iterator over the rows, in no particular order
+        '''
+        with self.lock.read():
+            self._ensure_loaded()
+            postings = self._text[(collection, field)].get(tuple(partition))
+            if postings is None:
+                return iter(())
+            text = text.lower()
+            trigrams = self._trigrams(text)
+            if trigrams:
+                #* Intersect the shortest postings first so the candidate set stays small
+                lists = sorted((postings.get(trigram, set()) for trigram in trigrams), key=len)
+                candidates = lists[0].intersection(*lists[1:])
+            else:
+                candidates = postings[None]
+            rows = self._rows[collection]
+            return (rows[key] for key in candidates if text in rows[key][field].lower())
+
+    def set(self, path, value):
+        self._write([SET, path, value])
+
+    def append(self, path, value):
+        self._write([APPEND, path, value])
+
+    def insert(self, path, index, value):
+        self._write([INSERT, path, index, value])
+
+    def remove(self, path, value):
+        '''
+        Removes the first occurrence of value from the list found at path
+        '''
+        self._write([REMOVE, path, value])
+
+    def delete(self, path):
+        '''
+        Deletes whatever path points to: a row of a collection, a key of a dictionary
+        or an index of a list
+        '''
+        self._write([DELETE, path])
+
+    def _ensure_loaded(self):
+        if self._data is None:
+            with self._load_lock:
+                if self._data is None:
+                    self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as FILE:
+                self._data = json.load(FILE)
+        except FileNotFoundError:
+            self._data = empty_data()
+        self._generation = self._data.pop(GENERATION_KEY, 0)
+        self._reindex()
+        self._pending = []
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        self._logged = self._replay()
+        self._dirty = self._logged > 0
+        #* Loading may already hold the read lock, so the upgrades are applied and logged
+        #* without taking the write lock
+        for record in upgrade_records(self._data):
+            self._apply(record)
+            self._pending.append(self._encode(record))
+            self._dirty = True
+        self._flush()
+
+    def _flush(self, sync=True):
+        if not self._pending:
+            if sync and self._unsynced and self._log is not None:
+                os.fsync(self._log.fileno())
+                self._unsynced = False
+            return
+        if self._log is None:
+            self._log = open(self.log_path, 'a')
+        self._log.write(''.join(self._pending))
+        self._log.flush()
+        if sync:
+            os.fsync(self._log.fileno())
+        self._unsynced = not sync
+        self._logged += len(self._pending)
+        self._pending = []
+        if self._logged >= config.snapshot_records:
+            self._snapshot_due.set()
+
+    def _write(self, record):
+        with self.lock.write():
+            self._apply(record)
+            self._dirty = True
+            #* Serialise straight away so later changes to the same objects
+            #* are not captured twice when the record is flushed
+            self._pending.append(self._encode(record))
+
+    def _apply(self, record):
+        path = record[1]
+        if len(path) >= 3 and path[2] in MEMBER_FIELDS.get(path[0], ()):
+            #* Member lists are short, so the row's memberships are simply redone
+            row = self._row(path[0], path[1])
+            self._unindex_members(path[0], row)
+            self._mutate(record)
+            self._index_members(path[0], row)
+        else:
+            self._mutate(record)
+
+    def _mutate(self, record):
+        op, path = record[0], record[1]
+        if op == SET:
+            parent = self._resolve(path[:-1])
+            if len(path) == 3 and path[2] in TEXT_FIELDS.get(path[0], {}) and not self._is_keyed(path[0], path[2]):
+                #* Only the text changed, so the row keeps its place in its groups
+                self._unindex_text(path[0], parent)
+                parent[path[-1]] = record[2]
+                self._index_text(path[0], parent)
+            elif len(path) == 3 and self._is_indexed(path[0], path[2]):
+                position = self._unindex_row(path[0], parent)
+                parent[path[-1]] = record[2]
+                self._index_row(path[0], parent, position)
+            else:
+                parent[path[-1]] = record[2]
+        elif op == APPEND:
+            rows = self._resolve(path)
+            rows.append(record[2])
+            if len(path) == 1 and path[0] in ROW_KEYS:
+                self._index_row(path[0], record[2], len(rows) - 1)
+        elif op == INSERT:
+            self._resolve(path).insert(record[2], record[3])
+        elif op == REMOVE:
+            self._resolve(path).remove(record[2])
+        elif len(path) == 2 and path[0] in ROW_KEYS:
+            rows = self.data[path[0]]
+            positions = self._positions[path[0]]
+            position = self._unindex_row(path[0], self._row(path[0], path[1]))
+            if path[0] in UNORDERED:
+                #* Move the last row into the deleted row's place rather than shifting the rows after it
+                last = rows.pop()
+                if position < len(rows):
+                    rows[position] = last
+                    positions[last[ROW_KEYS[path[0]]]] = position
+            else:
+                del rows[position]
+                for index in range(position, len(rows)):
+                    positions[rows[index][ROW_KEYS[path[0]]]] = index
+        else:
+            del self._resolve(path[:-1])[path[-1]]
+
+    def _reindex(self):
+        self._rows = {collection: {} for collection in ROW_KEYS}
+        self._positions = {collection: {} for collection in ROW_KEYS}
+        self._unique = {
+            (collection, field): {}
+            for collection, fields in UNIQUE_FIELDS.items() for field in fields
+        }
+        self._groups = {
+            (collection, field): {}
+            for collection, fields in GROUP_FIELDS.items() for field in fields
+        }
+        self._members = {
+            (collection, field): {}
+            for collection, fields in MEMBER_FIELDS.items() for field in fields
+        }
+        self._participants = {}
+        self._text = {
+            (collection, field): {}
+            for collection, fields in TEXT_FIELDS.items() for field in fields
+        }
+        for collection in ROW_KEYS:
+            for position, row in enumerate(self._data[collection]):
+                self._index_row(collection, row, position)
+
+    @staticmethod
+    def _is_indexed(collection, field):
+        return collection in ROW_KEYS and (
+            DataStore._is_keyed(collection, field)
+            or field in TEXT_FIELDS.get(collection, {})
+        )
+
+    @staticmethod
+    def _is_keyed(collection, field):
+        #* Whether rows are found or placed by field, other than through their text
+        return collection in ROW_KEYS and (
+            field == ROW_KEYS[collection]
+            or field in UNIQUE_FIELDS.get(collection, ())
+            or field in GROUP_FIELDS.get(collection, ())
+            or any(field in partition for partition in TEXT_FIELDS.get(collection, {}).values())
+        )
+
+    @staticmethod
+    def _unique_key(collection, field, value):
+        if field in CASELESS_FIELDS.get(collection, ()) and isinstance(value, str):
+            return value.lower()
+        return value
+
+    @staticmethod
+    def _trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def _index_row(self, collection, row, position):
+        key = row[ROW_KEYS[collection]]
+        self._rows[collection][key] = row
+        self._positions[collection][key] = position
+        for field in UNIQUE_FIELDS.get(collection, ()):
+            self._unique[(collection, field)][self._unique_key(collection, field, row[field])] = row
+        for field in GROUP_FIELDS.get(collection, ()):
+            groups = self._groups[(collection, field)]
+            if row[field] not in groups:
+                groups[row[field]] = Group()
+            groups[row[field]].add(key, row)
+        self._index_text(collection, row)
+        self._index_members(collection, row)
+
+    def _unindex_row(self, collection, row):
+        key = row[ROW_KEYS[collection]]
+        del self._rows[collection][key]
+        for field in UNIQUE_FIELDS.get(collection, ()):
+            self._unique[(collection, field)].pop(self._unique_key(collection, field, row[field]), None)
+        for field in GROUP_FIELDS.get(collection, ()):
+            self._groups[(collection, field)][row[field]].discard(key)
+        self._unindex_text(collection, row)
+        self._unindex_members(collection, row)
+        return self._positions[collection].pop(key)
+
+    def _index_text(self, collection, row):
+        key = row[ROW_KEYS[collection]]
+        for field, partition in TEXT_FIELDS.get(collection, {}).items():
+            postings = self._text[(collection, field)].setdefault(
+                tuple(row[value] for value in partition), {None: set()}
+            )
+            postings[None].add(key)
+            for trigram in self._trigrams(row[field].lower()):
+                postings.setdefault(trigram, set()).add(key)
+
+    def _unindex_text(self, collection, row):
+        key = row[ROW_KEYS[collection]]
+        for field, partition in TEXT_FIELDS.get(collection, {}).items():
+            postings = self._text[(collection, field)][tuple(row[value] for value in partition)]
+            postings[None].discard(key)
+            for trigram in self._trigrams(row[field].lower()):
+                postings[trigram].discard(key)
+                if not postings[trigram]:
+                    del postings[trigram]
+
+    def _index_members(self, collection, row):
+        for field in MEMBER_FIELDS.get(collection, ()):
+            members = self._members[(collection, field)]
+            for member in row[field]:
+                rows = members.setdefault(member, set())
+                if not rows:
+                    self._participants[member] = self._participants.get(member, 0) + 1
+                rows.add(row[ROW_KEYS[collection]])
+
+    def _unindex_members(self, collection, row):
+        for field in MEMBER_FIELDS.get(collection, ()):
+            members = self._members[(collection, field)]
+            for member in row[field]:
+                rows = members[member]
+                if not rows:
+                    continue
+                rows.discard(row[ROW_KEYS[collection]])
+                if not rows:
+                    self._participants[member] -= 1
+                    if not self._participants[member]:
+                        del self._participants[member]
+
+    def _replay(self):
+        replayed = 0
+        offset = 0
+        try:
+            with open(self.log_path, 'rb+') as FILE:
+                for line in FILE:
+                    #* Only the final record can be torn by a crash mid-write,
+                    #* cut it off so that new records are not appended onto it
+                    try:
+                        record = json.loads(line) if line.endswith(b'\n') else None
+                    except ValueError:
+                        record = None
+                    if record is None:
+                        FILE.truncate(offset)
+                        break
+                    if record[0] == GENERATION and record[1] != self._generation:
+                        #* The snapshot already contains this log
+                        offset = 0
+                        break
+                    if record[0] != GENERATION:
+                        self._apply(record)
+                        replayed += 1
+                    offset += len(line)
+            if offset:
+                return replayed
+        except FileNotFoundError:
+            pass
+        #* There is no usable log for this snapshot, so start a fresh one
+        self._start_log()
+        return replayed
+
+    def _start_log(self):
+        if self._log is not None:
+            self._log.close()
+        self._log = open(self.log_path, 'w')
+        self._log.write(self._encode([GENERATION, self._generation]))
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._unsynced = False
+
+    def _snapshot_loop(self, interval):
+        while True:
+            self._snapshot_due.wait(interval)
+            self._snapshot_due.clear()
+            if self.dirty:
+                self.snapshot()
+
+    def _resolve(self, path):
+        node = self.data
+        for depth, key in enumerate(path):
+            if depth == 1 and path[0] in ROW_KEYS:
+                node = self._row(path[0], key)
+            else:
+                node = node[key]
+        return node
+
+    def _row(self, collection, key):
+        self._ensure_loaded()
+        return self._rows[collection][key]
+
+    @staticmethod
+    def _encode(record):
+        return json.dumps(record, separators=(',', ':')) + '\n'
+
+store = DataStore()
+
+def read_locked(function):
+    '''
+    Decorator for functions that only read the workspace
+    '''
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with store.lock.read():
+            return function(*args, **kwargs)
+    return wrapper
+
+def write_locked(function):
+    '''
+    Decorator for functions that change the workspace
+    '''
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with store.lock.write():
+            return function(*args, **kwargs)
+    return wrapper
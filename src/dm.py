@@ -1,10 +1,9 @@
 from flask import Flask, request
 from src.error import AccessError, InputError
-from src.other import decode, get_user, get_dm, message_count, get_user_from_handlestring, push_added_notifications, check_removed, data_load
+from src.other import decode, get_user, get_dm, message_count, get_conversation_messages, messages_page, get_user_from_handlestring, push_added_notifications, check_removed, data_load, record_stat, generate_new_dm_id
+from src.data import store, read_locked, write_locked
 import src.auth
-import json
 import jwt
-from datetime import datetime
 
 
 APP = Flask(__name__)
@@ -24,6 +23,7 @@ dmID      = 'dm_id'
 seshID    = 'session_id'
 thumbsUp = 1
 
+@read_locked
 def dm_details_v1(token, dm_id):
     '''
     Users that are part of a DM can view basic information about the DM
@@ -56,6 +56,7 @@ def dm_details_v1(token, dm_id):
         'members': mOutput,
     }
 
+@read_locked
 def dm_list_v1(token):
     '''
     Returns the list of DMs that the user is a member of
@@ -87,6 +88,7 @@ def dm_list_v1(token):
         'dms': output
     }
     
+@write_locked
 def dm_create_v1(token, u_ids):
     '''
     Creates a DM with the creator and the users it is directed to
@@ -108,19 +110,10 @@ def dm_create_v1(token, u_ids):
     '''
     creator_id, _ = decode(token)
 
-    data = data_load()
-
-    if len(data['dms']) == 0:
-        dm_ID = 0
-    else:
-        dm_ID = data['dms'][-1][dmID] + 1
-
     dmUsers = [creator_id]
     for user_id in u_ids:
         dmUsers.append(user_id)
 
-    now = datetime.now()
-    time_created = int(now.strftime("%s"))
 
     handles = []
     for user in dmUsers:
@@ -130,33 +123,25 @@ def dm_create_v1(token, u_ids):
         handles.sort()
         dm_name = ', '.join(handles)
 
-        #* update analytics
-        dmJoinedPrev = data["user_analytics"][f"{user}"]['dms_joined'][-1]["num_dms_joined"]
-        data["user_analytics"][f"{user}"]['dms_joined'].append(
-            {
-                "num_dms_joined": dmJoinedPrev + 1,
-                "time_stamp": time_created
-            }
-        )  
-
     for user_id in u_ids:
         check_removed(user_id)
 
-    data['dms'].append({
+    #* Every user is valid, so the changes can now be made
+    dm_ID = generate_new_dm_id()
+    for user in dmUsers:
+        #* update analytics
+        record_stat(('user_analytics', f"{user}", 'dms_joined'), 1)
+
+    store.append(('dms',), {
         dmID: dm_ID,
         Name: dm_name,
         creatorID: creator_id,
         'all_members': dmUsers,
     })
 
-    updated_num_dms = data['dreams_analytics']['dms_exist'][-1]['num_dms_exist'] + 1
-    data['dreams_analytics']['dms_exist'].append({
-        'num_dms_exist': updated_num_dms,
-        'time_stamp': int(datetime.now().strftime("%s"))
-    })
+    record_stat(('dreams_analytics', 'dms_exist'), 1)
 
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.commit()
 
     for user in u_ids:
         push_added_notifications(creator_id, user, -1, dm_ID)
@@ -166,6 +151,7 @@ def dm_create_v1(token, u_ids):
         'dm_name': dm_name
     }
 
+@write_locked
 def dm_remove_v1(token, dm_id):
     '''
     Removes a DM created by user 
@@ -185,51 +171,25 @@ def dm_remove_v1(token, dm_id):
     '''
     #ASSUMPTION: Rest of dms retain same dm_ids when a dm is removed
     auth_user_ID, _ = decode(token)
-    input_error = True
 
-    data = data_load()
+    if auth_user_ID != get_dm(dm_id)['creator_id']:
+        raise AccessError
 
-    for items in data['dms']:
-        #Loop for input errors:
-        if dm_id == items['dm_id']:
-            input_error = False
-            if auth_user_ID != items['creator_id']:
-                raise AccessError
+    #Now that errors are fixed, can remove the existing DM with dm_id
 
-    if input_error:
-        raise InputError
+    dmMems = get_dm(dm_id)[allMems]
+    for user_id in dmMems:
+        record_stat(('user_analytics', f"{user_id}", 'dms_joined'), -1)
+    
+    store.delete(('dms', dm_id))
 
-    #Now that errors are fixed, can remove the existing DM with dm_id
-    #Loop through dm_list, once dm_id is found remove it
-
-    now = datetime.now()
-    time_created = int(now.strftime("%s"))
-
-    for objects in data['dms']:
-        if objects['dm_id'] == dm_id:
-            dmMems = get_dm(dm_id)[allMems]
-            for user_id in dmMems:
-                dmJoinedPrev = data["user_analytics"][f"{user_id}"]['dms_joined'][-1]["num_dms_joined"]
-                data["user_analytics"][f"{user_id}"]['dms_joined'].append(
-                    {
-                    "num_dms_joined": dmJoinedPrev - 1,
-                    "time_stamp": time_created
-                    }
-                )  
-            
-            data['dms'].remove(objects)
-
-    updated_num_dms = data['dreams_analytics']['dms_exist'][-1]['num_dms_exist'] - 1
-    data['dreams_analytics']['dms_exist'].append({
-        'num_dms_exist': updated_num_dms,
-        'time_stamp': int(datetime.now().strftime("%s"))
-    })
+    record_stat(('dreams_analytics', 'dms_exist'), -1)
     
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.commit()
 
     return {}
 
+@write_locked
 def dm_invite_v1(token, dm_id, u_id):
     '''
     Invites a user to join an existing dm
@@ -252,41 +212,24 @@ def dm_invite_v1(token, dm_id, u_id):
     auth_user_ID, _ = decode(token)
     get_user(u_id)
     check_removed(u_id)
-    input_error = True
 
-    now = datetime.now()
-    time_created = int(now.strftime("%s"))
-    data = data_load()
+    dm = get_dm(dm_id)
+    if auth_user_ID not in dm['all_members']:
+        raise AccessError
 
-    for items in data['dms']:
-        #Loop for input errors:
-        if dm_id == items['dm_id']:
-            input_error = False
-            if auth_user_ID not in items['all_members']:
-                raise AccessError
-            else:
-                #If no errors found can add dm to list
-                items['all_members'].append(u_id) if u_id not in items["all_members"] else None
-                
-                #* update analytics
-
-                dmJoinedPrev = data["user_analytics"][f"{u_id}"]['dms_joined'][-1]["num_dms_joined"]
-                data["user_analytics"][f"{u_id}"]['dms_joined'].append(
-                    {
-                    "num_dms_joined": dmJoinedPrev + 1,
-                    "time_stamp": time_created
-                    }
-                )  
-                with open('data.json', 'w') as FILE:
-                    json.dump(data, FILE)
-                push_added_notifications(auth_user_ID, u_id, -1, dm_id)
-
-    if input_error:
-        raise InputError
+    #If no errors found can add dm to list
+    store.append(('dms', dm_id, 'all_members'), u_id) if u_id not in dm["all_members"] else None
+
+    #* update analytics
+
+    record_stat(('user_analytics', f"{u_id}", 'dms_joined'), 1)
+    store.commit()
+    push_added_notifications(auth_user_ID, u_id, -1, dm_id)
 
     return {}
 
 
+@write_locked
 def dm_leave_v1(token, dm_id):
     '''
     Current user to leave DM with dm_id 
@@ -304,41 +247,25 @@ def dm_leave_v1(token, dm_id):
         {}
     '''
     auth_user_ID, _ = decode(token)
-    input_error = True
-    data = data_load()
 
-    now = datetime.now()
-    time_created = int(now.strftime("%s"))
-    for items in data['dms']:
-        #Loop for input errors:
-        if dm_id == items['dm_id']:
-            input_error = False
-            if auth_user_ID is items['creator_id']:
-                return {}
-            elif auth_user_ID not in items['all_members']:
-                raise AccessError
-            else:
-                #If error not found remove dm from list 
-                items['all_members'].remove(auth_user_ID)
+    dm = get_dm(dm_id)
+    if auth_user_ID is dm['creator_id']:
+        return {}
+    elif auth_user_ID not in dm['all_members']:
+        raise AccessError
 
-                #* user analytics
+    #If error not found remove dm from list 
+    store.remove(('dms', dm_id, 'all_members'), auth_user_ID)
 
-                dmJoinedPrev = data["user_analytics"][f"{auth_user_ID}"]['dms_joined'][-1]["num_dms_joined"]
-                data["user_analytics"][f"{auth_user_ID}"]['dms_joined'].append(
-                    {
-                    "num_dms_joined": dmJoinedPrev - 1,
-                    "time_stamp": time_created
-                    }
-                )  
+    #* user analytics
 
-    if input_error:
-        raise InputError
+    record_stat(('user_analytics', f"{auth_user_ID}", 'dms_joined'), -1)
 
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.commit()
 
     return {}
 
+@read_locked
 def dm_messages_v1(token, dm_id, start):
     '''
     Return up to 50 messages from a DM with dm_id between index "start" and "start + 50"
@@ -378,34 +305,58 @@ def dm_messages_v1(token, dm_id, start):
     if num_of_messages <= desired_end:
         desired_end = -1
 
-    data = data_load()
+    #Take 50 messages from our start value, walking back from the newest message
+    conversation = get_conversation_messages(-1, dm_id)
     messages = []
-    for objects in data['messages_log']:
-        if dm_id == objects[dmID]:
-            current_DM = objects.copy()
-            del current_DM[cID]
-            del current_DM['dm_id']       
-            for reacts in current_DM['reacts']:    
-                if reacts['react_id'] == thumbsUp:
-                    reacts['is_this_user_reacted'] = True 
-                else:
-                    reacts['is_this_user_reacted'] = False
-            
-            messages.insert(0,current_DM)
-
-    #Reverse list such that the we have the newest messages at the start and oldest at the end 
-    reversed(messages)
-
-    #Take 50 messages from our start value
-    #Chop off all the messages before our start value 
-    for _ in range(start):
-        messages.pop(0)
-    
-    while len(messages) > 50:
-        messages.pop(-1)
+    for objects in conversation.newest(start, start + 50):
+        current_DM = objects.copy()
+        del current_DM[cID]
+        del current_DM['dm_id']       
+        #* Copy the reacts so the stored message is left untouched
+        current_DM['reacts'] = []
+        for reacts in objects['reacts']:    
+            reacts = reacts.copy()
+            if reacts['react_id'] == thumbsUp:
+                reacts['is_this_user_reacted'] = True 
+            else:
+                reacts['is_this_user_reacted'] = False
+            current_DM['reacts'].append(reacts)
+        messages.append(current_DM)
     
     return {
         'messages': messages,
         'start': start,
         'end': desired_end,
     }
+
+@read_locked
+def dm_messages_v3(token, dm_id, cursor):
+    '''
+    Given a DM with dm_id that the authorised user is part of, return up to 50 messages, newest first.
+    Unlike dm_messages_v1 the page is picked with a cursor rather than an offset, so pages do
+    not shift while new messages arrive.
+
+    Arguments:
+        token (str) - The token of the authorised user
+        dm_id (int) - The id of the DM
+        cursor (str) - A cursor from a previous call, or '' to start from the newest message
+
+    Exceptions:
+        InputError
+            - Raised when the dm_id inputed is not valid
+            - Raised when the cursor is not valid
+
+        AccessError
+            - Raised when an invalid token is given
+            - Raised when the authorised user is not a member of the DM corresponding to the dm_id
+
+    Return Value:
+        Returns a dictionary with key 'messages', 'next_cursor', and 'prev_cursor'
+        'next_cursor' fetches the older messages and 'prev_cursor' the newer ones, either is '' when there are none
+    '''
+    auth_user_id, _ = decode(token)
+
+    if auth_user_id not in get_dm(dm_id)[allMems]:
+        raise AccessError
+
+    return messages_page(get_conversation_messages(-1, dm_id), cursor, auth_user_id)
@@ -0,0 +1,132 @@
+'''
+Background delivery of outgoing email for UNSW Dreams
+
+Routes never talk to the mail server themselves: they hand their messages to send_mail(),
+which only puts them on the outbox queue, so a slow or hung mail server can not hold up a
+request. A pool of worker threads started by start_mailer() takes messages off the queue,
+up to config.mail_batch_size at a time, and hands each batch to a transport.
+
+A transport is any function that takes a list of messages and sends them all, raising an
+exception if it could not. smtp_transport() sends a batch over a single connection to the
+mail server, and spool_transport() writes each message to a file instead (for testing, or
+for running the server without a mail server). A batch that fails is retried up to
+config.mail_retries times, waiting config.mail_retry_delay seconds before the first retry
+and twice as long before each one after it.
+'''
+import itertools
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from src import config
+
+#* Messages waiting to be sent, and the worker threads sending them
+outbox = queue.Queue()
+workers = []
+
+def send_mail(message):
+    '''
+    Queues message to be sent in the background and returns straight away
+    '''
+    outbox.put(message)
+
+def flush_mail():
+    '''
+    Waits until every queued message has been sent (or given up on)
+    '''
+    outbox.join()
+
+def smtp_transport(app, mail):
+    '''
+    Returns a transport which sends each batch over one connection made by flask_mail's mail
+    '''
+    def send(messages):
+        #* flask_mail looks up its settings through the Flask application
+        with app.app_context():
+            with mail.connect() as connection:
+                for message in messages:
+                    connection.send(message)
+    return send
+
+def spool_transport(directory):
+    '''
+    Returns a transport which writes each message to its own JSON file in directory
+    '''
+    os.makedirs(directory, exist_ok=True)
+    numbers = itertools.count()
+
+    def send(messages):
+        for message in messages:
+            path = os.path.join(directory, f"{time.time_ns()}-{next(numbers)}.json")
+            with open(f"{path}.tmp", 'w') as FILE:
+                json.dump({
+                    'subject': message.subject,
+                    'sender': message.sender,
+                    'recipients': message.recipients,
+                    'body': message.body,
+                }, FILE)
+            #* Readers of the spool never see a half written message
+            os.replace(f"{path}.tmp", path)
+    return send
+
+def deliver(transport, batch):
+    '''
+    Sends batch through transport, retrying with exponential backoff if it fails
+    '''
+    for attempt in range(config.mail_retries + 1):
+        try:
+            transport(batch)
+            return
+        except Exception as err:
+            if attempt == config.mail_retries:
+                print(f"mailer: giving up on {len(batch)} message(s): {err}", file=sys.stderr)
+            else:
+                time.sleep(config.mail_retry_delay * 2 ** attempt)
+
+def start_mailer(transport, count=None):
+    '''
+    Starts count worker threads (config.mail_workers by default) sending queued mail through transport
+    '''
+    count = count or config.mail_workers
+
+    def work():
+        while True:
+            message = outbox.get()
+            if message is None:
+                outbox.task_done()
+                return
+            batch = [message]
+            #* Take whatever else is already waiting, up to a full batch
+            while len(batch) < config.mail_batch_size:
+                try:
+                    message = outbox.get_nowait()
+                except queue.Empty:
+                    break
+                if message is None:
+                    #* Leave the stop signal for this worker's next turn
+                    outbox.task_done()
+                    outbox.put(None)
+                    break
+                batch.append(message)
+            try:
+                deliver(transport, batch)
+            finally:
+                for _ in batch:
+                    outbox.task_done()
+
+    for _ in range(count):
+        worker = threading.Thread(target=work, daemon=True)
+        worker.start()
+        workers.append(worker)
+
+def stop_mailer():
+    '''
+    Stops the worker threads once every message queued before the call has been sent
+    '''
+    for _ in workers:
+        outbox.put(None)
+    for worker in workers:
+        worker.join()
+    workers.clear()
@@ -1,10 +1,9 @@
 from src.error import AccessError, InputError
 import src.auth
-from src.other import decode, get_channel, get_user, get_dm, get_user_permissions, push_tagged_notifications, push_reacted_notifications, generate_new_message_id, data_load
+from src.other import decode, get_channel, get_user, get_dm, get_message, get_user_permissions, push_tagged_notifications, push_reacted_notifications, generate_new_message_id, data_load, record_stat
+from src.data import store, read_locked, write_locked
+from src import scheduler
 from datetime import timezone, datetime
-import json
-import threading, time
-from random import getrandbits
 from src.user import users_stats_v1
 
 AuID      = 'auth_user_id'
@@ -23,6 +22,7 @@ mID       = 'message_id'
 rID       = 'react_id'
 thumbsUp  = 1 
 
+@write_locked
 def message_send_v1(token, channel_id, message):
     '''
     Takes in a user's token, a channel's id and a string and sends a message 
@@ -65,7 +65,7 @@ def message_send_v1(token, channel_id, message):
 
     # User is in the channel (which exists) & message is appropriate length
     #* Time to send a message
-    data['messages_log'].append(
+    store.append(('messages_log',),
         {
             'channel_id'    : channel_id,
             'dm_id'         : -1,
@@ -78,22 +78,11 @@ def message_send_v1(token, channel_id, message):
         }
     )
 
-    updated_num_message = data['dreams_analytics']['messages_exist'][-1]['num_messages_exist'] + 1
-    data['dreams_analytics']['messages_exist'].append({
-        'num_messages_exist': updated_num_message,
-        'time_stamp': int(datetime.now().strftime("%s"))
-    })
+    record_stat(('dreams_analytics', 'messages_exist'), 1)
     #* update analytics
-    messageSentPrev = data["user_analytics"][f"{auth_user_id}"]['messages_sent'][-1]["num_messages_sent"]
-    data["user_analytics"][f"{auth_user_id}"]['messages_sent'].append(
-        {
-            "num_messages_sent": messageSentPrev + 1,
-            "time_stamp": int(datetime.now().strftime("%s"))
-        }
-    )   
+    record_stat(('user_analytics', f"{auth_user_id}", 'messages_sent'), 1)
 
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.commit()
 
     #* Push notifications if anyone is tagged
     push_tagged_notifications(auth_user_id, channel_id, -1, message)
@@ -102,6 +91,7 @@ def message_send_v1(token, channel_id, message):
         'message_id': newID,
     }
 
+@write_locked
 def message_remove_v1(token, message_id):
     '''
     Takes in a user's token and a message's id and removes that message.
@@ -129,51 +119,32 @@ def message_remove_v1(token, message_id):
     data = data_load()
 
     #* Get message dictionary in data
-    messageFound = False
-    i = 0
-    while not messageFound:
-        if i >= len(data['messages_log']):
-            raise InputError
-        if data['messages_log'][i]['message_id'] == message_id:
-            messageFound = True
-        i += 1
-
-    i -= 1              # Remove extra increment
-
-    if data['messages_log'][i][cID] != -1:
+    msg = get_message(message_id)
+
+    if msg[cID] != -1:
         #* If message is in a channel
         #* Check if the user is the writer, channel owner or owner of Dreams
         # Get the channel the message belongs to
-        channel = get_channel(data['messages_log'][i]['channel_id'])
-        if auth_user_id is not data['messages_log'][i]['u_id'] and auth_user_id not in channel['owner_members'] and get_user_permissions(auth_user_id) != 1:
+        channel = get_channel(msg['channel_id'])
+        if auth_user_id is not msg['u_id'] and auth_user_id not in channel['owner_members'] and get_user_permissions(auth_user_id) != 1:
             raise AccessError
     else:
-        if auth_user_id is not data['messages_log'][i]['u_id'] and get_user_permissions(auth_user_id) != 1:
+        if auth_user_id is not msg['u_id'] and get_user_permissions(auth_user_id) != 1:
             raise AccessError
 
     #* Remove the message
-    data['messages_log'].remove(data['messages_log'][i])
+    store.delete(('messages_log', message_id))
 
-    updated_num_message = data['dreams_analytics']['messages_exist'][-1]['num_messages_exist'] - 1
-    data['dreams_analytics']['messages_exist'].append({
-        'num_messages_exist': updated_num_message,
-        'time_stamp': int(datetime.now().strftime("%s"))
-    })
+    record_stat(('dreams_analytics', 'messages_exist'), -1)
     #* update analytics
-    messageSentPrev = data["user_analytics"][f"{auth_user_id}"]['messages_sent'][-1]["num_messages_sent"]
-    data["user_analytics"][f"{auth_user_id}"]['messages_sent'].append(
-        {
-            "num_messages_sent": messageSentPrev - 1,
-            "time_stamp": int(datetime.now().strftime("%s"))
-        }
-    )
+    record_stat(('user_analytics', f"{auth_user_id}", 'messages_sent'), -1)
     
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.commit()
 
     return {
     }
 
+@write_locked
 def message_edit_v1(token, message_id, message):
     '''
     Takes in a user's token, a message's id and message string 
@@ -201,53 +172,41 @@ def message_edit_v1(token, message_id, message):
     #* Decode the token
     auth_user_id, _ = decode(token)
 
-    data = data_load()
-
     #* Get message dictionary in data
-    messageFound = False
-    i = 0
-    while not messageFound:
-        if i >= len(data['messages_log']):
-            raise InputError
-        elif data['messages_log'][i]['message_id'] == message_id:
-            messageFound = True
-        i += 1
-
-    i -= 1          # Undo extra increment
+    msg = get_message(message_id)
 
     #* Check if the user is the writer, channel owner or owner of Dreams
     # Get the channel the message belongs to
-    if data['messages_log'][i][cID] != -1:
-        channel = get_channel(data['messages_log'][i]['channel_id'])
-        if auth_user_id is not data['messages_log'][i]['u_id'] and auth_user_id not in channel['owner_members'] and get_user_permissions(auth_user_id) != 1:
+    if msg[cID] != -1:
+        channel = get_channel(msg['channel_id'])
+        if auth_user_id is not msg['u_id'] and auth_user_id not in channel['owner_members'] and get_user_permissions(auth_user_id) != 1:
             raise AccessError
     else:
-        get_dm(data['messages_log'][i]['dm_id'])
-        if auth_user_id is not data['messages_log'][i]['u_id']:
+        get_dm(msg['dm_id'])
+        if auth_user_id is not msg['u_id']:
             raise AccessError
 
     if len(message) > 1000:  # If the message is too long, raise InputError
         raise InputError
     elif message == '':      #* If new message is empty string --> remove message
-        data['messages_log'].remove(data['messages_log'][i])
-        with open('data.json', 'w') as FILE:
-            json.dump(data, FILE)
+        store.delete(('messages_log', message_id))
+        store.commit()
         return {
         }
     else:                       # Else 
-        data['messages_log'][i]['message'] = message
+        store.set(('messages_log', message_id, 'message'), message)
     
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.commit()
 
-    if data['messages_log'][i]['channel_id'] != -1:     #* If message is in a channel
-        push_tagged_notifications(auth_user_id, data['messages_log'][i]['channel_id'], -1, message)
+    if msg['channel_id'] != -1:     #* If message is in a channel
+        push_tagged_notifications(auth_user_id, msg['channel_id'], -1, message)
     else:
-        push_tagged_notifications(auth_user_id, -1, data['messages_log'][i]['dm_id'], message)
+        push_tagged_notifications(auth_user_id, -1, msg['dm_id'], message)
 
     return {
     }
 
+@write_locked
 def message_senddm_v1(token, dm_id, message):
     '''
     Takes in a user's token, a dm_id and a string and sends a message 
@@ -284,7 +243,7 @@ def message_senddm_v1(token, dm_id, message):
     now = datetime.now()
     time_created = int(now.strftime("%s"))
     
-    data['messages_log'].append({
+    store.append(('messages_log',), {
         cID: -1,
         dmID: dm_id,
         'message_id': message_id,
@@ -295,29 +254,19 @@ def message_senddm_v1(token, dm_id, message):
         'is_pinned': False
     })
 
-    updated_num_message = data['dreams_analytics']['messages_exist'][-1]['num_messages_exist'] + 1
-    data['dreams_analytics']['messages_exist'].append({
-        'num_messages_exist': updated_num_message,
-        'time_stamp': int(datetime.now().strftime("%s"))
-    })
+    record_stat(('dreams_analytics', 'messages_exist'), 1)
     #* update analytics
 
-    messageSentPrev = data["user_analytics"][f"{auth_user_id}"]['messages_sent'][-1]["num_messages_sent"]
-    data["user_analytics"][f"{auth_user_id}"]['messages_sent'].append(
-        {
-            "num_messages_sent": messageSentPrev + 1,
-            "time_stamp": int(datetime.now().strftime("%s"))
-        }
-    )  
+    record_stat(('user_analytics', f"{auth_user_id}", 'messages_sent'), 1)
 
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.commit()
 
     push_tagged_notifications(auth_user_id, -1, dm_id, message)
     return {
         'message_id': message_id,
     }
 
+@write_locked
 def message_share_v1(token, og_message_id, message, channel_id, dm_id):
     '''
     message_share_v1 searches for an existing message id to be forwarded or shared to either
@@ -337,40 +286,26 @@ def message_share_v1(token, og_message_id, message, channel_id, dm_id):
     '''
     auth_user_id, _ = decode(token)
 
-    data = data_load()
     # put message with optional message first,
     newMessage = ''
-    for msg in data['messages_log']:
-        if msg["message_id"] == og_message_id:
-            if message != '':
-                newMessage = msg["message"] + " | " + message
-            else:
-                newMessage = msg["message"] 
+    try:
+        msg = store.row('messages_log', og_message_id)
+    except KeyError:
+        msg = None
+    if msg is not None:
+        if message != '':
+            newMessage = msg["message"] + " | " + message
+        else:
+            newMessage = msg["message"] 
     # Use both message/send and message/senddm to share message
     if dm_id == -1:
-        for chans in data['channels']:
-            if chans["channel_id"] == channel_id:
-                userAuth = False
-                for users in chans["all_members"]:
-                    if users == auth_user_id:
-                        userAuth = True
-                if not userAuth:
-                    raise AccessError
-        with open('data.json', 'w') as FILE:
-            json.dump(data, FILE)
+        if auth_user_id not in get_channel(channel_id)["all_members"]:
+            raise AccessError
         shared_message_id = message_send_v1(token, channel_id, newMessage)
         
     if channel_id == -1:
-        for dm in data['dms']:
-            if dm['dm_id'] == dm_id:
-                userAuth = False
-                for users in dm['all_members']:
-                    if users == auth_user_id:
-                        userAuth = True
-                if not userAuth:
-                    raise AccessError
-        with open('data.json', 'w') as FILE:
-            json.dump(data, FILE)
+        if auth_user_id not in get_dm(dm_id)['all_members']:
+            raise AccessError
         shared_message_id = message_senddm_v1(token, dm_id, newMessage)
         
     if dm_id == -1:
@@ -380,45 +315,40 @@ def message_share_v1(token, og_message_id, message, channel_id, dm_id):
 
     return {"shared_message_id" : shared_message_id["message_id"]}
 
+@write_locked
 def message_pin_v1(token, message_id):
     auth_user_id, _ = decode(token)
-    data = data_load()
 
-    for message in data['messages_log']:
-        if message[mID] == message_id:
-            if message[dmID] == -1 and auth_user_id not in get_channel(message[cID])[allMems]:
-                raise AccessError
-            elif message[cID] == -1 and auth_user_id not in get_dm(message[dmID])[allMems]:
-                raise AccessError
-            elif message['is_pinned']:
-                raise InputError
-            else:
-                message['is_pinned'] = True
-                with open('data.json', 'w') as FILE:
-                    json.dump(data, FILE)
-                return {}
-    raise InputError
+    message = get_message(message_id)
+    if message[dmID] == -1 and auth_user_id not in get_channel(message[cID])[allMems]:
+        raise AccessError
+    elif message[cID] == -1 and auth_user_id not in get_dm(message[dmID])[allMems]:
+        raise AccessError
+    elif message['is_pinned']:
+        raise InputError
+
+    store.set(('messages_log', message_id, 'is_pinned'), True)
+    store.commit()
+    return {}
 
+@write_locked
 def message_unpin_v1(token, message_id):
     auth_user_id, _ = decode(token)
-    data = data_load()
 
-    for message in data['messages_log']:
-        if message[mID] == message_id:
-            if message[dmID] == -1 and auth_user_id not in get_channel(message[cID])[allMems]:
-                raise AccessError
-            elif message[cID] == -1 and auth_user_id not in get_dm(message[dmID])[allMems]:
-                raise AccessError
-            elif not message['is_pinned']:
-                raise InputError
-            else:
-                message['is_pinned'] = False
-                with open('data.json', 'w') as FILE:
-                    json.dump(data, FILE)
-                return {}
-    raise InputError
+    message = get_message(message_id)
+    if message[dmID] == -1 and auth_user_id not in get_channel(message[cID])[allMems]:
+        raise AccessError
+    elif message[cID] == -1 and auth_user_id not in get_dm(message[dmID])[allMems]:
+        raise AccessError
+    elif not message['is_pinned']:
+        raise InputError
+
+    store.set(('messages_log', message_id, 'is_pinned'), False)
+    store.commit()
+    return {}
 
 #Iteration 3    
+@write_locked
 def message_react_v1(token, message_id, react_id):
     '''
     For a given channel or DM, add a "react" to a particular message 
@@ -442,55 +372,48 @@ def message_react_v1(token, message_id, react_id):
         Returns an empty dictionary {}
     '''
     auth_user_id, _ = decode(token)
-    data = data_load()
     
     if react_id != thumbsUp:
         raise InputError
         
-    message_found = False 
-    
-    for message in data['messages_log']: 
-        if message[mID] == message_id:
-            #AccessError if user not a part of channel or DM
-            if message[dmID] == -1 and auth_user_id not in get_channel(message[cID])[allMems]:
-                raise AccessError
-            elif message[cID] == -1 and auth_user_id not in get_dm(message[dmID])[allMems]:
-                raise AccessError
-            message_found = True 
-            #Case 1: First react for that message 
-            if len(message['reacts']) == 0:
-                result = {
-                    'react_id': react_id,
-                    'u_ids': [auth_user_id],
-                    'is_this_user_reacted': None,
-                
-                    }
-                message['reacts'].append(result)
-            #Case 2: Reacting to a message which already has a react
-            elif len(message['reacts']) == 1:
-                for current_react in message['reacts']:
-                    if current_react[rID] == react_id: 
-                        if auth_user_id in current_react['u_ids']:
-                            raise InputError
-                        else:
-                            current_react['u_ids'].append(auth_user_id)
+    #If there is no message with the same mID then mID not valid  
+    message = get_message(message_id)
+
+    #AccessError if user not a part of channel or DM
+    if message[dmID] == -1 and auth_user_id not in get_channel(message[cID])[allMems]:
+        raise AccessError
+    elif message[cID] == -1 and auth_user_id not in get_dm(message[dmID])[allMems]:
+        raise AccessError
+    #Case 1: First react for that message 
+    if len(message['reacts']) == 0:
+        result = {
+            'react_id': react_id,
+            'u_ids': [auth_user_id],
+            'is_this_user_reacted': None,
         
-            with open('data.json', 'w') as FILE:
-                json.dump(data, FILE)  
-            #Now can push to notifs 
-            #If message in channel 
-            if message['channel_id'] != -1:  
-                push_reacted_notifications(auth_user_id, message['u_id'], message[cID], -1)
-            #If message is in DM
-            else: 
-                push_reacted_notifications(auth_user_id, message['u_id'], -1, message[dmID])
-    
-    #If gets to end of messages log without finding message with same mID then mID not valid  
-    if message_found == False:
-        raise InputError
+            }
+        store.append(('messages_log', message_id, 'reacts'), result)
+    #Case 2: Reacting to a message which already has a react
+    elif len(message['reacts']) == 1:
+        for index, current_react in enumerate(message['reacts']):
+            if current_react[rID] == react_id: 
+                if auth_user_id in current_react['u_ids']:
+                    raise InputError
+                else:
+                    store.append(('messages_log', message_id, 'reacts', index, 'u_ids'), auth_user_id)
+
+    store.commit()
+    #Now can push to notifs 
+    #If message in channel 
+    if message['channel_id'] != -1:  
+        push_reacted_notifications(auth_user_id, message['u_id'], message[cID], -1)
+    #If message is in DM
+    else: 
+        push_reacted_notifications(auth_user_id, message['u_id'], -1, message[dmID])
     
     return {}
 
+@write_locked
 def message_unreact_v1(token, message_id, react_id):
     '''
     For a given channel or DM, remove a "react" to a particular message 
@@ -515,30 +438,29 @@ def message_unreact_v1(token, message_id, react_id):
     '''
     
     auth_user_id, _ = decode(token)
-    data = data_load()
     
     if react_id != thumbsUp:
         raise InputError
             
-    for message in data['messages_log']: 
-        if message[mID] == message_id:
-            #AccessError if user not a part of channel or DM
-            if message[dmID] == -1 and auth_user_id not in get_channel(message[cID])[allMems]:
-                raise AccessError
-            elif message[cID] == -1 and auth_user_id not in get_dm(message[dmID])[allMems]:
-                raise AccessError           
-           
-            #For unreact, delete the list with same react_id, if its not found then the message doesn't have a react and thus raises InputError
-            for react in range(len(message['reacts'])):
-                if message['reacts'][react]['react_id'] == react_id:
-                    message['reacts'].pop(react)
-                    with open('data.json', 'w') as FILE:
-                        json.dump(data, FILE)     
-                    return {} 
+    message = get_message(message_id)
+
+    #AccessError if user not a part of channel or DM
+    if message[dmID] == -1 and auth_user_id not in get_channel(message[cID])[allMems]:
+        raise AccessError
+    elif message[cID] == -1 and auth_user_id not in get_dm(message[dmID])[allMems]:
+        raise AccessError           
+   
+    #For unreact, delete the list with same react_id, if its not found then the message doesn't have a react and thus raises InputError
+    for react in range(len(message['reacts'])):
+        if message['reacts'][react]['react_id'] == react_id:
+            store.delete(('messages_log', message_id, 'reacts', react))
+            store.commit()
+            return {} 
             
-    #If gets to here means message not found or react not found 
+    #If gets to here means react not found 
     raise InputError
     
+@write_locked
 def message_sendlater_v1(token, channel_id, message, time_sent):
     '''
     Takes in a user's token, a channel's id, a string and a unix timestamp
@@ -580,13 +502,13 @@ def message_sendlater_v1(token, channel_id, message, time_sent):
         raise AccessError
 
     newID = generate_new_message_id()
-    timeTillSend = time_sent - datetime.now().replace(tzinfo=timezone.utc).timestamp()
-    newID = 0
-    threading.Timer(timeTillSend, sendlater_send, args=(token, channel_id, message, time_sent, newID)).start()
+    scheduler.schedule(time_sent, 'sendlater', (auth_user_id, channel_id, message, time_sent, newID), auth_user_id)
+    store.commit()
     return {
         'message_id': newID
     }
 
+@write_locked
 def message_sendlaterdm_v1(token, dm_id, message, time_sent):
     '''
     Takes in a user's token, a dm's id, a string and a unix timestamp
@@ -628,41 +550,43 @@ def message_sendlaterdm_v1(token, dm_id, message, time_sent):
         raise AccessError
 
     newID = generate_new_message_id()
-    timeTillSend = time_sent - datetime.now().replace(tzinfo=timezone.utc).timestamp()
-    newID = 0
-    threading.Timer(timeTillSend, sendlaterdm_send, args=(token, dm_id, message, time_sent, newID)).start()
+    scheduler.schedule(time_sent, 'sendlaterdm', (auth_user_id, dm_id, message, time_sent, newID), auth_user_id)
+    store.commit()
     return {
         'message_id': newID
     }
 
-def sendlater_send(token, channel_id, message, time_sent, newID):
+@write_locked
+def sendlater_send(auth_user_id, channel_id, message, time_sent, newID):
     '''
     HELPER FUNCTION FOR: message_sendlater_v1
-    Takes in a user's token, a channel's id, a string, a unix timestamp and a new message ID
-    and executes the actual sending of the message in message_sendlater_v1
+    Takes in a user's id, a channel's id, a string, a unix timestamp and a new message ID
+    and executes the actual sending of the message in message_sendlater_v1.
+    The user's session may have ended since the message was scheduled, so it is only
+    checked that they are still in the channel; if not, the message is not sent
 
     Arguments:
-        token        (str)   - The JWT containing user_id and session_id of the user that is to send the message
+        auth_user_id (int)   - The id of the user that is to send the message
         channel_id   (int)   - The id of the channel that the message is being sent to
         message      (str)   - The string of the message being sent
         time_sent    (float) - The Unix Timestamp of which the message is to be sent
         newID        (int)   - The new message ID of the message (already generated in message_sendlater_v1)
 
     Exceptions:
-        InputError - Occurs when:
-                            1) When the user id doesn't belong to any user
+        None
 
     Return Value:
-        Returns a dictionary with key 'message_id' to the new message's message_id
+        Returns whether the message was sent
     '''
-    # Decode the token
-    auth_user_id, _ = decode(token)
-
-    data = data_load()
+    try:
+        if auth_user_id not in get_channel(channel_id)['all_members']:
+            return False
+    except InputError:
+        return False
 
     # User is in the channel (which exists) & message is appropriate length
     #* Time to send a message
-    data['messages_log'].append(
+    store.append(('messages_log',),
         {
             'channel_id'    : channel_id,
             'dm_id'         : -1,
@@ -675,54 +599,47 @@ def sendlater_send(token, channel_id, message, time_sent, newID):
         }
     )
 
-    updated_num_message = data['dreams_analytics']['messages_exist'][-1]['num_messages_exist'] + 1
-    data['dreams_analytics']['messages_exist'].append({
-        'num_messages_exist': updated_num_message,
-        'time_stamp': int(datetime.now().strftime("%s"))
-    })
+    record_stat(('dreams_analytics', 'messages_exist'), 1)
 
-    messageSentPrev = data["user_analytics"][f"{auth_user_id}"]['messages_sent'][-1]["num_messages_sent"]
-    data["user_analytics"][f"{auth_user_id}"]['messages_sent'].append(
-        {
-            "num_messages_sent": messageSentPrev + 1,
-            "time_stamp": int(datetime.now().strftime("%s"))
-        }
-    )  
+    record_stat(('user_analytics', f"{auth_user_id}", 'messages_sent'), 1)
 
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.commit()
 
     #* Push notifications if anyone is tagged
     push_tagged_notifications(auth_user_id, channel_id, -1, message)
+    return True
 
-def sendlaterdm_send(token, dm_id, message, time_sent, newID):
+@write_locked
+def sendlaterdm_send(auth_user_id, dm_id, message, time_sent, newID):
     '''
     HELPER FUNCTION FOR: message_sendlaterdm_v1
-    Takes in a user's token, a dm's id, a string, a unix timestamp and a new message ID
-    and executes the actual sending of the message in message_sendlaterdm_v1
+    Takes in a user's id, a dm's id, a string, a unix timestamp and a new message ID
+    and executes the actual sending of the message in message_sendlaterdm_v1.
+    The user's session may have ended since the message was scheduled, so it is only
+    checked that they are still in the dm; if not, the message is not sent
 
     Arguments:
-        token        (str)   - The JWT containing user_id and session_id of the user that is to send the message
+        auth_user_id (int)   - The id of the user that is to send the message
         dm_id        (int)   - The id of the dm that the message is being sent to
         message      (str)   - The string of the message being sent
         time_sent    (float) - The Unix Timestamp of which the message is to be sent
         newID        (int)   - The new message ID of the message (already generated in message_sendlater_v1)
 
     Exceptions:
-        InputError - Occurs when:
-                            1) When the user id doesn't belong to any user
+        None
 
     Return Value:
-        Returns a dictionary with key 'message_id' to the new message's message_id
+        Returns whether the message was sent
     '''
-    # Decode the token
-    auth_user_id, _ = decode(token)
-
-    data = data_load()
+    try:
+        if auth_user_id not in get_dm(dm_id)['all_members']:
+            return False
+    except InputError:
+        return False
 
     # User is in the dm (which exists) & message is appropriate length
     #* Time to send a message
-    data['messages_log'].append(
+    store.append(('messages_log',),
         {
             'channel_id'    : -1,
             'dm_id'         : dm_id,
@@ -735,22 +652,78 @@ def sendlaterdm_send(token, dm_id, message, time_sent, newID):
         }
     )
 
-    updated_num_message = data['dreams_analytics']['messages_exist'][-1]['num_messages_exist'] + 1
-    data['dreams_analytics']['messages_exist'].append({
-        'num_messages_exist': updated_num_message,
-        'time_stamp': int(datetime.now().strftime("%s"))
-    })
+    record_stat(('dreams_analytics', 'messages_exist'), 1)
 
-    messageSentPrev = data["user_analytics"][f"{auth_user_id}"]['messages_sent'][-1]["num_messages_sent"]
-    data["user_analytics"][f"{auth_user_id}"]['messages_sent'].append(
-        {
-            "num_messages_sent": messageSentPrev + 1,
-            "time_stamp": int(datetime.now().strftime("%s"))
-        }
-    )  
+    record_stat(('user_analytics', f"{auth_user_id}", 'messages_sent'), 1)
 
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.commit()
 
     #* Push notifications if anyone is tagged
     push_tagged_notifications(auth_user_id, -1, dm_id, message)
+    return True
+
+scheduler.register('sendlater', sendlater_send)
+scheduler.register('sendlaterdm', sendlaterdm_send)
+
+def scheduled_messages(auth_user_id):
+    #* Returns the scheduler's jobs for auth_user_id's messages that are still to be sent
+    return scheduler.scheduled(auth_user_id, 'sendlater') + scheduler.scheduled(auth_user_id, 'sendlaterdm')
+
+@read_locked
+def message_sendlater_list_v1(token):
+    '''
+    Takes in a user's token and lists the messages they have scheduled with sendlater or sendlaterdm
+    which are still to be sent
+
+    Arguments:
+        token        (str)   - The JWT containing user_id and session_id of the user
+
+    Exceptions:
+        AccessError - Occurs when the user's token contains wrong session id
+
+    Return Value:
+        Returns a dictionary with key 'messages' to a list of dictionaries, each with keys 'message_id',
+        'channel_id', 'dm_id', 'message' and 'time_sent', soonest first
+    '''
+    auth_user_id, _ = decode(token)
+
+    messages = []
+    for job in scheduled_messages(auth_user_id):
+        _, conversation_id, message, time_sent, newID = job['args']
+        messages.append({
+            'message_id'    : newID,
+            'channel_id'    : conversation_id if job['name'] == 'sendlater' else -1,
+            'dm_id'         : conversation_id if job['name'] == 'sendlaterdm' else -1,
+            'message'       : message,
+            'time_sent'     : time_sent,
+        })
+    messages.sort(key=lambda message: message['time_sent'])
+    return {
+        'messages': messages
+    }
+
+@write_locked
+def message_sendlater_cancel_v1(token, message_id):
+    '''
+    Takes in a user's token and the id of a message they scheduled with sendlater or sendlaterdm,
+    and stops it from being sent
+
+    Arguments:
+        token        (str)   - The JWT containing user_id and session_id of the user
+        message_id   (int)   - The id returned when the message was scheduled
+
+    Exceptions:
+        InputError - Occurs when the user has no such message still to be sent
+        AccessError - Occurs when the user's token contains wrong session id
+
+    Return Value:
+        Returns an empty dictionary
+    '''
+    auth_user_id, _ = decode(token)
+
+    for job in scheduled_messages(auth_user_id):
+        if job['args'][4] == message_id and scheduler.cancel(job['job_id']):
+            store.commit()
+            return {}
+    raise InputError
+
@@ -1,6 +1,9 @@
-from src.other import decode, data_load
+from src.other import decode, recent_notifications, notification_count, wait_for_notifications, encode_cursor, decode_cursor
+from src.data import store, read_locked
+from src import config
 import json
 
+@read_locked
 def notifications_get_v1(token):
     '''
     Takes in a user's token and gets the user's 20 most recent notifications
@@ -18,10 +21,50 @@ def notifications_get_v1(token):
     #* Decode the taken and get the auth user's id
     auth_user_id, _ = decode(token)
 
-    data = data_load()
-    print(data_load()['notifs'][f"{auth_user_id}"])
-    notifications = data['notifs'][f"{auth_user_id}"][0:20]
+    notifications = recent_notifications(auth_user_id, 20)
 
     return {
         'notifications': notifications
     }
+
+def notifications_wait_v1(token, cursor=None, timeout=None):
+    '''
+    Takes in a user's token and waits for them to get notifications newer than cursor.
+    Nothing is read while waiting: the user's notifications are published to the wait as they are pushed.
+
+    Arguments:
+        token   (str)   - The JWT containing user_id and session_id of the user that is waiting for notifs
+        cursor  (str)   - The cursor returned by the previous wait, or None to wait for notifs from now on
+        timeout (float) - The longest to wait in seconds, at most (and by default) config.notification_wait
+
+    Exceptions:
+        InputError - Occurs when the cursor is not one that was handed out by the server
+        AccessError - Occurs when the user's token contains wrong session id
+
+    Return value:
+        Returns a dictionary containing the notifications newer than cursor, newest first, with key
+        'notifications' (empty if there were none before the timeout), and the cursor to wait from next
+        with key 'cursor'
+    '''
+    auth_user_id, _ = decode(token)
+    timeout = config.notification_wait if timeout is None else min(timeout, config.notification_wait)
+
+    with store.lock.read():
+        pushed = notification_count(auth_user_id)
+    if cursor is None:
+        since = pushed
+    else:
+        #* A cursor from before the workspace was cleared starts again from the beginning
+        since = min(decode_cursor(cursor, int)[0], pushed)
+
+    if pushed <= since:
+        wait_for_notifications(auth_user_id, since, timeout)
+
+    with store.lock.read():
+        #* The session may have ended while waiting
+        decode(token)
+        pushed = notification_count(auth_user_id)
+        return {
+            'notifications': recent_notifications(auth_user_id, max(pushed - since, 0)),
+            'cursor': encode_cursor(pushed),
+        }
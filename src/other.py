@@ -1,8 +1,15 @@
 import jwt
-import json
 from src.error import AccessError, InputError
 from random import getrandbits
 import os
+import json
+import base64
+import heapq
+import threading
+import time
+from collections import OrderedDict
+from src.data import store, read_locked, write_locked
+from src import config, scheduler
 
 AuID      = 'auth_user_id'
 uID       = 'u_id'
@@ -18,6 +25,18 @@ dmID      = 'dm_id'
 seshID    = 'session_id'
 SECRET    = 'MENG'
 
+#* Tokens that decode() has verified, mapped to (u_id, session_id, expiry), least recently used first,
+#* and the cached tokens of each user so that they can be forgotten when their sessions end
+verified_tokens = OrderedDict()
+user_tokens = {}
+token_cache_lock = threading.Lock()
+
+#* In-process bus that committed notifications are published on: the number of notifications
+#* each user has been pushed, and a condition that wakes everyone waiting for new ones
+published_notifications = {}
+notification_bus = threading.Condition()
+
+@write_locked
 def clear_v1():
     '''
     Clears the entire database
@@ -31,18 +50,14 @@ def clear_v1():
     Return value:
         None
     '''
-    with open('data.json', 'w') as FILE:
-        json.dump({
-            'users': [],
-            'channels': [],
-            'dms': [],
-            'messages_log': [],
-            'notifs': {},
-            'user_analytics': {},
-            'stand_ups': [],
-            'reset_codes': []
-        }, FILE)
-
+    store.clear()
+    forget_tokens()
+    scheduler.clear()
+    with notification_bus:
+        published_notifications.clear()
+        notification_bus.notify_all()
+
+@read_locked
 def search_v1(token, query_str):
     '''
     Takes in a user's token and query string to return a list of messages that contains details about the message
@@ -70,35 +85,78 @@ def search_v1(token, query_str):
     if len(query_str) > 1000:
         raise InputError
 
-    data = data_load()
+    #* Add in every message in the channel/DM that contains query_str, oldest first
+    found = sorted(search_matches(auth_user_id, query_str), key=search_order)
+
+    messages = []
+    for message in found:
+        messages.append(
+            {
+                'message_id': message['message_id'],
+                uID: message[uID],
+                'message': message['message'],
+                'time_created': message['time_created'],
+            }
+        )
+
+    return {
+        'messages': messages,
+    }
+
+@read_locked
+def search_v3(token, query_str, limit, cursor):
+    '''
+    Takes in a user's token and query string to return a page of the messages that contain it, newest first
+    The search is not case-sensitive
 
-    channelList = []
-    #* Check which channels the user is in
-    for channel in data['channels']:
-        if auth_user_id in channel[allMems]:
-            channelList.append(channel[cID])
+    Only the page being returned is ever held in memory: matches are produced one at a time
+    and the newest limit of them are kept in a bounded heap.
+
+    Arguments: 
+        token      (str) - The JWT containing user_id and session_id of the user that is searching
+        query_str  (str) - The string which the user inputted to find messages
+        limit      (int) - The most messages to return, between 1 and 50
+        cursor     (str) - The next_cursor of the previous page, or '' for the newest messages
     
-    DMList = []
-    #* Check which DMs the user is in
-    for dm in data['dms']:
-        if auth_user_id in dm[allMems]:
-            DMList.append(dm['dm_id'])
+    Exceptions:
+        InputError - Occurs when:
+                            1) The query_str is greater than 1000 characters
+                            2) The limit is not between 1 and 50
+                            3) The cursor is not valid
+
+    Return value:
+        Returns a dictionary with key 'messages', a list of {message_id, u_id, message, time_created},
+        and key 'next_cursor', which fetches the page of older matches ('' when there are none)
+    '''
+    #* Decode the token
+    auth_user_id, _ = decode(token)
+
+    if len(query_str) > 1000 or not 1 <= limit <= 50:
+        raise InputError
+
+    matches = search_matches(auth_user_id, query_str)
+    if cursor != '':
+        #* Only matches older than the last message of the previous page
+        before = tuple(decode_cursor(cursor, (int, float), int))
+        matches = (message for message in matches if search_order(message) < before)
+
+    #* Take one extra match to find out whether there is another page after this one
+    found = heapq.nlargest(limit + 1, matches, key=search_order)
 
     messages = []
-    #* Add in every message in the channel/DM that contains query_str
-    for message in data['messages_log']:
-        if (message[cID] in channelList or message['dm_id'] in DMList) and query_str.lower() in message['message'].lower():
-            messages.append(
-                {
-                    'message_id': message['message_id'],
-                    uID: message[uID],
-                    'message': message['message'],
-                    'time_created': message['time_created'],
-                }
-            )
+    for message in found[:limit]:
+        messages.append(
+            {
+                'message_id': message['message_id'],
+                uID: message[uID],
+                'message': message['message'],
+                'time_created': message['time_created'],
+            }
+        )
 
     return {
         'messages': messages,
+        'next_cursor': encode_cursor(*search_order(found[limit - 1])) if len(found) > limit else '',
     }
 
 ########################################################################################
@@ -108,132 +166,291 @@ def search_v1(token, query_str):
 ########################################################################################
 
 def decode(token):
-    payload = jwt.decode(token, SECRET, algorithms='HS256')
-    auth_user_id, session_id = payload.get('user_id'), payload.get('session_id')
-    check_session(auth_user_id, session_id)
+    with token_cache_lock:
+        if token in verified_tokens:
+            auth_user_id, session_id, expiry = verified_tokens[token]
+            if expiry > time.time():
+                verified_tokens.move_to_end(token)
+                return auth_user_id, session_id
+
+    #* Holding the read lock means no logout can end the session between checking it and caching it
+    with store.lock.read():
+        payload = jwt.decode(token, SECRET, algorithms='HS256')
+        auth_user_id, session_id = payload.get('user_id'), payload.get('session_id')
+        expiry = check_session(auth_user_id, session_id)
+        with token_cache_lock:
+            verified_tokens[token] = (auth_user_id, session_id, expiry)
+            user_tokens.setdefault(auth_user_id, set()).add(token)
+            if len(verified_tokens) > config.token_cache_size:
+                oldest, (u_id, _, _) = verified_tokens.popitem(last=False)
+                user_tokens[u_id].discard(oldest)
     return auth_user_id, session_id
 
-def check_session(auth_user_id, session_id):
-    data = data_load()
+def forget_tokens(u_id=None, session_id=None):
+    #* Drops cached tokens: every token, every token of u_id, or only those of one of its sessions.
+    #* Must be called whenever a session ends or a user is removed.
+    with token_cache_lock:
+        if u_id is None:
+            verified_tokens.clear()
+            user_tokens.clear()
+            return
+        for token in list(user_tokens.get(u_id, ())):
+            if session_id is None or verified_tokens[token][1] == session_id:
+                del verified_tokens[token]
+                user_tokens[u_id].discard(token)
 
-    for user in data['users']:
-        if auth_user_id == user[uID] and user['permission_id'] != 0:
-            if session_id in user['session_id']:
-                return
-    raise AccessError
+def check_session(auth_user_id, session_id):
+    #* Returns when the session expires. Sessions are keyed by their id as a string (JSON keys).
+    try:
+        user = store.row('users', auth_user_id)
+    except KeyError:
+        raise AccessError
+    expiry = user['sessions'].get(f"{session_id}")
+    if user['permission_id'] == 0 or expiry is None or expiry <= time.time():
+        raise AccessError
+    return expiry
 
 def get_channel(channel_id):
-    data = data_load()
-
-    for channel in data['channels']:
-        if channel_id == channel['channel_id']:
-            with open('data.json', 'w') as FILE:
-                json.dump(data, FILE)
-            return channel
-    raise InputError
+    try:
+        return store.row('channels', channel_id)
+    except KeyError:
+        raise InputError
 
 def get_user(user_id):
-    data = data_load()
+    try:
+        user = store.row('users', user_id)
+    except KeyError:
+        raise InputError
+    return {
+        uID: user[uID],
+        'email': user['email'],
+        'name_first': user['name_first'],
+        'name_last': user['name_last'],
+        'handle_str': user['handle_str'],
+        'profile_img_url': user['profile_img_url'],
+    }
 
-    for user in data['users']:
-        if user_id == user[uID]:
-            return {
-                uID: user[uID],
-                'email': user['email'],
-                'name_first': user['name_first'],
-                'name_last': user['name_last'],
-                'handle_str': user['handle_str'],
-                'profile_img_url': user['profile_img_url'],
-            }
-    raise InputError
+def get_conversation_messages(channel_id, dm_id):
+    #* Messages of the channel (or DM when channel_id is -1) keyed by id, oldest first
+    if dm_id == -1:
+        return store.group('messages_log', cID, channel_id)
+    return store.group('messages_log', dmID, dm_id)
+
+def search_matches(auth_user_id, query_str):
+    #* Yields the messages containing query_str in every channel and DM the user is in, in no particular order
+    for channel_id in store.memberships('channels', auth_user_id):
+        yield from store.search('messages_log', 'message', (channel_id, -1), query_str)
+    for dm_id in store.memberships('dms', auth_user_id):
+        yield from store.search('messages_log', 'message', (-1, dm_id), query_str)
+
+def search_order(message):
+    #* Messages are ordered by when they were sent, ties broken by their (increasing) ids
+    return (message['time_created'], message['message_id'])
 
 def message_count(channel_id, dm_id):
-    counter = 0
-    data = data_load()
+    return len(get_conversation_messages(channel_id, dm_id))
+
+def message_details(message, auth_user_id):
+    #* Copy of a stored message as it is returned to a user, reacts included
+    details = {
+        'message_id': message['message_id'],
+        uID: message[uID],
+        'message': message['message'],
+        'time_created': message['time_created'],
+        'is_pinned': message['is_pinned'],
+        'reacts': [],
+    }
+    for react in message['reacts']:
+        react = react.copy()
+        react['is_this_user_reacted'] = auth_user_id in react['u_ids']
+        details['reacts'].append(react)
+    return details
+
+def encode_cursor(*values):
+    #* Cursors are opaque to clients, underneath they are a list of values in base64 JSON
+    cursor = json.dumps(values, separators=(',', ':'))
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+def decode_cursor(cursor, *types):
+    #* Returns the values of a cursor made by encode_cursor, checking they have the given types
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise InputError
+    if not isinstance(values, list) or len(values) != len(types):
+        raise InputError
+    if not all(isinstance(value, kind) for value, kind in zip(values, types)):
+        raise InputError
+    return values
 
-    if dm_id == -1:
-        for message in data['messages_log']:
-            if channel_id == message[cID]:
-                counter += 1
+def messages_page(conversation, cursor, auth_user_id):
+    '''
+    Returns a page of up to 50 messages of a channel or DM, newest first.
+
+    Arguments:
+        conversation (Group) - The messages of the channel or DM (see get_conversation_messages)
+        cursor       (str)   - A cursor returned by a previous page, or '' for the newest messages
+        auth_user_id (int)   - The user reading the messages
+
+    Exceptions:
+        InputError - Occurs when the cursor is not one that was handed out by the server
+
+    Return Value:
+        Returns {messages, next_cursor, prev_cursor}: next_cursor fetches the page of older
+        messages and prev_cursor the page of newer ones, either is '' when there are none
+    '''
+    if cursor == '':
+        position, older = conversation.end, True
     else:
-        for message in data['messages_log']:
-            if dm_id == message[dmID]:
-                counter += 1
-    
-    return counter
+        #* The cursor also carries the message it was taken at, so that it still finds its
+        #* place if positions have moved since (e.g. after a restart)
+        position, message_id, older = decode_cursor(cursor, int, int, bool)
+        if conversation.position(message_id) is not None:
+            position = conversation.position(message_id)
+
+    #* Fetch one extra message to find out whether there is another page after this one
+    page = conversation.page(position, 51, older)
+    more = len(page) > 50
+    page = page[:50]
+    if not older:
+        page.reverse()
+
+    if page:
+        newest, oldest = page[0], page[-1]
+        hasOlder = more if older else bool(conversation.page(oldest[0], 1))
+        hasNewer = more if not older else bool(conversation.page(newest[0], 1, older=False))
+    else:
+        hasOlder = hasNewer = False
 
-def get_user_permissions(user_id):
-    data = data_load()
+    return {
+        'messages': [message_details(row, auth_user_id) for _, row in page],
+        'next_cursor': encode_cursor(oldest[0], oldest[1]['message_id'], True) if hasOlder else '',
+        'prev_cursor': encode_cursor(newest[0], newest[1]['message_id'], False) if hasNewer else '',
+    }
 
-    for user in data['users']:
-        if user_id == user[uID]:
-            return user['permission_id']
-    # raise InputError
+def get_user_permissions(user_id):
+    try:
+        return store.row('users', user_id)['permission_id']
+    except KeyError:
+        return None
 
 def get_user_from_handlestring(handlestring):
-    data = data_load()
-
-    for user in data['users']:
-        if handlestring == user['handle_str']:
-            return {
-                uID: user[uID],
-                'email': user['email'],
-                'name_first': user['name_first'],
-                'name_last': user['name_last'],
-                'handle_str': user['handle_str'],
-                'profile_img_url': user['profile_img_url'],
-            }
-    # raise InputError
+    user = store.find('users', 'handle_str', handlestring)
+    if user is None:
+        return None
+    return get_user(user[uID])
 
 def get_message(message_id):
-    data = data_load()
-
-    for message in data['messages_log']:
-        if message_id == message['message_id']:
-            return message
-    raise InputError
+    try:
+        return store.row('messages_log', message_id)
+    except KeyError:
+        raise InputError
 
 def get_dm(dm_id):
-    data = data_load()
+    try:
+        return store.row('dms', dm_id)
+    except KeyError:
+        raise InputError
 
-    for dm in data['dms']:
-        if dm_id == dm['dm_id']:
-            return dm
-    raise InputError
+def new_notifications():
+    '''
+    Returns an empty ring of notifications, which keeps the config.notification_depth most recent
+    '''
+    return {
+        'depth': config.notification_depth,
+        'next': 0,
+        'items': [],
+    }
+
+def push_notification(user_id, notification):
+    '''
+    Adds notification to user_id's ring, over the oldest one once the ring is full, without committing
+    '''
+    key = f"{user_id}"
+    ring = data_load()['notifs'].get(key)
+    if not isinstance(ring, dict):
+        #* Workspaces saved before the rings kept every notification in a list, newest first
+        ring = new_notifications()
+        ring['items'] = (data_load()['notifs'].get(key) or [])[:ring['depth']][::-1]
+        ring['next'] = len(ring['items'])
+        store.set(('notifs', key), ring)
+
+    #* 'next' counts every notification pushed, so it also says which slot is the oldest
+    slot = ring['next'] % ring['depth']
+    if slot == len(ring['items']):
+        store.append(('notifs', key, 'items'), notification)
+    else:
+        store.set(('notifs', key, 'items', slot), notification)
+    store.set(('notifs', key, 'next'), ring['next'] + 1)
+
+def recent_notifications(user_id, count):
+    '''
+    Returns up to count of user_id's most recent notifications, newest first
+    '''
+    ring = data_load()['notifs'].get(f"{user_id}")
+    if not isinstance(ring, dict):
+        return (ring or [])[:count]
+    items = ring['items']
+    return [items[(ring['next'] - 1 - i) % ring['depth']] for i in range(min(count, len(items)))]
+
+def notification_count(user_id):
+    '''
+    Returns how many notifications user_id has been pushed, which is the cursor of their newest one
+    '''
+    ring = data_load()['notifs'].get(f"{user_id}")
+    if not isinstance(ring, dict):
+        return len(ring or [])
+    return ring['next']
+
+def publish_notifications(user_ids):
+    '''
+    Tells everyone waiting on the notification bus that user_ids have new (committed) notifications
+    '''
+    counts = {user_id: notification_count(user_id) for user_id in user_ids}
+    with notification_bus:
+        published_notifications.update(counts)
+        notification_bus.notify_all()
+
+def wait_for_notifications(user_id, since, timeout):
+    '''
+    Waits up to timeout seconds for user_id to be published more than since notifications.
+    Must be called without holding the store's lock, so that the notifications can be pushed.
+    Returns whether they were
+    '''
+    with notification_bus:
+        return notification_bus.wait_for(lambda: published_notifications.get(user_id, 0) > since, timeout)
 
 def push_tagged_notifications(auth_user_id, channel_id, dm_id, message):
-    taggerHandle = get_user(auth_user_id)['handle_str']
+    taggerHandle = store.row('users', auth_user_id)['handle_str']
     if channel_id != -1:
         channelDMname = get_channel(channel_id)['name']
+        collection, conversation_id = 'channels', channel_id
     else:
         channelDMname = get_dm(dm_id)['name']
-    messageWords = message.split()
-    atHandlesList = []
-    for word in messageWords:
-        if word.startswith('@') and word != '@':
-            atHandlesList.append(word[1:])
+        collection, conversation_id = 'dms', dm_id
+
+    #* Each handle is looked up once in the handle index, however many times it is tagged,
+    #* and only tags of members of the channel/DM (by the membership index) are notified
+    atHandles = dict.fromkeys(word[1:] for word in message.split() if word.startswith('@') and word != '@')
     taggedUsersList = []
-    for atHandle in atHandlesList:
-        try:
-            if channel_id != -1:
-                if get_user_from_handlestring(atHandle)[uID] in get_channel(channel_id)[allMems]:
-                    taggedUsersList.append(get_user_from_handlestring(atHandle)[uID])
-            else:
-                if get_user_from_handlestring(atHandle)[uID] in get_dm(dm_id)[allMems]:
-                    taggedUsersList.append(get_user_from_handlestring(atHandle)[uID])
-        except:
-            pass
+    for atHandle in atHandles:
+        user = store.find('users', 'handle_str', atHandle)
+        if user is not None and conversation_id in store.memberships(collection, user[uID]):
+            taggedUsersList.append(user[uID])
+    if not taggedUsersList:
+        return
+
     notification = {
         'channel_id': channel_id,
         'dm_id': dm_id,
         'notification_message': f"{taggerHandle} tagged you in {channelDMname}: {message[0:20]}"
     }
-    data = data_load()
-    for taggedUser in taggedUsersList:
-        data['notifs'][f"{taggedUser}"].insert(0, notification)
-
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    #* Every tagged user's notification goes into the log as one batch
+    with store.lock.write():
+        for taggedUser in taggedUsersList:
+            push_notification(taggedUser, notification)
+        store.commit()
+        publish_notifications(taggedUsersList)
 
 def push_added_notifications(auth_user_id, user_id, channel_id, dm_id):
     taggerHandle = get_user(auth_user_id)['handle_str']
@@ -247,10 +464,9 @@ def push_added_notifications(auth_user_id, user_id, channel_id, dm_id):
         'dm_id': dm_id,
         'notification_message': f"{taggerHandle} added you to {channelDMname}"
     }
-    data = data_load()
-    data['notifs'][f"{user_id}"].insert(0, notification)
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    push_notification(user_id, notification)
+    store.commit()
+    publish_notifications([user_id])
         
 def push_reacted_notifications(auth_user_id, user_id, channel_id, dm_id):
     users_handle = get_user(auth_user_id)['handle_str']
@@ -265,30 +481,85 @@ def push_reacted_notifications(auth_user_id, user_id, channel_id, dm_id):
         'dm_id': dm_id,
         'notification_message': f"{users_handle} reacted to your message in {channelDMname}",
     }
-    data = data_load()
-    data['notifs'][f"{user_id}"].insert(0, notification)
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    push_notification(user_id, notification)
+    store.commit()
+    publish_notifications([user_id])
         
 
 def check_removed(u_id):
-    data = data_load()
-    for user in data["users"]:
-        if user["u_id"] == u_id:
-            if user['permission_id'] == 0:
-                raise InputError
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    if get_user_permissions(u_id) == 0:
+        raise InputError
+
+def new_series(name, time_stamp):
+    '''
+    Returns a time series of the statistic name (such as 'num_messages_sent') starting at 0 at time_stamp.
+    A series is kept as two parallel lists, of its values under name and of their time stamps under
+    'time_stamp', rather than as a list of points, so it takes a fraction of the room in memory and on disk
+    '''
+    return {
+        name: [0],
+        'time_stamp': [time_stamp],
+    }
+
+def series_name(series):
+    #* Returns the name of the statistic a time series holds
+    return next(key for key in series if key != 'time_stamp')
+
+def series_points(series):
+    '''
+    Returns the points of a time series in the form the API returns them, oldest first:
+    a list of dictionaries holding the value under the series' name and its 'time_stamp'
+    '''
+    if isinstance(series, list):
+        return list(series)
+    name = series_name(series)
+    return [{name: value, 'time_stamp': time_stamp} for value, time_stamp in zip(series[name], series['time_stamp'])]
+
+def latest_stat(series):
+    #* Returns the newest value of a time series
+    if isinstance(series, list):
+        return next(value for key, value in series[-1].items() if key != 'time_stamp')
+    return series[series_name(series)][-1]
+
+def record_stat(path, change):
+    '''
+    Adds a point to the time series at path which is change more than its newest value,
+    stamped with the current time, without committing
+    '''
+    series = store.get(path)
+    if isinstance(series, list):
+        #* Workspaces saved before series were compacted hold them as lists of points
+        name = next(key for key in series[0] if key != 'time_stamp')
+        store.set(path, {
+            name: [point[name] for point in series],
+            'time_stamp': [point['time_stamp'] for point in series],
+        })
+        series = store.get(path)
+    name = series_name(series)
+    store.append(path + (name,), series[name][-1] + change)
+    store.append(path + ('time_stamp',), int(time.time()))
 
 def generate_new_message_id():
-    newID = getrandbits(32)
-    status = False
-    while not status:
-        try:
-            get_message(newID)
-            newID = getrandbits(32)
-        except:
-            status = True
+    #* Ids come from a counter kept in the store, so they are never reused and the
+    #* message list is never searched. The caller commits the counter with its message.
+    data = data_load()
+    if 'next_message_id' in data:
+        newID = data['next_message_id']
+    else:
+        #* Workspaces saved before the counter existed carry on after their highest id
+        newID = max((message['message_id'] for message in data['messages_log']), default=-1) + 1
+    store.set(('next_message_id',), newID + 1)
+    return newID
+
+def generate_new_dm_id():
+    #* Removing a DM moves the last DM into its place, so the newest id is no longer at the
+    #* end of the list. Like message ids, DM ids come from a counter committed by the caller.
+    data = data_load()
+    if 'next_dm_id' in data:
+        newID = data['next_dm_id']
+    else:
+        newID = max((dm['dm_id'] for dm in data['dms']), default=-1) + 1
+    store.set(('next_dm_id',), newID + 1)
     return newID
 
 def generate_reset_code():
@@ -296,17 +567,15 @@ def generate_reset_code():
     return reset_code
 
 def get_reset_code(email):
-    data = data_load()
-
-    for code in data['reset_codes']:
-        if code['email'] == email:
-            return code['reset_code']
+    '''
+    Returns the reset code last sent to email, or None if it has none
+    '''
+    code = data_load().get('reset_emails', {}).get(email)
+    return None if code is None else int(code)
 
 def data_load():
-    while True:
-        try:
-            with open('data.json', 'r') as FILE:
-                data = json.load(FILE)
-            return data
-        except:
-            pass
\ No newline at end of file
+    '''
+    Returns the live workspace held by the in-process data store
+    Changes must be made through src.data.store so that they are persisted
+    '''
+    return store.data
\ No newline at end of file
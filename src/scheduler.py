@@ -0,0 +1,157 @@
+'''
+Scheduled jobs for UNSW Dreams
+
+Work that has to happen later (sending a message at a set time, ending a standup) is run
+by a single scheduler thread instead of a thread per job. Jobs wait in a min-heap ordered
+by the time they are due; the thread sleeps until the earliest one is due (or a sooner job
+is scheduled), then runs it.
+
+A job names the function it runs, which the scheduling module registers once with
+register(), along with its arguments and the user it belongs to, so the jobs of a user
+can be listed and cancelled. Cancelling a job only forgets it; its heap entry is skipped
+when it comes up.
+
+Jobs are also kept in the workspace (under 'scheduled'), so they survive a restart: they
+are saved with the changes of whoever scheduled them, removed in the same commit as the
+changes their function makes, and load() puts them back in the heap at startup. Jobs that
+fell due while the server was down run straight away, oldest first.
+The scheduler's own lock may be taken while holding the store's lock, but never the other
+way around.
+'''
+import heapq
+import sys
+import threading
+import time
+from src.data import store
+
+#* Functions jobs can run, by name
+handlers = {}
+
+#* Jobs that are still to run, by job id, and the heap of (time due, job id) they are run from
+jobs = {}
+due = []
+scheduler = threading.Condition()
+worker = None
+
+def register(name, function):
+    '''
+    Lets jobs named name run function
+    '''
+    handlers[name] = function
+
+def schedule(when, name, args, u_id):
+    '''
+    Schedules handler name to be called with args at the Unix timestamp when, on behalf of user u_id.
+    The job is saved in the workspace but not committed, so it is committed with the caller's changes
+
+    Return Value:
+        Returns the id of the new job
+    '''
+    with store.lock.write():
+        data = store.data
+        job_id = data.get('next_job_id', 0)
+        store.set(('next_job_id',), job_id + 1)
+        job = {
+            'job_id': job_id,
+            'time': when,
+            'name': name,
+            'args': list(args),
+            'u_id': u_id,
+        }
+        if 'scheduled' not in data:
+            store.set(('scheduled',), {})
+        store.set(('scheduled', f"{job_id}"), job)
+
+        with scheduler:
+            jobs[job_id] = dict(job)
+            heapq.heappush(due, (when, job_id))
+            start()
+            #* The new job may be due before the one the thread is sleeping until
+            scheduler.notify()
+    return job_id
+
+def cancel(job_id):
+    '''
+    Stops job_id from running. Its removal from the workspace is not committed
+
+    Return Value:
+        Returns whether the job was still to run
+    '''
+    with store.lock.write():
+        with scheduler:
+            cancelled = jobs.pop(job_id, None) is not None
+        if cancelled:
+            store.delete(('scheduled', f"{job_id}"))
+        return cancelled
+
+def scheduled(u_id=None, name=None):
+    '''
+    Returns the jobs still to run (of user u_id and named name, if given), soonest first
+    '''
+    with scheduler:
+        return sorted(
+            (
+                dict(job) for job in jobs.values()
+                if (u_id is None or job['u_id'] == u_id) and (name is None or job['name'] == name)
+            ),
+            key=lambda job: (job['time'], job['job_id'])
+        )
+
+def load():
+    '''
+    Replaces the jobs still to run with the ones saved in the workspace, such as after a restart
+    '''
+    with store.lock.read():
+        saved = [dict(job) for job in store.data.get('scheduled', {}).values()]
+    with scheduler:
+        jobs.clear()
+        due.clear()
+        for job in saved:
+            jobs[job['job_id']] = job
+            due.append((job['time'], job['job_id']))
+        heapq.heapify(due)
+        start()
+        scheduler.notify()
+
+def clear():
+    '''
+    Forgets every job still to run (without touching the workspace)
+    '''
+    with scheduler:
+        jobs.clear()
+        due.clear()
+
+def start():
+    '''
+    Starts the scheduler thread, unless it is already running
+    '''
+    global worker
+    with scheduler:
+        if worker is None:
+            worker = threading.Thread(target=run, daemon=True)
+            worker.start()
+
+def run():
+    while True:
+        with scheduler:
+            while True:
+                #* Drop the entries of cancelled jobs
+                while due and due[0][1] not in jobs:
+                    heapq.heappop(due)
+                if due and due[0][0] <= time.time():
+                    break
+                scheduler.wait(due[0][0] - time.time() if due else None)
+            _, job_id = heapq.heappop(due)
+            job = jobs.pop(job_id)
+
+        #* The job runs without the scheduler's lock, so it can schedule or cancel jobs itself,
+        #* and is removed from the workspace in the same commit as its changes
+        with store.lock.write():
+            if f"{job_id}" in store.data.get('scheduled', {}):
+                store.delete(('scheduled', f"{job_id}"))
+            try:
+                handlers[job['name']](*job['args'])
+            except Exception as err:
+                print(f"scheduler: job {job['name']} {job['job_id']} failed: {err!r}", file=sys.stderr)
+            finally:
+                store.commit()
@@ -1,10 +1,12 @@
 import sys
 from json import dumps
-from flask import Flask, request, send_from_directory
+from flask import Flask, Response, request, send_from_directory
 from flask_cors import CORS
-from src.error import InputError
+from src.error import AccessError, InputError
 from src import config
+from src.data import store
 import src.auth, src.admin, src.other, src.dm, src.notifications, src.channel, src.channels, src.message, src.user, src.standup
+import src.mailer, src.scheduler
 from flask_mail import Mail, Message
 
 def defaultHandler(err):
@@ -67,7 +69,7 @@ def auth_logout():
 @APP.route("/auth/passwordreset/request/v1", methods=['POST'])
 def auth_password_reset_request():
     payload = request.get_json()
-    mail.send(src.auth.auth_passwordreset_request_v1(payload['email']))
+    src.mailer.send_mail(src.auth.auth_passwordreset_request_v1(payload['email']))
     return {}
 
 @APP.route("/auth/passwordreset/reset/v1", methods=['POST'])
@@ -87,6 +89,13 @@ def user_remove():
     payload = request.get_json()
     return src.admin.user_remove_v1(payload.get('token'), payload.get('u_id'))
 
+@APP.route("/admin/users/import/v1", methods=['POST'])
+def users_import():
+    #* The body is the file itself, read line by line straight off the request
+    token, file_format = request.args.get('token'), request.args.get('format', 'jsonl')
+    lines = (line.decode('utf-8', errors='replace') for line in request.stream)
+    return src.admin.admin_users_import_v1(token, src.admin.import_rows(lines, file_format))
+
 #* ****************************************************CHANNEL ROUTES***********************************************
 @APP.route("/channel/join/v2", methods=['POST'])
 def channel_join():
@@ -113,6 +122,11 @@ def channel_messages():
     token, channel_id, start = request.args.get('token'), request.args.get('channel_id'), request.args.get('start')
     return src.channel.channel_messages_v1(token, int(channel_id), int(start))
 
+@APP.route("/channel/messages/v3", methods=['GET'])
+def channel_messages_v3():
+    token, channel_id, cursor = request.args.get('token'), request.args.get('channel_id'), request.args.get('cursor', '')
+    return src.channel.channel_messages_v3(token, int(channel_id), cursor)
+
 @APP.route("/channel/addowner/v1", methods=['POST'])
 def channel_addowner():
     payload = request.get_json()
@@ -161,11 +175,44 @@ def notifications_get():
     token = request.args.get('token')
     return src.notifications.notifications_get_v1(token)
 
+@APP.route("/notifications/wait/v1", methods=['GET'])
+def notifications_wait():
+    token, cursor = request.args.get('token'), request.args.get('cursor')
+    timeout = request.args.get('timeout')
+    return src.notifications.notifications_wait_v1(token, cursor, None if timeout is None else float(timeout))
+
+@APP.route("/notifications/stream/v1", methods=['GET'])
+def notifications_stream():
+    token = request.args.get('token')
+    #* A reconnecting EventSource carries on from the last event it received
+    cursor = request.headers.get('Last-Event-ID') or request.args.get('cursor')
+    #* Errors in the token or cursor are reported before the stream starts
+    result = src.notifications.notifications_wait_v1(token, cursor, 0)
+
+    def events(result):
+        while True:
+            if result['notifications']:
+                yield f"id: {result['cursor']}\ndata: {dumps(result['notifications'])}\n\n"
+            else:
+                yield ": keep-alive\n\n"
+            try:
+                result = src.notifications.notifications_wait_v1(token, result['cursor'])
+            except AccessError:
+                return
+
+    return Response(events(result), mimetype='text/event-stream')
+
 @APP.route("/search/v2", methods=['GET'])
 def search():
     token, query_str = request.args.get('token'), request.args.get('query_str')
     return src.other.search_v1(token, query_str)
 
+@APP.route("/search/v3", methods=['GET'])
+def search_v3():
+    token, query_str = request.args.get('token'), request.args.get('query_str')
+    limit, cursor = request.args.get('limit', 50), request.args.get('cursor', '')
+    return src.other.search_v3(token, query_str, int(limit), cursor)
+
 @APP.route("/message/share/v1", methods=['POST'])
 def message_share():
     payload = request.get_json()
@@ -185,6 +232,17 @@ def message_sendlater():
 def message_sendlaterdm():
     payload = request.get_json()
     return src.message.message_sendlaterdm_v1(payload['token'], payload['dm_id'], payload['message'], payload['time_sent'])
+
+@APP.route("/message/sendlater/list/v1", methods=['GET'])
+def message_sendlater_list():
+    token = request.args.get('token')
+    return src.message.message_sendlater_list_v1(token)
+
+@APP.route("/message/sendlater/cancel/v1", methods=['DELETE'])
+def message_sendlater_cancel():
+    payload = request.get_json()
+    return src.message.message_sendlater_cancel_v1(payload['token'], payload['message_id'])
+
 @APP.route("/message/pin/v1", methods=['POST'])
 def message_pin():
     payload = request.get_json()
@@ -241,6 +299,11 @@ def dm_leave():
 def dm_messages():
     token, dm_id, start = request.args.get('token'), request.args.get('dm_id'), request.args.get('start')
     return src.dm.dm_messages_v1(token, int(dm_id), int(start))
+
+@APP.route("/dm/messages/v3", methods=['GET'])
+def dm_messages_v3():
+    token, dm_id, cursor = request.args.get('token'), request.args.get('dm_id'), request.args.get('cursor', '')
+    return src.dm.dm_messages_v3(token, int(dm_id), cursor)
     
     
     
@@ -310,4 +373,12 @@ def send_js(path):
 
 #* SERVER RUN
 if __name__ == "__main__":
+    store.load()
+    store.start_snapshots()
+    src.scheduler.load()
+    src.auth.start_session_reaper()
+    if config.mail_spool:
+        src.mailer.start_mailer(src.mailer.spool_transport(config.mail_spool))
+    else:
+        src.mailer.start_mailer(src.mailer.smtp_transport(APP, mail))
     APP.run(port=config.port) # Do not edit this port
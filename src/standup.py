@@ -1,15 +1,24 @@
 #File for implementation of standup functions 
 from src.error import AccessError, InputError
-from src.other import decode, get_channel, generate_new_message_id, get_user, data_load, push_tagged_notifications
+from src.other import decode, get_channel, generate_new_message_id, get_user, data_load, push_tagged_notifications, record_stat
+from src.data import store, read_locked, write_locked
+from src import scheduler
 from datetime import datetime
-import json
-import threading, time
+import time
 
 AuID     = 'auth_user_id'
 uID      = 'u_id'
 cID      = 'channel_id'
 chans    = 'channels'
 
+def get_standup(channel_id):
+    #* Returns the row of the active standup in channel_id, found through the store's index, or None
+    try:
+        return store.row('stand_ups', channel_id)
+    except KeyError:
+        return None
+
+@write_locked
 def standup_start_v1(token, channel_id, length):
     '''
     For a given channel, begin a standup in which messages that are sent will be sent as one string at end of time specified 
@@ -36,11 +45,9 @@ def standup_start_v1(token, channel_id, length):
     #* If authorised user is not in the channel, an AccessError is raised
     if auth_user_id not in get_channel(channel_id)['all_members']:
         raise AccessError
-    elif standup_active_v1(token, channel_id)['is_active']:
+    elif get_standup(channel_id) is not None:
         raise InputError
 
-    data = data_load()
-
     now = datetime.now()
     time_finish = int(now.strftime("%s")) + length
 
@@ -49,15 +56,15 @@ def standup_start_v1(token, channel_id, length):
         'time_finish': time_finish,
         'messages': []
     }
-    data['stand_ups'].append(new_stand_up)
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.append(('stand_ups',), new_stand_up)
+    scheduler.schedule(time.time() + length, 'standup', (auth_user_id, channel_id), auth_user_id)
+    store.commit()
     
-    threading.Timer(length, stand_up_push, args=(auth_user_id, channel_id)).start()
     return {
         'time_finish': time_finish
     }
 
+@read_locked
 def standup_active_v1(token, channel_id):
     '''
     For a given channel, return whether a standup is active in it or not and the time in which an active standup will be finished 
@@ -77,20 +84,20 @@ def standup_active_v1(token, channel_id):
     _, _ = decode(token)
     #* If Channel ID is not a valid channel, then an InputError is raised
     get_channel(channel_id)
-    data = data_load()
-    
-    for stand_up in data['stand_ups']:
-        if channel_id == stand_up[cID]:
-            return {
-                'is_active': True,
-                'time_finish': stand_up['time_finish']
-            }
+
+    standup = get_standup(channel_id)
+    if standup is not None:
+        return {
+            'is_active': True,
+            'time_finish': standup['time_finish']
+        }
     return {
             'is_active': False,
             'time_finish': None
         }
 
 #* Append string with "handle: message" to stand_up messages
+@write_locked
 def standup_send_v1(token, channel_id, message):
     '''
     For a given channel, sends a message to a standup queue which will be appended to messages log as one string when standup is finished 
@@ -112,27 +119,26 @@ def standup_send_v1(token, channel_id, message):
         Returns an empty dictionary {}
     '''
     auth_user_id, _ = decode(token)
-    if auth_user_id not in get_channel(channel_id)['all_members']:
+    get_channel(channel_id)
+    standup = get_standup(channel_id)
+    if channel_id not in store.memberships(chans, auth_user_id):
         raise AccessError
-    elif not standup_active_v1(token, channel_id)['is_active']:
+    elif standup is None:
         raise InputError
     elif len(message) > 1000:
         raise InputError
 
-    data = data_load()
-
-    for stand_up in data['stand_ups']:
-        if channel_id == stand_up[cID]:
-            stand_up['messages'].append(f"{get_user(auth_user_id)['handle_str']}: {message}")
-
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    #* Each line is one small record appended to the log, which is not synced to disk: it survives
+    #* a restart, and is synced by the next full commit (at the latest when the standup ends)
+    store.append(('stand_ups', channel_id, 'messages'), f"{store.row('users', auth_user_id)['handle_str']}: {message}")
+    store.commit(sync=False)
 
     return {}
 
 #* Function which is run at the end of the standup
 #* Compiles messages into one big string
 #* Removes the stand_up dictionary
+@write_locked
 def stand_up_push(auth_user_id, channel_id):
     '''
     For a given channel, the function which executes the associated standup functions once the thread for the standup is completed. This includes: compiling the messages queue into one string and removing the stand-up from the dictionary
@@ -147,17 +153,17 @@ def stand_up_push(auth_user_id, channel_id):
     data = data_load()
 
     message = ''
-    for index, stand_up in enumerate(data['stand_ups']):
-        if stand_up[cID] == channel_id:
-            target = data['stand_ups'].pop(index)
-            message = "\n".join(target['messages'])
+    standup = get_standup(channel_id)
+    if standup is not None:
+        message = "\n".join(standup['messages'])
+        store.delete(('stand_ups', channel_id))
     
     now = datetime.now()
     time_created = int(now.strftime("%s"))
     newID = generate_new_message_id()
 
     if message != '':
-        data['messages_log'].append(
+        store.append(('messages_log',),
             {
                 'channel_id'    : channel_id,
                 'dm_id'         : -1,
@@ -169,22 +175,13 @@ def stand_up_push(auth_user_id, channel_id):
                 'is_pinned': False,
             }
         )
-        updated_num_message = data['dreams_analytics']['messages_exist'][-1]['num_messages_exist'] + 1
-        data['dreams_analytics']['messages_exist'].append({
-            'num_messages_exist': updated_num_message,
-            'time_stamp': int(datetime.now().strftime("%s"))
-        })
+        record_stat(('dreams_analytics', 'messages_exist'), 1)
         #* update analytics
-        messageSentPrev = data["user_analytics"][f"{auth_user_id}"]['messages_sent'][-1]["num_messages_sent"]
-        data["user_analytics"][f"{auth_user_id}"]['messages_sent'].append(
-            {
-                "num_messages_sent": messageSentPrev + 1,
-                "time_stamp": int(datetime.now().strftime("%s"))
-            }
-        )   
+        record_stat(('user_analytics', f"{auth_user_id}", 'messages_sent'), 1)
 
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.commit()
 
         #* Push notifications if anyone is tagged
     push_tagged_notifications(auth_user_id, channel_id, -1, message)
+
+scheduler.register('standup', stand_up_push)
@@ -1,7 +1,7 @@
 from src.error import InputError
 import re
-from src.other import decode, check_session, get_user, data_load
-import json
+from src.other import decode, check_session, get_user, data_load, series_points, latest_stat
+from src.data import store, read_locked, write_locked
 import urllib.request
 import requests
 from PIL import Image
@@ -9,6 +9,7 @@ from src.config import url
 
 
 
+@read_locked
 def user_profile_v2(token, u_id):
     """ Provided the u_id of an existing user with a valid token, returns information about the user 
         which corresponds with the u_id
@@ -34,6 +35,7 @@ def user_profile_v2(token, u_id):
         'user': get_user(u_id)
     }
 
+@write_locked
 def user_setname_v2(token, name_first, name_last):
     
     """ Provided with a valid token, the first and last names of the user corresponding to the payload of the token are
@@ -62,20 +64,16 @@ def user_setname_v2(token, name_first, name_last):
         raise InputError
     if len(name_last) > 50 or len(name_last) < 1:
         raise InputError
-        
-    data = data_load()
 
-    for user in data['users']:
-        if auth_user_id == user['u_id']:
-            user['name_first'] = name_first
-            user['name_last'] = name_last
+    store.set(('users', auth_user_id, 'name_first'), name_first)
+    store.set(('users', auth_user_id, 'name_last'), name_last)
 
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.commit()
 
     return {
     }
 
+@write_locked
 def user_setemail_v2(token, email):
     """ Provided with a valid token, the email of the user corresponding to the payload of the token is
         changed to the provided email
@@ -100,22 +98,19 @@ def user_setemail_v2(token, email):
     if not re.search('^[a-zA-Z0-9]+[\\._]?[a-zA-Z0-9]+[@]\\w+[.]\\w{2,3}$', email):
         raise InputError
 
-    data = data_load()
+    #* Emails are unique whatever their case, but a user may change the case of their own
+    owner = store.find('users', 'email', email)
+    if owner is not None and (owner['u_id'] != auth_user_id or owner['email'] == email):
+        raise InputError
 
-    for user in data['users']:
-        if email == user['email']:
-            raise InputError
-            
-    for user in data['users']:
-        if auth_user_id == user['u_id']:
-            user['email'] = email
+    store.set(('users', auth_user_id, 'email'), email)
 
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.commit()
              
     return {
     }
 
+@write_locked
 def user_sethandle_v2(token, handle_str):
     """ Provided with a valid token, the handle string of the user corresponding to the payload of the token is
         changed to the provided handle string
@@ -141,22 +136,17 @@ def user_sethandle_v2(token, handle_str):
     if len(handle_str) < 3 or len(handle_str) > 20:
         raise InputError
 
-    data = data_load()
-    
-    for user in data['users']:
-        if handle_str == user['handle_str']:
-            raise InputError
-            
-    for user in data['users']:
-        if auth_user_id == user['u_id']:
-            user['handle_str'] = handle_str
+    if store.find('users', 'handle_str', handle_str) is not None:
+        raise InputError
 
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    store.set(('users', auth_user_id, 'handle_str'), handle_str)
+
+    store.commit()
             
     return {
     }
 
+@read_locked
 def users_all(token):
     """ Provided with a valid token, returns a list containing information on all registered users
 
@@ -184,6 +174,7 @@ def users_all(token):
     
     }
 
+@read_locked
 def user_stats_v1(token):
 
     '''
@@ -209,9 +200,10 @@ def user_stats_v1(token):
 
     data = data_load()
 
-    userstat = data["user_analytics"][f"{auth_user_id}"].copy()
+    analytics = data["user_analytics"][f"{auth_user_id}"]
+    userstat = {key: series_points(series) for key, series in analytics.items()}
 
-    userInvolvement = (userstat["channels_joined"][-1]["num_channels_joined"],userstat["dms_joined"][-1]["num_dms_joined"],userstat["messages_sent"][-1]["num_messages_sent"])
+    userInvolvement = (latest_stat(analytics["channels_joined"]), latest_stat(analytics["dms_joined"]), latest_stat(analytics["messages_sent"]))
     dreamsNumbers = (len(data["channels"]), len(data["dms"]), len(data["messages_log"]))
 
     involvementRate = sum(userInvolvement)/sum(dreamsNumbers)
@@ -222,6 +214,7 @@ def user_stats_v1(token):
         "user_stats": userstat
     }
 
+@read_locked
 def users_stats_v1(token):
     
     '''
@@ -245,23 +238,13 @@ def users_stats_v1(token):
     '''
     decode(token)
 
-    active_users = {}
     data = data_load()
 
-    for channel in data['channels']:
-        for member in channel['all_members']:
-            if member not in active_users:
-                active_users[member] = 1
-
-    for dm in data['dms']:
-        for member in dm['all_members']:
-            if member not in active_users:
-                active_users[member] = 1
-
-    num_active_users = len(active_users)
+    #* The store counts the users in at least one channel or DM as memberships change
+    num_active_users = store.participants()
     num_users = len(data['users'])
     utilization_rate = num_active_users / num_users
-    dream_stats = data['dreams_analytics'].copy()
+    dream_stats = {key: series_points(series) for key, series in data['dreams_analytics'].items()}
     dream_stats.update({'utilization_rate': utilization_rate})
     
     return { 
@@ -316,13 +299,9 @@ def user_profile_uploadphoto_v1(token, img_url,x_start,y_start,x_end,y_end):
     imageObject.crop((x_start, y_start, x_end, y_end)).save(f"src/static/{auth_user_id}.jpg")
 
     # Serving image
-    data = data_load()
-
-    for user in data['users']:
-        if user['u_id'] == auth_user_id:
-            user['profile_img_url'] = f"{url}static/{auth_user_id}.jpg"
-
-    with open('data.json', 'w') as FILE:
-        json.dump(data, FILE)
+    #* Only lock the store once the download and crop are done
+    with store.lock.write():
+        store.set(('users', auth_user_id, 'profile_img_url'), f"{url}static/{auth_user_id}.jpg")
+        store.commit()
 
     return {}
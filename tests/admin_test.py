@@ -1,11 +1,14 @@
 # File to test functions in src/admin.py
 import pytest
-from src.admin import user_remove_v1, userpermission_change_v1
+from src.admin import user_remove_v1, userpermission_change_v1, admin_users_import_v1, import_rows
+from src.data import store
 from src.error import AccessError, InputError
 from src.other import SECRET
-import src.channel, src.channels, src.auth, src.dm, src.message, src.other, src.user
+import src.channel, src.channels, src.auth, src.dm, src.message, src.other, src.user, src.notifications
 import jwt
 import json
+import threading
+from src import config
 from src.config import url
 
 AuID    = 'auth_user_id'
@@ -145,4 +148,67 @@ def test_userpermissions_change(user1, user2, user3):
 
     #* Test 7: Raise Access Error when a non- Dreams owner is changing permissions
     with pytest.raises(AccessError):
-        userpermission_change_v1(user3[token], user3[token], 2)
\ No newline at end of file
+        userpermission_change_v1(user3[token], user3[token], 2)
+
+# Bulk imports register every valid row and report on each row
+def test_users_import(user1, user2):
+    rows = [
+        {'email': 'third@gmail.com', 'password': 'password', 'name_first': 'User', 'name_last': '3'},
+        {'email': 'second@gmail.com', 'password': 'password', 'name_first': 'User', 'name_last': '2'},
+        {'email': 'fourth@gmail.com', 'password': 'short', 'name_first': 'User', 'name_last': '4'},
+        {'email': 'fourth@gmail.com', 'password': 'password', 'name_first': 'User'},
+        {'email': 'fourth@gmail.com', 'password': 'password', 'name_first': 'User', 'name_last': 4},
+        {'email': 'fourth@gmail.com', 'password': 'password', 'name_first': 'User', 'name_last': '1'},
+    ]
+    result = admin_users_import_v1(user1[token], enumerate(rows, start=1))
+    assert result == {
+        'results': [
+            {'line': 1, 'is_success': True, AuID: 2},
+            {'line': 2, 'is_success': False},
+            {'line': 3, 'is_success': False},
+            {'line': 4, 'is_success': False},
+            {'line': 5, 'is_success': False},
+            {'line': 6, 'is_success': True, AuID: 3},
+        ],
+        'num_imported': 2,
+    }
+
+    #* Imported users are full users: they can log in, get notifications and analytics
+    login = src.auth.auth_login_v2('fourth@gmail.com', 'password')
+    assert src.user.user_profile_v2(login[token], 3)['user']['handle_str'] == 'user10'
+    assert src.notifications.notifications_get_v1(login[token]) == {'notifications': []}
+    assert store.get(('user_analytics', '3', 'messages_sent'))['num_messages_sent'] == [0]
+
+    #* Only Dreams owners can import users
+    with pytest.raises(AccessError):
+        admin_users_import_v1(user2[token], enumerate(rows, start=1))
+
+# Other requests can write while an import reads the next batch of its input
+def test_users_import_batches(monkeypatch, user1):
+    monkeypatch.setattr(config, 'import_batch_size', 2)
+
+    def rows():
+        for number in range(5):
+            other = threading.Thread(target=src.auth.auth_register_v2, args=(f"other{number}@gmail.com", 'password', 'Other', 'User'), daemon=True)
+            other.start()
+            other.join(5)
+            assert not other.is_alive()
+            yield number + 1, {'email': f"student{number}@gmail.com", 'password': 'password', 'name_first': 'Student', 'name_last': 'User'}
+
+    result = admin_users_import_v1(user1[token], rows())
+    assert result['num_imported'] == 5
+    #* Two users are registered by other requests before each batch of two is imported
+    assert [row[AuID] for row in result['results']] == [3, 4, 7, 8, 10]
+
+# Import files are read as JSON lines or CSV, one line at a time
+def test_users_import_rows():
+    lines = ['{"email": "a@b.com"}\n', '\n', 'not json\n', '[1, 2]\n']
+    assert list(import_rows(iter(lines), 'jsonl')) == [(1, {'email': 'a@b.com'}), (3, {}), (4, {})]
+
+    lines = ['email,password,name_first,name_last\n', '\n', 'third@gmail.com,password,User,3\n']
+    assert list(import_rows(iter(lines), 'csv')) == [
+        (3, {'email': 'third@gmail.com', 'password': 'password', 'name_first': 'User', 'name_last': '3'}),
+    ]
+
+    with pytest.raises(InputError):
+        import_rows(iter(lines), 'xml')
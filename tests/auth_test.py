@@ -1,10 +1,15 @@
 # File to test functions in src/auth.py
 from src.error import AccessError, InputError
 import pytest
-from src.auth import auth_login_v2, auth_register_v2, auth_logout_v1, auth_passwordreset_request_v1, auth_passwordreset_reset_v1
+from src.auth import auth_login_v2, auth_register_v2, auth_logout_v1, auth_passwordreset_request_v1, auth_passwordreset_reset_v1, auth_reap_sessions, auth_reap_reset_codes
 from src.user import user_profile_v2
 import src.channel, src.channels
-from src.other import clear_v1, SECRET, check_session, get_user, get_reset_code
+from src.other import clear_v1, SECRET, check_session, get_user, get_reset_code, decode
+from src.data import store
+from src import config
+import time
+import json
+import os
 from jwt import encode
 from src.config import url
 
@@ -152,6 +157,17 @@ def test_auth_register_valid_same_name_multiple():
     assert auth_register_v2("caricoleman@yahoo.com", "1234567", "cari", "coleman") == {'token': token3, 'auth_user_id': 2,}
     assert auth_register_v2("caricoleman@bing.com", "1234567", "cari", "coleman") == {'token': token4, 'auth_user_id': 3,}
 
+# tests that duplicated handles take the next unused number, skipping numbered handles already taken
+def test_auth_register_handle_suffixes():
+    clear_v1()
+    auth_register_v2("caricoleman@gmail.com", "1234567", "cari", "coleman")
+    auth_register_v2("caricoleman1@gmail.com", "1234567", "cari", "coleman1")
+    handles = [
+        get_user(auth_register_v2(f"cari{i}@gmail.com", "1234567", "cari", "coleman")['auth_user_id'])['handle_str']
+        for i in range(4)
+    ]
+    assert handles == ['caricoleman0', 'caricoleman2', 'caricoleman3', 'caricoleman4']
+
 # tests the handle string of the user when the first and last names of the user are capatilised
 def test_auth_register_valid_front_capatilised():
     clear_v1()
@@ -310,6 +326,69 @@ def test_auth_logout_v1_valid():
     with pytest.raises(AccessError):
         check_session(user_data_1['auth_user_id'], 1)
 
+# tests that a session id is never handed out again once it has been logged out
+def test_auth_login_new_session_ids():
+    clear_v1()
+    auth_register_v2("caricoleman@gmail.com", "1234567", "cari", "coleman")
+    token_1 = auth_login_v2("caricoleman@gmail.com", "1234567")['token']
+    auth_logout_v1(token_1)
+    token_2 = auth_login_v2("caricoleman@gmail.com", "1234567")['token']
+
+    assert decode(token_2) == (0, 2)
+    with pytest.raises(AccessError):
+        decode(token_1)
+
+# tests that logging in past the session limit ends the user's oldest session
+def test_auth_login_session_limit(monkeypatch):
+    clear_v1()
+    monkeypatch.setattr(config, 'session_limit', 2)
+    user_data = auth_register_v2("caricoleman@gmail.com", "1234567", "cari", "coleman")
+    decode(user_data['token'])
+    token_1 = auth_login_v2("caricoleman@gmail.com", "1234567")['token']
+    token_2 = auth_login_v2("caricoleman@gmail.com", "1234567")['token']
+
+    with pytest.raises(AccessError):
+        decode(user_data['token'])
+    assert decode(token_1) == (0, 1)
+    assert decode(token_2) == (0, 2)
+    assert list(store.row('users', 0)['sessions']) == ['1', '2']
+
+# tests that sessions stop working once they expire, and are then reaped
+def test_auth_session_expiry(monkeypatch):
+    clear_v1()
+    ttl = config.session_ttl
+    monkeypatch.setattr(config, 'session_ttl', 1000)
+    user_data = auth_register_v2("caricoleman@gmail.com", "1234567", "cari", "coleman")
+    decode(user_data['token'])
+    monkeypatch.setattr(config, 'session_ttl', ttl)
+    token_1 = auth_login_v2("caricoleman@gmail.com", "1234567")['token']
+    assert auth_reap_sessions() == 0
+
+    #* Jump forward past the end of the first session but not the second
+    now = time.time() + 1001
+    monkeypatch.setattr(time, 'time', lambda: now)
+    with pytest.raises(AccessError):
+        decode(user_data['token'])
+    assert decode(token_1) == (0, 1)
+
+    assert auth_reap_sessions() == 1
+    assert list(store.row('users', 0)['sessions']) == ['1']
+
+# tests that emails are matched whatever their case, and a failed login changes nothing
+def test_auth_login_email_case():
+    clear_v1()
+    auth_register_v2("CariColeman@gmail.com", "1234567", "cari", "coleman")
+    assert auth_login_v2("caricoleman@GMAIL.com", "1234567")['auth_user_id'] == 0
+    with pytest.raises(InputError):
+        auth_register_v2("caricoleman@gmail.com", "1234567", "erica", "mondy")
+
+    store.commit()
+    store.snapshot()
+    with pytest.raises(InputError):
+        auth_login_v2("caricoleman@gmail.com", "7654321")
+    assert not store.dirty
+    assert get_user(0)['email'] == "CariColeman@gmail.com"
+
 # tests for the case when a token with an invalid session_id is inputted
 def test_auth_logout_v1_invalid():    
     clear_v1()
@@ -361,4 +440,70 @@ def test_auth_passwordreset_reset():
     new_password = 'CrocodileLikesStrawberries'
 
     auth_passwordreset_reset_v1(reset, new_password)
-    auth_login_v2(get_user(user2['auth_user_id'])['email'], new_password)
\ No newline at end of file
+    auth_login_v2(get_user(user2['auth_user_id'])['email'], new_password)
+
+#* Test that reset codes stop working once they expire, and are then swept away
+def test_auth_passwordreset_expiry(monkeypatch):
+    clear_v1()
+    user1 = auth_register_v2("caricoleman@gmail.com", "1234567", "cari", "coleman")
+    auth_passwordreset_request_v1("caricoleman@gmail.com")
+    code1 = get_reset_code("caricoleman@gmail.com")
+    auth_passwordreset_request_v1("caricoleman@gmail.com")
+    code2 = get_reset_code("caricoleman@gmail.com")
+
+    #* A newer code invalidates the old one
+    with pytest.raises(InputError):
+        auth_passwordreset_reset_v1(code1, "newpassword")
+    assert list(store.data['reset_codes']) == [str(code2)]
+    assert auth_reap_reset_codes() == 0
+
+    now = time.time() + config.reset_code_ttl
+    monkeypatch.setattr(time, 'time', lambda: now)
+    with pytest.raises(InputError):
+        auth_passwordreset_reset_v1(code2, "newpassword")
+
+    assert auth_reap_reset_codes() == 1
+    assert store.data['reset_codes'] == {}
+    assert get_reset_code("caricoleman@gmail.com") is None
+    assert auth_login_v2("caricoleman@gmail.com", "1234567")['auth_user_id'] == user1['auth_user_id']
+
+#* Test that users saved before sessions could expire can still use their tokens, log in and log out
+def test_auth_legacy_sessions():
+    clear_v1()
+    with open(store.path, 'w') as FILE:
+        json.dump({
+            'users': [{
+                'email': 'caricoleman@gmail.com',
+                'password': '8bb0cf6eb9b17d0f7d22b456f121257dc1254e1f01665370476383ea776df414',
+                'name_first': 'cari',
+                'name_last': 'coleman',
+                'u_id': 0,
+                'handle_str': 'caricoleman',
+                'permission_id': 1,
+                'session_id': [0, 1],
+                'profile_img_url': f"{url}static/default.jpg",
+            }],
+            'channels': [],
+            'dms': [],
+            'messages_log': [],
+            'notifs': {'0': []},
+            'user_analytics': {},
+            'stand_ups': [],
+            'reset_codes': [],
+        }, FILE)
+    os.remove(store.log_path)
+    store.load()
+
+    token1 = encode({'session_id': 1, 'user_id': 0}, SECRET, algorithm='HS256')
+    assert decode(token1) == (0, 1)
+    token2 = auth_login_v2("caricoleman@gmail.com", "1234567")['token']
+    assert decode(token2) == (0, 2)
+    assert auth_logout_v1(token1) == {'is_success': True}
+    with pytest.raises(AccessError):
+        decode(token1)
+
+    #* The upgrade is logged, so it is not redone differently after a restart
+    store.load()
+    assert decode(token2) == (0, 2)
+    assert 'session_id' not in store.row('users', 0)
+    clear_v1()
@@ -1,11 +1,11 @@
 # File to test functions in src/channel.py
 
 import pytest
-from src.channel import channel_invite_v1, channel_details_v1, channel_messages_v1, channel_leave_v1, channel_join_v1, channel_addowner_v1, channel_removeowner_v1
+from src.channel import channel_invite_v1, channel_details_v1, channel_messages_v1, channel_leave_v1, channel_join_v1, channel_addowner_v1, channel_removeowner_v1, channel_messages_v3
 import src.auth, src.channels, src.other
 from src.error import InputError, AccessError
 from src.channels import channels_create_v1, channels_list_v2
-from src.message import message_send_v1
+from src.message import message_send_v1, message_remove_v1
 import jwt
 from src.other import SECRET
 from src.config import url
@@ -144,6 +144,56 @@ def test_channel_messages(user1, user2):
     assert channel_messages_v1(user1[token], firstChannel[cID], 0)["start"] == 0
     assert channel_messages_v1(user1[token], firstChannel[cID], 0)["end"] == 50
 
+# Pages walk back from the newest message, and removed messages drop out of them
+def test_channel_messages_pages(user1):
+    channel = channels_create_v1(user1[token], 'Yggdrasil', False)
+    sent = [message_send_v1(user1[token], channel[cID], f"{i}")['message_id'] for i in range(120)]
+    message_remove_v1(user1[token], sent[119])
+
+    firstPage = channel_messages_v1(user1[token], channel[cID], 0)
+    assert [msg['message'] for msg in firstPage['messages']] == [f"{i}" for i in range(118, 68, -1)]
+    assert firstPage['end'] == 50
+
+    lastPage = channel_messages_v1(user1[token], channel[cID], 100)
+    assert [msg['message'] for msg in lastPage['messages']] == [f"{i}" for i in range(18, -1, -1)]
+    assert lastPage['end'] == -1
+
+# Cursors page through history without shifting when new messages arrive
+def test_channel_messages_cursor(user1, user2):
+    channel = channels_create_v1(user1[token], 'Yggdrasil', False)
+    for i in range(120):
+        message_send_v1(user1[token], channel[cID], f"{i}")
+
+    def texts(page):
+        return [msg['message'] for msg in page['messages']]
+
+    firstPage = channel_messages_v3(user1[token], channel[cID], '')
+    assert texts(firstPage) == [f"{i}" for i in range(119, 69, -1)]
+    assert firstPage['prev_cursor'] == ''
+
+    #* New messages do not push already seen messages onto the next page
+    message_send_v1(user1[token], channel[cID], "new")
+    secondPage = channel_messages_v3(user1[token], channel[cID], firstPage['next_cursor'])
+    assert texts(secondPage) == [f"{i}" for i in range(69, 19, -1)]
+
+    lastPage = channel_messages_v3(user1[token], channel[cID], secondPage['next_cursor'])
+    assert texts(lastPage) == [f"{i}" for i in range(19, -1, -1)]
+    assert lastPage['next_cursor'] == ''
+
+    #* Walking back towards the newest messages
+    newerPage = channel_messages_v3(user1[token], channel[cID], lastPage['prev_cursor'])
+    assert texts(newerPage) == texts(secondPage)
+    newestPage = channel_messages_v3(user1[token], channel[cID], newerPage['prev_cursor'])
+    assert texts(newestPage) == texts(firstPage)
+    newPage = channel_messages_v3(user1[token], channel[cID], newestPage['prev_cursor'])
+    assert texts(newPage) == ['new']
+    assert newPage['prev_cursor'] == ''
+
+    with pytest.raises(InputError):
+        channel_messages_v3(user1[token], channel[cID], 'notacursor')
+    with pytest.raises(AccessError):
+        channel_messages_v3(user2[token], channel[cID], '')
+
 def test_channel_leave(user1, user2, user3, user4):
 
     #* user1 made public channel 'TrumpPence'
@@ -0,0 +1,388 @@
+# file to test the in-process data store in src/data.py
+import pytest
+import os
+import shutil
+import threading
+from src.data import DataStore, RWLock, empty_data
+
+cID     = 'channel_id'
+allMems = 'all_members'
+
+@pytest.fixture
+def store(tmp_path):
+    store = DataStore(str(tmp_path / 'data.json'))
+    store.clear()
+    return store
+
+@pytest.fixture
+def channel(store):
+    store.append(('channels',), {
+        'channel_id': 0,
+        'is_public': True,
+        'name': 'TrumpPence',
+        'owner_members': [0],
+        'all_members': [0],
+    })
+    return store.get(('channels', 0))
+
+# A store with nothing saved on disk starts out empty
+def test_empty_store(tmp_path):
+    store = DataStore(str(tmp_path / 'data.json'))
+    assert store.data == empty_data()
+
+# Paths through a row collection are keyed by the row's id, not its list index
+def test_row_paths(store, channel):
+    store.append(('channels',), {
+        'channel_id': 5,
+        'is_public': False,
+        'name': 'BidenHarris',
+        'owner_members': [1],
+        'all_members': [1],
+    })
+    store.append(('channels', 5, allMems), 2)
+    store.remove(('channels', 0, allMems), 0)
+
+    assert store.get(('channels', 5, allMems)) == [1, 2]
+    assert channel[allMems] == []
+
+    store.delete(('channels', 0))
+    assert [chan[cID] for chan in store.data['channels']] == [5]
+
+    with pytest.raises(KeyError):
+        store.get(('channels', 0))
+
+# Deleting a row keeps the order of the rest, unless the collection's order does not matter,
+# and every row can still be found by id
+def test_row_delete(store):
+    for dm_id in range(5):
+        store.append(('dms',), {'dm_id': dm_id, 'all_members': [dm_id]})
+        store.append(('stand_ups',), {'channel_id': dm_id, 'messages': []})
+        store.append(('messages_log',), {
+            'message_id': dm_id,
+            'channel_id': 0,
+            'dm_id': -1,
+            'message': '',
+        })
+    for collection in ('dms', 'stand_ups'):
+        store.delete((collection, 1))
+        store.delete((collection, 4))
+    store.append(('dms', 3, allMems), 1)
+
+    assert [dm['dm_id'] for dm in store.data['dms']] == [0, 2, 3]
+    assert [standup['channel_id'] for standup in store.data['stand_ups']] == [0, 3, 2]
+    assert store.row('dms', 3) is store.data['dms'][2]
+    assert store.row('stand_ups', 3) is store.data['stand_ups'][1]
+    assert store.get(('dms', 3, allMems)) == [3, 1]
+
+    #* Groups come back in the same order after a snapshot and a reload
+    store.delete(('messages_log', 1))
+    store.snapshot()
+    reloaded = DataStore(store.path)
+    assert reloaded.data == store.data
+    assert [row['message_id'] for row in reversed(reloaded.group('messages_log', cID, 0))] == [4, 3, 2, 0]
+    reloaded.delete(('messages_log', 2))
+    assert reloaded.row('messages_log', 3) is reloaded.data['messages_log'][1]
+
+# set/insert/delete work on plain dictionaries and lists too
+def test_nested_paths(store):
+    store.set(('notifs', '0'), [])
+    store.insert(('notifs', '0'), 0, 'first')
+    store.insert(('notifs', '0'), 0, 'second')
+    assert store.get(('notifs', '0')) == ['second', 'first']
+
+    store.delete(('notifs', '0', 1))
+    assert store.get(('notifs', '0')) == ['second']
+
+    store.delete(('notifs', '0'))
+    assert store.data['notifs'] == {}
+
+# Reads come straight from memory, only commit() touches the disk
+def test_commit_and_load(store, channel):
+    reloaded = DataStore(store.path)
+    assert reloaded.data['channels'] == []
+
+    store.commit()
+    reloaded.load()
+    assert reloaded.data['channels'] == [channel]
+
+# Replaying the log over the snapshot rebuilds exactly the same workspace
+def test_log_replay(store, channel):
+    store.append(('channels', 0, allMems), 1)
+    store.set(('channels', 0, 'name'), 'BidenHarris')
+    store.set(('notifs', '1'), [])
+    store.insert(('notifs', '1'), 0, {'dm_id': -1})
+    store.commit()
+    store.remove(('channels', 0, allMems), 0)
+    store.delete(('notifs', '1'))
+    store.commit()
+
+    reloaded = DataStore(store.path)
+    assert reloaded.data == store.data
+
+# Each commit only appends the changes made since the previous commit
+def test_commit_appends_changes(store, channel):
+    #* The log starts with a header line naming its snapshot generation
+    store.commit()
+    with open(store.log_path) as FILE:
+        assert len(FILE.readlines()) == 2
+
+    store.append(('channels', 0, allMems), 1)
+    store.append(('channels', 0, allMems), 2)
+    store.commit()
+    with open(store.log_path) as FILE:
+        assert len(FILE.readlines()) == 4
+
+# Unsynced commits are still written to the log, so a restart replays them
+def test_unsynced_commit(store, channel):
+    store.append(('channels', 0, allMems), 1)
+    store.commit(sync=False)
+    assert DataStore(store.path).data == store.data
+
+# Snapshotting writes the whole workspace and empties the log
+def test_snapshot_compacts_log(store, channel):
+    store.commit()
+    store.snapshot()
+    with open(store.log_path) as FILE:
+        assert len(FILE.readlines()) == 1
+
+    reloaded = DataStore(store.path)
+    assert reloaded.data == store.data
+
+# A record torn by a crash mid-write is dropped and later records still replay
+def test_torn_record(store, channel):
+    store.commit()
+    with open(store.log_path, 'a') as FILE:
+        FILE.write('["a",["channels",0,"all_m')
+
+    reloaded = DataStore(store.path)
+    assert reloaded.data == store.data
+
+    reloaded.append(('channels', 0, allMems), 3)
+    reloaded.commit()
+    assert DataStore(store.path).data == reloaded.data
+
+# The store is only dirty between a change and the next snapshot
+def test_dirty_tracking(store, channel):
+    assert store.dirty
+    store.snapshot()
+    assert not store.dirty
+
+    store.get(('channels', 0, allMems))
+    store.commit()
+    assert not store.dirty
+
+    store.append(('channels', 0, allMems), 1)
+    assert store.dirty
+    store.commit()
+    assert store.dirty
+
+    #* A log left over from before a restart still needs to be snapshotted
+    reloaded = DataStore(store.path)
+    reloaded.load()
+    assert reloaded.dirty
+
+    store.snapshot()
+    assert not store.dirty
+    reloaded.load()
+    assert not reloaded.dirty
+
+# Snapshots replace data.json in one step and leave no temporary file behind
+def test_snapshot_is_atomic(store, channel):
+    store.snapshot()
+    assert not os.path.exists(f"{store.path}.tmp")
+    assert DataStore(store.path).data == store.data
+
+# A crash after the new snapshot is renamed in, but before the log is truncated,
+# must not replay the old log a second time
+def test_stale_log_not_replayed(store, channel):
+    store.append(('channels', 0, allMems), 1)
+    store.commit()
+    shutil.copy(store.log_path, f"{store.log_path}.old")
+    store.snapshot()
+    os.replace(f"{store.log_path}.old", store.log_path)
+
+    reloaded = DataStore(store.path)
+    assert reloaded.data == store.data
+    assert reloaded.data['channels'][0][allMems] == [0, 1]
+
+    #* The stale log is replaced, so new changes survive another restart
+    reloaded.append(('channels', 0, allMems), 2)
+    reloaded.commit()
+    assert DataStore(store.path).data == reloaded.data
+
+# Locks are re-entrant, writers may read, readers may not upgrade
+def test_rwlock_reentrant():
+    lock = RWLock()
+    with lock.write():
+        with lock.write():
+            with lock.read():
+                pass
+    with lock.read():
+        with lock.read():
+            with pytest.raises(RuntimeError):
+                lock.acquire_write()
+
+# A writer waits for readers to finish, and readers wait for the writer
+def test_rwlock_exclusive():
+    lock = RWLock()
+    events = []
+
+    def writer():
+        with lock.write():
+            events.append('write')
+
+    with lock.read():
+        thread = threading.Thread(target=writer)
+        thread.start()
+        thread.join(0.2)
+        assert events == []
+    thread.join()
+    assert events == ['write']
+
+# Concurrent writers never lose each other's changes
+def test_concurrent_writes(store, channel):
+    def join(u_id):
+        with store.lock.write():
+            store.append(('channels', 0, allMems), u_id)
+            store.commit()
+
+    threads = [threading.Thread(target=join, args=(u_id,)) for u_id in range(1, 51)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(store.get(('channels', 0, allMems))) == list(range(51))
+    assert DataStore(store.path).data == store.data
+
+# Rows are found by id and by unique field without scanning their collection
+def test_indexes(store, channel):
+    store.append(('users',), {
+        'u_id': 0,
+        'email': 'trump@gmail.com',
+        'handle_str': 'donaldtrump',
+    })
+    assert store.row('channels', 0) is channel
+    assert store.find('users', 'email', 'trump@gmail.com')['u_id'] == 0
+
+    assert store.find('users', 'email', 'Trump@Gmail.com')['u_id'] == 0
+
+    store.set(('users', 0, 'handle_str'), 'thedonald')
+    assert store.find('users', 'handle_str', 'donaldtrump') is None
+    assert store.find('users', 'handle_str', 'thedonald')['u_id'] == 0
+
+    store.delete(('channels', 0))
+    with pytest.raises(KeyError):
+        store.row('channels', 0)
+
+    #* The indexes are rebuilt when the workspace is loaded from disk
+    store.commit()
+    reloaded = DataStore(store.path)
+    assert reloaded.find('users', 'handle_str', 'thedonald') == store.row('users', 0)
+    with pytest.raises(KeyError):
+        reloaded.row('channels', 0)
+
+# Grouped rows stay in the order they were added, whichever group they move to
+def test_groups(store):
+    def ids(channel_id):
+        return [row['message_id'] for row in store.group('messages_log', cID, channel_id)]
+
+    for message_id in range(4):
+        store.append(('messages_log',), {
+            'message_id': message_id,
+            'channel_id': message_id % 2,
+            'dm_id': -1,
+            'message': '',
+        })
+    assert ids(0) == [0, 2]
+    assert ids(1) == [1, 3]
+
+    store.delete(('messages_log', 2))
+    store.set(('messages_log', 1, cID), 0)
+    assert ids(0) == [0, 1]
+    assert ids(1) == [3]
+    assert len(store.group('messages_log', cID, 5)) == 0
+
+    store.commit()
+    reloaded = DataStore(store.path)
+    assert [row['message_id'] for row in reloaded.group('messages_log', cID, 0)] == [0, 1]
+
+# Positions in a group survive removals, so pages can carry on from any of them
+def test_group_pages(store):
+    for message_id in range(10):
+        store.append(('messages_log',), {
+            'message_id': message_id,
+            'channel_id': 0,
+            'dm_id': -1,
+            'message': '',
+        })
+    store.delete(('messages_log', 6))
+    group = store.group('messages_log', cID, 0)
+
+    assert len(group) == 9
+    assert group.position(7) == 7
+    assert group.position(6) is None
+    assert [row['message_id'] for _, row in group.page(group.end, 3)] == [9, 8, 7]
+    assert [row['message_id'] for _, row in group.page(7, 3)] == [5, 4, 3]
+    assert [row['message_id'] for _, row in group.page(3, 5, older=False)] == [4, 5, 7, 8, 9]
+    assert group.page(0, 5) == []
+    assert [row['message_id'] for row in group.newest(0, 3)] == [9, 8, 7]
+    assert [row['message_id'] for row in group.newest(3, 6)] == [5, 4, 3]
+    assert [row['message_id'] for row in group.newest(7, 50)] == [1, 0]
+    assert group.newest(9, 50) == []
+
+# Members and message text are indexed as they change
+def test_memberships_and_search(store, channel):
+    store.append(('channels', 0, allMems), 1)
+    assert store.memberships('channels', 1) == {0}
+    store.remove(('channels', 0, allMems), 1)
+    assert store.memberships('channels', 1) == set()
+
+    for message_id, message in enumerate(['Welcome', 'Akeome', 'omg', 'Bruh haha']):
+        store.append(('messages_log',), {
+            'message_id': message_id,
+            'channel_id': 0,
+            'dm_id': -1,
+            'message': message,
+        })
+
+    def search(text):
+        return sorted(row['message_id'] for row in store.search('messages_log', 'message', (0, -1), text))
+
+    assert search('om') == [0, 1, 2]
+    assert search('OME') == [0, 1]
+    assert search('') == [0, 1, 2, 3]
+    assert search('comet') == []
+    assert list(store.search('messages_log', 'message', (1, -1), 'om')) == []
+
+    store.set(('messages_log', 3, 'message'), 'Nomnom')
+    store.delete(('messages_log', 0))
+    assert search('ome') == [1]
+    assert search('nom') == [3]
+    #* Changing the text leaves the row where it was in its group
+    assert [row['message_id'] for row in store.group('messages_log', cID, 0)] == [1, 2, 3]
+    store.set(('messages_log', 1, 'message'), 'edited')
+    assert [row['message_id'] for row in store.group('messages_log', cID, 0)] == [1, 2, 3]
+    assert search('ome') == []
+
+    store.commit()
+    reloaded = DataStore(store.path)
+    assert reloaded.memberships('channels', 0) == {0}
+    assert sorted(row['message_id'] for row in reloaded.search('messages_log', 'message', (0, -1), 'nom')) == [3]
+
+# Users in at least one channel or DM are counted as they join and leave
+def test_participants(store, channel):
+    assert store.participants() == 1
+    store.append(('channels', 0, allMems), 1)
+    store.append(('dms',), {'dm_id': 0, 'all_members': [1, 2]})
+    assert store.participants() == 3
+
+    store.remove(('channels', 0, allMems), 1)
+    assert store.participants() == 3
+    store.delete(('dms', 0))
+    assert store.participants() == 1
+    store.set(('channels', 0, allMems), [0, 0, 4])
+    assert store.participants() == 2
+
+    store.commit()
+    assert DataStore(store.path).participants() == 2
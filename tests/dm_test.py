@@ -1,5 +1,5 @@
 import pytest
-from src.dm import dm_details_v1, dm_list_v1, dm_create_v1, dm_remove_v1, dm_invite_v1, dm_leave_v1, dm_messages_v1
+from src.dm import dm_details_v1, dm_list_v1, dm_create_v1, dm_remove_v1, dm_invite_v1, dm_leave_v1, dm_messages_v1, dm_messages_v3
 from src.error import AccessError, InputError
 from src.message import message_senddm_v1, message_react_v1
 from src.other import SECRET
@@ -172,6 +172,8 @@ def test_dm_remove(user1, user2, user3):
     dm_remove_v1(user1[token],dm_0['dm_id'])
     return_dict = dm_list_v1(user1[token])
     assert len(return_dict['dms']) == 1
+    #A DM created afterwards does not reuse the id of either DM
+    assert dm_create_v1(user1[token], [user2[AuID]])['dm_id'] == 2
 
 #Test that a user can be invited to a DM
 def test_dm_invite(user1, user2, user3):
@@ -276,6 +278,25 @@ def test_dm_messages(user1, user2, user3):
     assert return_dict3['start'] == 20
     assert return_dict3['end'] == -1
 
+def test_dm_messages_cursor(user1, user2, user3):
+    dm_0 = dm_create_v1(user1[token], [user2[AuID]])
+    for message_counter in range(60):
+        message_senddm_v1(user1[token], dm_0[dmID], f"{message_counter}")
+
+    firstPage = dm_messages_v3(user2[token], dm_0[dmID], '')
+    assert [msg['message'] for msg in firstPage['messages']] == [f"{i}" for i in range(59, 9, -1)]
+    assert firstPage['prev_cursor'] == ''
+
+    lastPage = dm_messages_v3(user2[token], dm_0[dmID], firstPage['next_cursor'])
+    assert [msg['message'] for msg in lastPage['messages']] == [f"{i}" for i in range(9, -1, -1)]
+    assert lastPage['next_cursor'] == ''
+    assert lastPage['prev_cursor'] != ''
+
+    with pytest.raises(InputError):
+        dm_messages_v3(user1[token], -1, '')
+    with pytest.raises(AccessError):
+        dm_messages_v3(user3[token], dm_0[dmID], '')
+
 #* Test for unauthorised users for all dm functions
 def test_dm_unauthorised_user(user1, user2, invalid_token):
     dm1 = dm_create_v1(user1[token], [user2[AuID]])
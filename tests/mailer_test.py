@@ -0,0 +1,61 @@
+# file to test the background mail queue in src/mailer.py
+import pytest
+import json
+import os
+from flask_mail import Message
+from src import config, mailer
+
+@pytest.fixture
+def mail_config(monkeypatch):
+    monkeypatch.setattr(config, 'mail_retry_delay', 0)
+    yield
+    mailer.stop_mailer()
+
+def reset_message(email):
+    msg = Message('UNSW Dreams Password Reset', sender = 'W13BCactus@gmail.com', recipients = [email])
+    msg.body = 'Please use the following code to reset your password: 1234'
+    return msg
+
+# Queued messages are written to the spool by the workers
+def test_spool(tmp_path, mail_config):
+    mailer.start_mailer(mailer.spool_transport(str(tmp_path)))
+    for email in ['first@gmail.com', 'second@gmail.com', 'third@gmail.com']:
+        mailer.send_mail(reset_message(email))
+    mailer.flush_mail()
+
+    spooled = []
+    for name in os.listdir(tmp_path):
+        with open(tmp_path / name) as FILE:
+            spooled.append(json.load(FILE))
+    assert sorted(msg['recipients'][0] for msg in spooled) == ['first@gmail.com', 'second@gmail.com', 'third@gmail.com']
+    assert spooled[0]['subject'] == 'UNSW Dreams Password Reset'
+    assert spooled[0]['body'].endswith('1234')
+
+# Messages already waiting are sent together, up to a full batch
+def test_batches(monkeypatch, mail_config):
+    monkeypatch.setattr(config, 'mail_batch_size', 3)
+    batches = []
+    for number in range(7):
+        mailer.send_mail(reset_message(f"user{number}@gmail.com"))
+    mailer.start_mailer(batches.append, 1)
+    mailer.flush_mail()
+    assert [len(batch) for batch in batches] == [3, 3, 1]
+
+# A failed batch is retried until it goes through, or dropped once out of retries
+def test_retries(monkeypatch, mail_config):
+    monkeypatch.setattr(config, 'mail_retries', 2)
+    attempts = []
+
+    def flaky(batch):
+        attempts.append(batch[0].recipients[0])
+        if len(attempts) < 3 or batch[0].recipients[0] == 'never@gmail.com':
+            raise OSError('connection refused')
+
+    mailer.start_mailer(flaky, 1)
+    mailer.send_mail(reset_message('first@gmail.com'))
+    mailer.flush_mail()
+    assert attempts == ['first@gmail.com'] * 3
+
+    mailer.send_mail(reset_message('never@gmail.com'))
+    mailer.flush_mail()
+    assert attempts[3:] == ['never@gmail.com'] * 3
@@ -4,6 +4,7 @@ from src.message import message_send_v1, message_remove_v1, message_edit_v1, mes
 from src.error import InputError, AccessError
 import src.channel, src.channels, src.auth, src.dm
 from src.other import clear_v1, SECRET
+from src.data import store
 from datetime import timezone, datetime
 import jwt
 import time
@@ -191,6 +192,21 @@ def test_message_edit(user1, user2, user3, user4):
     #! Clearing data
     clear_v1()
 
+#* Test that editing an old message leaves it where it was in the channel's and DM's history
+def test_message_edit_keeps_order(user1, user2):
+    channel1 = src.channels.channels_create_v1(user1[token], 'TrumpPence', True)
+    dm1 = src.dm.dm_create_v1(user1[token], [user2[AuID]])
+    sent = [message_send_v1(user1[token], channel1[cID], f"{number}")[mID] for number in range(3)]
+    sentdm = [message_senddm_v1(user1[token], dm1[dmID], f"{number}")[mID] for number in range(3)]
+
+    message_edit_v1(user1[token], sent[0], 'edited')
+    message_edit_v1(user1[token], sentdm[0], 'edited')
+
+    messages = src.channel.channel_messages_v1(user1[token], channel1[cID], 0)['messages']
+    assert [(message[mID], message['message']) for message in messages] == [(sent[2], '2'), (sent[1], '1'), (sent[0], 'edited')]
+    messages = src.dm.dm_messages_v1(user1[token], dm1[dmID], 0)['messages']
+    assert [(message[mID], message['message']) for message in messages] == [(sentdm[2], '2'), (sentdm[1], '1'), (sentdm[0], 'edited')]
+
 # message_remove_v1
 # User must be:
     # The user that wrote the message, or
@@ -803,6 +819,26 @@ def test_message_sendlater_is_sent_later(user1, user2):
     assert mTime == sendTime
 
 
+#* Message ids are handed out in order and never reused, including for messages sent later
+def test_message_ids_unique(user1, user2):
+    channel1 = src.channels.channels_create_v1(user1[token], 'Dominic Torreto', True)
+    dm1 = src.dm.dm_create_v1(user1[token], [user2[AuID]])
+    sendTime = datetime.now().replace(tzinfo=timezone.utc).timestamp() + 1
+
+    m1 = message_send_v1(user1[token], channel1[cID], "Family")
+    m2 = src.message.message_sendlater_v1(user1[token], channel1[cID], "Family", sendTime)
+    m3 = src.message.message_sendlaterdm_v1(user1[token], dm1[dmID], "Family", sendTime)
+    message_remove_v1(user1[token], m1[mID])
+    m4 = message_senddm_v1(user1[token], dm1[dmID], "Family")
+
+    assert [m1[mID], m2[mID], m3[mID], m4[mID]] == [0, 1, 2, 3]
+
+    #* The messages sent later keep the ids they were given
+    time.sleep(2)
+    sent = src.channel.channel_messages_v1(user1[token], channel1[cID], 0)['messages']
+    assert [message[mID] for message in sent] == [m2[mID]]
+    assert message_senddm_v1(user1[token], dm1[dmID], "Family")[mID] == 4
+
 #* Testing a message that is to be sent later isn't prematurely sent
 def test_message_sendlaterdm_is_sent_later(user1, user2):
     # User1 creates dm, invites user2
@@ -894,3 +930,49 @@ def test_message_sendlaterdm_past(user1, user2, user3):
     messageToSend = "Quack quack"
     with pytest.raises(InputError):
         src.message.message_sendlaterdm_v1(user3[token], dm1[dmID], messageToSend, sendTime)
+
+#* Testing that scheduled messages can be listed and cancelled before they are sent
+def test_message_sendlater_list_cancel(user1, user2):
+    channel1 = src.channels.channels_create_v1(user1[token], 'Dominic Torreto', True)
+    dm1 = src.dm.dm_create_v1(user1[token], [user2[AuID]])
+    sendTime = datetime.now().replace(tzinfo=timezone.utc).timestamp() + 1
+
+    m1 = src.message.message_sendlaterdm_v1(user1[token], dm1[dmID], "Family", sendTime + 1)
+    m2 = src.message.message_sendlater_v1(user1[token], channel1[cID], "Nobody", sendTime)
+    assert src.message.message_sendlater_list_v1(user1[token])['messages'] == [
+        {mID: m2[mID], cID: channel1[cID], dmID: -1, 'message': "Nobody", 'time_sent': sendTime},
+        {mID: m1[mID], cID: -1, dmID: dm1[dmID], 'message': "Family", 'time_sent': sendTime + 1},
+    ]
+    assert src.message.message_sendlater_list_v1(user2[token])['messages'] == []
+
+    #* Only the user who scheduled a message can cancel it, and only once
+    with pytest.raises(InputError):
+        src.message.message_sendlater_cancel_v1(user2[token], m2[mID])
+    src.message.message_sendlater_cancel_v1(user1[token], m2[mID])
+    with pytest.raises(InputError):
+        src.message.message_sendlater_cancel_v1(user1[token], m2[mID])
+
+    time.sleep(2.5)
+    assert src.channel.channel_messages_v1(user1[token], channel1[cID], 0)['messages'] == []
+    assert [message[mID] for message in src.dm.dm_messages_v1(user1[token], dm1[dmID], 0)['messages']] == [m1[mID]]
+    assert src.message.message_sendlater_list_v1(user1[token])['messages'] == []
+
+#* Test that scheduled messages keep the sender's id rather than their token, so they are still sent
+#* after the sender logs out, but not once the sender has left the conversation
+def test_message_sendlater_after_logout(user1, user2):
+    channel1 = src.channels.channels_create_v1(user1[token], 'Dominic Torreto', True)
+    dm1 = src.dm.dm_create_v1(user1[token], [user2[AuID]])
+    sendTime = datetime.now().replace(tzinfo=timezone.utc).timestamp() + 1
+
+    m1 = src.message.message_sendlater_v1(user1[token], channel1[cID], "Family", sendTime)
+    src.message.message_sendlaterdm_v1(user2[token], dm1[dmID], "Nobody", sendTime)
+    assert sorted(job['args'][0] for job in store.data['scheduled'].values()) == [user1[AuID], user2[AuID]]
+
+    src.auth.auth_logout_v1(user1[token])
+    src.dm.dm_leave_v1(user2[token], dm1[dmID])
+    time.sleep(1.5)
+
+    login = src.auth.auth_login_v2("first@gmail.com", "password")
+    assert [message[mID] for message in src.channel.channel_messages_v1(login[token], channel1[cID], 0)['messages']] == [m1[mID]]
+    assert src.dm.dm_messages_v1(login[token], dm1[dmID], 0)['messages'] == []
+    assert store.data['scheduled'] == {}
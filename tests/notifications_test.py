@@ -1,10 +1,13 @@
 import pytest
 from src.message import message_send_v1, message_remove_v1, message_edit_v1, message_share_v1, message_senddm_v1, message_react_v1
 from src.error import InputError, AccessError
-import src.channel, src.channels, src.auth
+import src.channel, src.channels, src.auth, src.config
+from src.data import store
 from src.other import get_user, get_channel, get_dm, clear_v1, SECRET
 from datetime import timezone, datetime
-from src.notifications import notifications_get_v1
+from src.notifications import notifications_get_v1, notifications_wait_v1
+import threading
+import time
 import jwt
 from src.dm import dm_create_v1, dm_invite_v1
 
@@ -236,3 +239,55 @@ def test_react_notif_in_dm(user1, user2):
     } in notifications_get_v1(user1[token])[notifs]
 '''
 
+
+# Only the most recent notifications are kept, newest first, once a user's ring is full
+def test_notifications_ring(user1, user2, monkeypatch):
+    monkeypatch.setattr(src.config, 'notification_depth', 5)
+    user3 = src.auth.auth_register_v2("third@gmail.com", "password", "User", "3")
+    channel1 = src.channels.channels_create_v1(user1[token], 'TrumpPence', True)
+    src.channel.channel_invite_v1(user1[token], channel1[cID], user3[AuID])
+    for i in range(12):
+        message_send_v1(user1[token], channel1[cID], f"{i} @{get_user(user3[AuID])['handle_str']}")
+
+    messages = [notif[nMess].split(': ')[1] for notif in notifications_get_v1(user3[token])[notifs]]
+    assert messages == [f"{i} @user3" for i in range(11, 6, -1)]
+    assert len(store.data['notifs'][f"{user3[AuID]}"]['items']) == 5
+
+    #* Rings saved before they existed are picked up in the same order
+    store.set(('notifs', f"{user2[AuID]}"), [{nMess: 'newer'}, {nMess: 'older'}])
+    src.channel.channel_invite_v1(user1[token], channel1[cID], user2[AuID])
+    assert [notif[nMess] for notif in notifications_get_v1(user2[token])[notifs]][1:] == ['newer', 'older']
+
+# A handle tagged more than once is notified once, and tags outside the channel notify nobody
+def test_notifications_tagged_once(user1, user2, user3):
+    channel1 = src.channels.channels_create_v1(user1[token], 'TrumpPence', True)
+    src.channel.channel_invite_v1(user1[token], channel1[cID], user2[AuID])
+    message_send_v1(user1[token], channel1[cID], "@user2 @user3 @nobody @user2")
+
+    assert [notif[nMess] for notif in notifications_get_v1(user2[token])[notifs]] == [
+        "user1 tagged you in TrumpPence: @user2 @user3 @nobod",
+        "user1 added you to TrumpPence",
+    ]
+    assert notifications_get_v1(user3[token])[notifs] == []
+
+# Waiting returns what was pushed since the cursor, and wakes up as soon as a notification is pushed
+def test_notifications_wait(user1, user2):
+    channel1 = src.channels.channels_create_v1(user1[token], 'TrumpPence', True)
+    result = notifications_wait_v1(user2[token], None, 0)
+    assert result[notifs] == []
+
+    src.channel.channel_invite_v1(user1[token], channel1[cID], user2[AuID])
+    result = notifications_wait_v1(user2[token], result['cursor'], 0)
+    assert [notif[nMess] for notif in result[notifs]] == ["user1 added you to TrumpPence"]
+    assert notifications_wait_v1(user2[token], result['cursor'], 0.1)[notifs] == []
+
+    timer = threading.Timer(0.2, message_send_v1, args=(user1[token], channel1[cID], "Hi @user2"))
+    timer.start()
+    start = time.time()
+    result = notifications_wait_v1(user2[token], result['cursor'], 10)
+    assert time.time() - start < 5
+    assert [notif[nMess] for notif in result[notifs]] == ["user1 tagged you in TrumpPence: Hi @user2"]
+    timer.join()
+
+    with pytest.raises(InputError):
+        notifications_wait_v1(user2[token], 'garbage', 0)
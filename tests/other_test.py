@@ -1,7 +1,10 @@
 import pytest
 import src.channel, src.channels, src.message, src.dm
 import jwt
-from src.other import clear_v1, search_v1, get_channel, get_user, get_message
+from src.other import clear_v1, search_v1, search_v3, get_channel, get_user, get_message, check_removed, decode, verified_tokens
+import src.admin
+from src import config
+from src.data import store
 from src.error import AccessError, InputError
 
 AuID   = 'auth_user_id'
@@ -149,3 +152,113 @@ def test_search_dms(user1, user2, user3):
         'message': "Biden Harris 2020",
         'time_created': get_message(dmMessage[mID])['time_created'],
     } not in search_v1(user3[token], "bIDEN h")['messages']
+
+#* Edited and removed messages are found by what they say now
+def test_search_follows_changes(user1, user2, channel1):
+    src.channel.channel_join_v1(user2[token], channel1[cID])
+    message1 = src.message.message_send_v1(user1[token], channel1[cID], "Make America")
+    message2 = src.message.message_send_v1(user1[token], channel1[cID], "Great again")
+
+    src.message.message_edit_v1(user1[token], message1[mID], "Build back better")
+    src.message.message_remove_v1(user1[token], message2[mID])
+    src.channel.channel_leave_v1(user1[token], channel1[cID])
+
+    assert search_v1(user2[token], "america")['messages'] == []
+    assert search_v1(user2[token], "great")['messages'] == []
+    assert [msg['message'] for msg in search_v1(user2[token], "BACK")['messages']] == ["Build back better"]
+    assert search_v1(user1[token], "back")['messages'] == []
+
+#* search_v3 returns matches newest first, a page at a time
+def test_search_pages(user1, user2, channel1):
+    dm1 = src.dm.dm_create_v1(user1[token], [user2[AuID]])
+    sent = []
+    for i in range(7):
+        sent.append(src.message.message_send_v1(user1[token], channel1[cID], f"match {i}")[mID])
+        sent.append(src.message.message_senddm_v1(user1[token], dm1['dm_id'], f"dm match {i}")[mID])
+    src.message.message_send_v1(user1[token], channel1[cID], "nothing")
+
+    pages = []
+    cursor = ''
+    while True:
+        page = search_v3(user1[token], "MATCH", 4, cursor)
+        pages.append([msg[mID] for msg in page['messages']])
+        cursor = page['next_cursor']
+        if cursor == '':
+            break
+    assert pages == [sent[13:9:-1], sent[9:5:-1], sent[5:1:-1], sent[1::-1]]
+
+    #* user2 is only in the DM
+    assert [msg['message'] for msg in search_v3(user2[token], "match 6", 50, '')['messages']] == ["dm match 6"]
+
+    with pytest.raises(InputError):
+        search_v3(user1[token], "match", 0, '')
+    with pytest.raises(InputError):
+        search_v3(user1[token], "match", 51, '')
+    with pytest.raises(InputError):
+        search_v3(user1[token], "match", 4, 'notacursor')
+
+# Verified tokens are cached, and forgotten as soon as their session ends
+def test_token_cache(user1, user2, user3):
+    # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    #   Note: This test has white-box testing involved  #
+    # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    second = src.auth.auth_login_v2("first@gmail.com", "password")
+    assert decode(user1[token]) == (user1[AuID], 0)
+    assert decode(second[token]) == (user1[AuID], 1)
+    assert user1[token] in verified_tokens
+
+    #* Logging out only ends that one session
+    src.auth.auth_logout_v1(user1[token])
+    with pytest.raises(AccessError):
+        decode(user1[token])
+    assert decode(second[token]) == (user1[AuID], 1)
+
+    #* Resetting a password ends every session
+    decode(user2[token])
+    src.auth.auth_passwordreset_request_v1("second@gmail.com")
+    src.auth.auth_passwordreset_reset_v1(src.other.get_reset_code("second@gmail.com"), "newpassword")
+    with pytest.raises(AccessError):
+        decode(user2[token])
+
+    #* So does removing the user
+    decode(user3[token])
+    src.admin.user_remove_v1(second[token], user3[AuID])
+    with pytest.raises(AccessError):
+        decode(user3[token])
+
+    #* And clearing the workspace
+    clear_v1()
+    with pytest.raises(AccessError):
+        decode(second[token])
+
+# The token cache never grows past its configured size
+def test_token_cache_size(user1, user2, user3, monkeypatch):
+    monkeypatch.setattr(config, 'token_cache_size', 2)
+    for user in (user1, user2, user3):
+        decode(user[token])
+    assert list(verified_tokens) == [user2[token], user3[token]]
+    assert decode(user1[token]) == (user1[AuID], 0)
+
+# Read-only helpers and routes must not write anything
+def test_reads_do_not_write(user1, user2, channel1):
+    # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    #   Note: This test has white-box testing involved  #
+    # # # # # # # # # # # # # # # # # # # # # # # # # # #
+    src.channel.channel_join_v1(user2[token], channel1[cID])
+    src.message.message_send_v1(user1[token], channel1[cID], "Hello")
+    store.snapshot()
+    assert not store.dirty
+    with open(store.log_path) as FILE:
+        log = FILE.read()
+
+    get_channel(channel1[cID])
+    check_removed(user2[AuID])
+    src.channel.channel_details_v1(user1[token], channel1[cID])
+    src.channel.channel_messages_v1(user1[token], channel1[cID], 0)
+    search_v1(user2[token], "hell")
+    with pytest.raises(InputError):
+        src.auth.auth_login_v2("first@gmail.com", "wrongpassword")
+
+    assert not store.dirty
+    with open(store.log_path) as FILE:
+        assert FILE.read() == log
@@ -0,0 +1,80 @@
+# file to test the scheduled jobs in src/scheduler.py
+import pytest
+import threading
+import time
+from src import scheduler
+from src.data import store
+
+@pytest.fixture
+def ran():
+    store.clear()
+    scheduler.clear()
+    ran = []
+    scheduler.register('test', ran.append)
+    yield ran
+    scheduler.clear()
+
+def wait_for(ran, count):
+    deadline = time.time() + 5
+    while len(ran) < count and time.time() < deadline:
+        time.sleep(0.01)
+
+# Jobs run in the order they are due, not the order they were scheduled
+def test_schedule_order(ran):
+    now = time.time()
+    scheduler.schedule(now + 0.3, 'test', ['third'], 0)
+    scheduler.schedule(now + 0.1, 'test', ['first'], 0)
+    scheduler.schedule(now + 0.2, 'test', ['second'], 1)
+    wait_for(ran, 3)
+    assert ran == ['first', 'second', 'third']
+    assert scheduler.scheduled() == []
+
+# Cancelled jobs never run, and each user's jobs can be listed
+def test_schedule_cancel(ran):
+    now = time.time()
+    first = scheduler.schedule(now + 0.2, 'test', ['first'], 0)
+    second = scheduler.schedule(now + 0.1, 'test', ['second'], 1)
+    scheduler.schedule(now + 0.3, 'test', ['third'], 0)
+
+    assert [job['args'] for job in scheduler.scheduled(0)] == [['first'], ['third']]
+    assert scheduler.cancel(first)
+    assert not scheduler.cancel(first)
+    wait_for(ran, 2)
+    assert ran == ['second', 'third']
+    assert not scheduler.cancel(second)
+
+# Many jobs share the one scheduler thread
+def test_schedule_one_thread(ran):
+    threads = threading.active_count()
+    now = time.time()
+    for number in range(1000):
+        scheduler.schedule(now + 0.2 + number / 10000, 'test', [number], number % 7)
+    assert threading.active_count() <= threads + 1
+    wait_for(ran, 1000)
+    assert ran == list(range(1000))
+
+# Jobs saved in the workspace are scheduled again after a restart, overdue ones straight away in time order
+def test_schedule_reload(ran):
+    now = time.time()
+    with store.lock.write():
+        scheduler.schedule(now + 0.3, 'test', ['second'], 0)
+        scheduler.schedule(now + 0.2, 'test', ['first'], 0)
+        cancelled = scheduler.schedule(now + 0.1, 'test', ['cancelled'], 0)
+        scheduler.cancel(cancelled)
+        store.commit()
+
+    #* Restart without running anything, as though the server went down until they were overdue
+    scheduler.clear()
+    time.sleep(0.4)
+    store.load()
+    assert [job['args'] for job in store.data['scheduled'].values()] == [['second'], ['first']]
+    scheduler.load()
+    wait_for(ran, 2)
+    assert ran == ['first', 'second']
+
+    #* Jobs that ran are gone from the workspace too, once the last one has committed
+    deadline = time.time() + 5
+    while store.data['scheduled'] and time.time() < deadline:
+        time.sleep(0.01)
+    store.load()
+    assert store.data['scheduled'] == {}
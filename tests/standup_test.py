@@ -3,7 +3,8 @@ import pytest
 from src.standup import standup_start_v1, standup_active_v1, standup_send_v1
 from src.error import InputError, AccessError
 from src.other import SECRET, clear_v1, get_user
-import src.channel, src.notifications
+import src.auth, src.channel, src.channels, src.notifications, src.config, src.standup
+from src.data import store
 from src.channel import channel_messages_v1
 import jwt
 import time
@@ -150,4 +151,21 @@ def test_standup_tag(user1):
     standup_send_v1(user1[token], channel[cID], f"Hello @{get_user(user1['auth_user_id'])['handle_str']}")
     time.sleep(standard_length + 2)
 
-    assert len(src.notifications.notifications_get_v1(user1[token])['notifications']) == 1
\ No newline at end of file
+    assert len(src.notifications.notifications_get_v1(user1[token])['notifications']) == 1
+
+#Test that lines sent to a standup are saved as they are sent, and the standup carries on after a restart
+def test_standup_survives_restart(user1):
+    channel = src.channels.channels_create_v1(user1[token], 'Marms', False)
+    standup_start_v1(user1[token], channel[cID], standard_length)
+    for number in range(4):
+        standup_send_v1(user1[token], channel[cID], f"{number}")
+
+    #* Every line is in the log as soon as it is sent, so reloading the store picks them all up
+    store.load()
+    assert store.row('stand_ups', channel[cID])['messages'] == ['user1: 0', 'user1: 1', 'user1: 2', 'user1: 3']
+    standup_send_v1(user1[token], channel[cID], "4")
+    time.sleep(standard_length + 2)
+
+    messages = channel_messages_v1(user1[token], channel[cID], 0)['messages']
+    assert [message['message'] for message in messages] == ["user1: 0\nuser1: 1\nuser1: 2\nuser1: 3\nuser1: 4"]
+    assert standup_active_v1(user1[token], channel[cID])['is_active'] == False
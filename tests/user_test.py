@@ -10,6 +10,7 @@ from src.message import message_send_v1, message_remove_v1, message_senddm_v1
 import jwt
 from PIL import Image
 from src.config import url
+from src.data import store
 
 AuID    = 'auth_user_id'
 uID     = 'u_id'
@@ -635,4 +636,27 @@ def test_user_stats2_v1(user1,user2, user3):
 
     dm_invite_v1(user1[tok], dm[dmID], user3[AuID])
     output2 = user_stats_v1(user3[tok])
-    assert len(output2["user_stats"]['messages_sent']) == 1
\ No newline at end of file
+    assert len(output2["user_stats"]['messages_sent']) == 1
+
+# tests that statistics are kept as parallel lists but returned as lists of points
+def test_user_stats_compact(user1, user2):
+    channel1 = channels_create_v1(user1[tok], 'Channel1', True)
+    message_send_v1(user1[tok], channel1[cID], "Sup")
+    message_send_v1(user1[tok], channel1[cID], "Sup")
+
+    stored = store.get(('user_analytics', f"{user1[AuID]}", 'messages_sent'))
+    assert stored['num_messages_sent'] == [0, 1, 2]
+    assert len(stored['time_stamp']) == 3
+    points = user_stats_v1(user1[tok])['user_stats']['messages_sent']
+    assert points == [{'num_messages_sent': value, 'time_stamp': time_stamp} for value, time_stamp in zip(stored['num_messages_sent'], stored['time_stamp'])]
+    assert store.get(('dreams_analytics', 'messages_exist'))['num_messages_exist'] == [0, 1, 2]
+
+    #* Series saved as lists of points carry on from their newest point
+    store.set(('user_analytics', f"{user2[AuID]}", 'channels_joined'), [
+        {'num_channels_joined': 0, 'time_stamp': 1},
+        {'num_channels_joined': 3, 'time_stamp': 2},
+    ])
+    channel_join_v1(user2[tok], channel1[cID])
+    stored = store.get(('user_analytics', f"{user2[AuID]}", 'channels_joined'))
+    assert stored['num_channels_joined'] == [0, 3, 4]
+    assert stored['time_stamp'][:2] == [1, 2]